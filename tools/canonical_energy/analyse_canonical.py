@@ -72,8 +72,7 @@ filename : list of strings
                 warnings.warn('Beta values in input files not consistent.')
 
     if args.multi_sim:
-        results = pd.DataFrame([pyhande.canonical.estimates(m, d) for (m, d)
-                                in zip(metadata, data)])
+        results = pyhande.canonical.multi_sim_estimates(metadata, data)
     else:
         results = pd.DataFrame(pyhande.canonical.estimates(metadata[0], data)).T
 
@@ -1,57 +1,47 @@
 #!/usr/bin/env python
+'''analyse_rdm_eigv.py file [file ...]
 
-import math
-import re
-import sys
+Calculate the von Neumann and Renyi-2 entropies from the RDM eigenvalues
+printed by HANDE FCI calculations.'''
 
-def extract_data(data_file):
-    eigv = []
-    
-    for data_file in data_file:
+import os
+import pkgutil
+import sys
 
-        f = open(data_file)
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+if not pkgutil.find_loader('pyblock'):
+    sys.path.append(os.path.join(_script_dir, '../pyblock'))
+if not pkgutil.find_loader('pyhande'):
+    sys.path.append(os.path.join(_script_dir, '../pyhande'))
 
-        have_data = False
-        for line in f:
-            if not line.strip():
-                have_data = False
-            if have_data:
-                words = line.split()
-                eigv.append(float(words[1]))
-            if 'State' in line and 'RDM eigenvalue' in line:
-                have_data = True
-            
-        f.close()
-    return eigv
+import pyhande
 
-def calculate_vn_entropy(eigvs):
-    vn_entropy = 0.0
 
-    for eigv in eigvs:
-        vn_entropy = vn_entropy - eigv*math.log(eigv,2)
+def main(data_files):
+    '''Print the entropies of each set of RDM eigenvalues in the output files.
 
-    return vn_entropy
+Parameters
+----------
+data_files : list of strings
+    names of files containing HANDE FCI output.
 
-def calculate_renyi_2(eigvs):
-    renyi_2 = 0.0
+Returns
+-------
+None.
+'''
 
-    for eigv in eigvs:
-        renyi_2 = renyi_2 + eigv*eigv
+    eigvs = pyhande.rdm.extract_rdm_eigenvalues(data_files)
 
-    renyi_2 = -math.log(renyi_2,2)
+    if eigvs:
+        for eigv in eigvs:
+            print("Von Neumann entropy =  %.18g" %
+                  pyhande.rdm.von_neumann_entropy(eigv))
+            print("Renyi 2 entropy =  %.18g" %
+                  pyhande.rdm.renyi_2_entropy(eigv))
+    else:
+        print("No RDM eigenvalues were found.")
 
-    return renyi_2
 
 if __name__ == '__main__':
 
-    data_file = sys.argv[1:]
-
-    eigv = extract_data(data_file)
-
-    if len(eigv) > 0: 
-        vn_entropy = calculate_vn_entropy(eigv)
-        print "Von Neumann entropy = ", "%.18g" % vn_entropy
-        renyi_2 = calculate_renyi_2(eigv)
-        print "Renyi 2 entropy = ", "%.18g" % renyi_2
-    else:
-        print "No RDM eigenvalues were found."
+    main(sys.argv[1:])
@@ -28,9 +28,16 @@ options : :class:`ArgumentParser`
     Options read in from command line.
 '''
     parser = argparse.ArgumentParser(usage=__doc__)
-    parser.add_argument('-b', '--beta-val', action='store', required=True,
+    parser.add_argument('-b', '--beta-val', action='store', default=None,
                         type=float, dest='beta', help='Inverse temperature '
-                        'to extract the mometnum distribution at.')
+                        'to extract the mometnum distribution at.  Default: '
+                        'extract the momentum distribution at all inverse '
+                        'temperatures.')
+    parser.add_argument('-a', '--array', action='store_true', default=False,
+                        help='Output each correlation function as a table '
+                        'with a row for each inverse temperature and a column '
+                        'for each k value rather than one row per (beta, k) '
+                        'pair.')
     parser.add_argument('filename', nargs='+', help='Analysed DMQMC data. '
                         'i.e. the output of running finite_temp_analysis.py '
                         'on a HANDE calculation.')
@@ -45,14 +52,42 @@ options : :class:`ArgumentParser`
 
 
 def main(args):
+    '''Extract the momentum space correlation functions from analysed DMQMC data.
 
-    options = parse_args(args)
-    data = pd.read_csv(options.filename[0],
-                       sep=r'\s+')
+Parameters
+----------
+args : list of strings
+    command-line arguments.
 
-    full = pyhande.dmqmc.extract_momentum_correlation_function(data, options.beta)
+Returns
+-------
+None.
+'''
+
+    options = parse_args(args)
 
-    print (full.to_string(index=False))
+    # Process each file in turn so the output for each is written as soon as
+    # it is available.
+    kcolumns = None
+    for filename in options.filename:
+        data = pd.read_csv(filename, sep=r'\s+')
+        if options.beta is not None:
+            data = data[data['Beta'] == options.beta]
+        if kcolumns is None:
+            kcolumns = pyhande.dmqmc.momentum_columns(list(data.columns.values))
+
+        if options.array:
+            corr = pyhande.dmqmc.momentum_correlation_functions(data, kcolumns,
+                                                                as_array=True)
+            for (i, column) in enumerate(corr.columns):
+                table = pd.DataFrame(corr.values[:,:,i], columns=corr.k,
+                                     index=pd.Index(corr.beta, name='Beta'))
+                print('# %s' % (column,))
+                print(table.to_string())
+        else:
+            full = pyhande.dmqmc.momentum_correlation_functions(data, kcolumns)
+            print(full.to_string(index=False))
+        sys.stdout.flush()
 
 if __name__ == '__main__':
 
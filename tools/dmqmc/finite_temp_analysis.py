@@ -43,6 +43,10 @@ options : :class:`ArgumentParser`
     parser.add_argument('-b', '--with-spline', action='store_true', dest='with_spline',
                       default=False, help='Output a B-spline fit for each of '
                       ' estimates calculated')
+    parser.add_argument('-k', '--spline-knots', action='store', default=None,
+                      type=int, dest='spline_knots', help='Number of interior '
+                      'knots to use in the B-spline fits.  Default: square root '
+                      'of the number of beta values.')
     parser.add_argument('-c', '--calc-number', action='store', default=None, type=int,
                       dest='calc_number', help='Calculation number to analyse. '
                       'Note any simulation using find_weights option should not '
@@ -50,6 +54,15 @@ options : :class:`ArgumentParser`
     parser.add_argument('-f', '--with-free-energy', action='store_true',
                       dest='with_free_energy', default=False,
                       help='Calculate Free energy')
+    parser.add_argument('-j', '--jackknife-blocks', action='store', default=None,
+                      type=int, dest='jackknife_blocks', help='Estimate the '
+                      'error in the free energy using a jackknife analysis with '
+                      'the beta loops divided into the given number of blocks.')
+    parser.add_argument('-l', '--low-memory', action='store_true',
+                      dest='low_memory', default=False,
+                      help='Read and accumulate statistics from one file at a '
+                      'time rather than holding all beta loops in memory.  '
+                      'Not compatible with --with-free-energy.')
     parser.add_argument('filenames', nargs='+', help='HANDE files to analyse.')
 
     options = parser.parse_args(args)
@@ -58,6 +71,9 @@ options : :class:`ArgumentParser`
         parser.print_help()
         sys.exit(1)
 
+    if options.low_memory and options.with_free_energy:
+        parser.error('--low-memory and --with-free-energy are not compatible.')
+
     return (options.filenames, options)
 
 
@@ -89,14 +105,24 @@ None.
 '''
 
     (files, options) = parse_args(args)
-    hande_out = pyhande.extract.extract_data_sets(files)
+
+    if options.low_memory:
+        results = pyhande.dmqmc.analyse_data_stream(files, options.with_shift,
+                                                    options.with_spline,
+                                                    options.with_trace,
+                                                    options.calc_number,
+                                                    options.spline_knots)[1]
+    else:
+        hande_out = pyhande.extract.extract_data_sets(files)
+        results = pyhande.dmqmc.analyse_data(hande_out, options.with_shift,
+                                             options.with_free_energy,
+                                             options.with_spline,
+                                             options.with_trace,
+                                             options.calc_number,
+                                             options.jackknife_blocks,
+                                             options.spline_knots)[1]
 
     # Finally, output the results!
-    results = pyhande.dmqmc.analyse_data(hande_out, options.with_shift,
-                                         options.with_free_energy,
-                                         options.with_spline,
-                                         options.with_trace,
-                                         options.calc_number)[1]
 
     # We want to sort momentum distribution array naturally so extract them here
     # before sorting the rest of the column names by their label.
@@ -13,7 +13,7 @@ if not pkgutil.find_loader('pyhande'):
 import pyhande as ph
 
 
-def plot_excit_dist(filename, plotfile, calc, max_excit):
+def plot_excit_dist(filename, plotfile, calc, max_excit, rasterize=False):
     ''' Plot excitation distribution.
 
 Paramters
@@ -26,6 +26,9 @@ calc : int
    calculation number to plot.
 max_excit : int or None
     maximum excitation level to plot to.
+rasterize : bool
+    rasterize the data (but not the axes and labels) when saving to a vector
+    format.
 
 '''
 
@@ -35,8 +38,9 @@ max_excit : int or None
     if not max_excit:
         max_excit = int(m['system']['max_number_excitations'])
     for e in range(0, max_excit):
-        pl.plot(d['iterations']*m['qmc']['tau'], d['Excit. level %s'%e],
-                label=r'$n_{\mathrm{ex}} = %s$'%e)
+        ph.plot.plot_decimated(d['iterations']*m['qmc']['tau'],
+                               d['Excit. level %s'%e], rasterized=rasterize,
+                               label=r'$n_{\mathrm{ex}} = %s$'%e)
     pl.legend(numpoints=1, loc='best')
     if m['ipdmqmc']['propagate_to_beta']:
         pl.xlabel(r'$\tau$')
@@ -61,14 +65,17 @@ def parse_args(args):
     parser.add_argument('-m', '--max-excit', action='store', dest='max_excit',
                         type=int, help='Plot up to maximum excitation '
                         'distribution. Plot all by default.', default=None)
+    parser.add_argument('-r', '--rasterize', action='store_true', default=False,
+                        help='Rasterize the data (but not the axes and labels) '
+                        'when saving to a vector format.')
     parser.add_argument('file', help='File to plot.')
 
     opts = parser.parse_args(args)
 
-    return (opts.file, opts.plotfile, opts.calc, opts.max_excit)
+    return (opts.file, opts.plotfile, opts.calc, opts.max_excit, opts.rasterize)
 
 
 if __name__ == '__main__':
 
-    (datafile, plotfile, calc, max_excit) = parse_args(sys.argv[1:])
-    plot_excit_dist(datafile, plotfile, calc, max_excit)
+    (datafile, plotfile, calc, max_excit, rasterize) = parse_args(sys.argv[1:])
+    plot_excit_dist(datafile, plotfile, calc, max_excit, rasterize)
@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 
 import numpy
-import sys
 import os
+import pkgutil
+import sys
 
 try:
     import matplotlib.pyplot as plt
@@ -10,57 +11,55 @@ try:
 except ImportError:
     USE_MATPLOTLIB = False
 
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+if not pkgutil.find_loader('pyblock'):
+    sys.path.append(os.path.join(_script_dir, '../pyblock'))
 if not pkgutil.find_loader('pyhande'):
-    _script_dir = os.path.dirname(os.path.abspath(__file__))
     sys.path.append(os.path.join(_script_dir, '../pyhande'))
 import pyhande
 
-def finite_temp_energy(beta, spectrum):
-
-    s1 = 0.0
-    s2 = 0.0
-    for eigv in spectrum:
-        e = numpy.exp(-beta*eigv)
-        s1 += e*eigv
-        s2 += e
-    return s1/s2
-
 
 def propogate_spectrum(beta_min, beta_max, nbeta, spectrum):
 
-    beta = numpy.arange(beta_min, beta_max, float(beta_max-beta_min)/(nbeta-1))
+    beta = numpy.linspace(beta_min, beta_max, nbeta)
 
-    energies = [finite_temp_energy(b, spectrum) for b in beta]
+    results = pyhande.canonical.fci_thermodynamics(spectrum, beta)
 
-    print('#     beta             E(beta)')
-    for i in range(len(beta)):
-        print('%16.8f %16.8f' % (beta[i], energies[i]))
+    print('#     beta             E(beta)              C_v                F'
+          '                S')
+    for (b, row) in results.iterrows():
+        print('%16.8f %16.8f %16.8f %16.8f %16.8f' % (b, row['U'], row['C_v'],
+              row['F'], row['S']))
 
     if USE_MATPLOTLIB:
-        plt.plot(beta, energies)
+        plt.plot(beta, results['U'])
         plt.show()
 
 if __name__ == '__main__':
 
     if len(sys.argv) != 5:
         print('Usage:', sys.argv[0], 'fci_file beta_min beta_max nbeta')
-        print(r'Evaluate E(\beta) from the output of an FCI calculation '
-              'contained in fci_file produced by HANDE, between beta_min '
-              'and beta_max in steps of (beta_max-beta_min)/(nbeta-1).')
+        print(r'Evaluate E(\beta), the heat capacity, free energy and entropy '
+              'from the output of an FCI calculation contained in fci_file '
+              'produced by HANDE, between beta_min and beta_max in steps of '
+              '(beta_max-beta_min)/(nbeta-1).')
         sys.exit(1)
 
     (fci_file, beta_min, beta_max, nbeta) = sys.argv[1:]
     beta_min = float(beta_min)
     beta_max = float(beta_max)
-    nbeta = float(nbeta)
+    nbeta = int(nbeta)
 
-    spectrum = None
+    # The eigenvalues in each symmetry block of the (first) FCI calculation
+    # are printed separately.
+    (spectrum, fci_md) = ([], None)
     for (md, calc) in pyhande.extract.extract_data(fci_file):
-        print md, calc
-        if md['calc_type'] == 'FCI':
-            spectrum = calc
-            break
-    if spectrum is None:
+        if md['calc_type'] == 'FCI' and calc.name == 'FCI (LAPACK)':
+            if fci_md is None:
+                fci_md = md
+            if md is fci_md:
+                spectrum.append(calc)
+    if not spectrum:
         raise RuntimeError('%s does not contain an FCI calculation.'%(fci_file))
 
     propogate_spectrum(beta_min, beta_max, nbeta, spectrum)
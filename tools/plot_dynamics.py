@@ -12,12 +12,14 @@ import matplotlib.pyplot as pyplot
 import numpy as np
 import pandas as pd
 
+_script_dir = os.path.dirname(os.path.abspath(__file__))
 if not pkgutil.find_loader('pyblock'):
-    _script_dir = os.path.dirname(os.path.abspath(__file__))
-    sys.path.append(os.path.join(_script_dir, '../pyhande'))
+    sys.path.append(os.path.join(_script_dir, 'pyblock'))
+if not pkgutil.find_loader('pyhande'):
+    sys.path.append(os.path.join(_script_dir, 'pyhande'))
 import pyhande
 
-def main(datafile, plotfile):
+def main(datafile, plotfile, rasterize=False):
 
     hande_out = pyhande.extract.extract_data(datafile)
     for (metadata, data) in hande_out:
@@ -25,14 +27,17 @@ def main(datafile, plotfile):
 
         # Plot the total population over the entire range
         pyplot.subplot(3,1,1)
-        pyplot.plot(data['iterations'], data['# H psips'])
+        pyhande.plot.plot_decimated(data['iterations'], data['# H psips'],
+                                    rasterized=rasterize)
         pyplot.xlabel('iteration')
         pyplot.ylabel('Total Population')
 
         # Plot the energy estimators over the entire range
         pyplot.subplot(3,1,2)
-        pyplot.plot(data['iterations'], data['\sum H_0j N_j']/data['N_0'], label='Proj. Energy')
-        pyplot.plot(data['iterations'], data['Shift'], label='Shift')
+        pyhande.plot.plot_decimated(data['iterations'], data['\sum H_0j N_j']/data['N_0'],
+                                    rasterized=rasterize, label='Proj. Energy')
+        pyhande.plot.plot_decimated(data['iterations'], data['Shift'],
+                                    rasterized=rasterize, label='Shift')
         pyplot.xlabel('iteration')
         pyplot.ylabel('Energy / $E_{h}$')
         pyplot.legend()
@@ -42,8 +47,9 @@ def main(datafile, plotfile):
         height = shoulder['mean']['shoulder height']
         data_around_shoulder = data[np.logical_and(data['# H psips'] < 1.1*height, 
                                data['# H psips'] > 0.9*height) ]
-        pyplot.plot(data_around_shoulder['iterations'], 
-               data_around_shoulder['# H psips'], label='Total Population')
+        pyhande.plot.plot_decimated(data_around_shoulder['iterations'],
+               data_around_shoulder['# H psips'], rasterized=rasterize,
+               label='Total Population')
         x_points = [min(data_around_shoulder['iterations']), 
                     max(data_around_shoulder['iterations'])]
         pyplot.plot(x_points, [height, height], label='Shoulder Height') 
@@ -72,11 +78,14 @@ def parse_args(args):
     parser = argparse.ArgumentParser(description='Plot the population and energy estimators of an FCIQMC/CCMC calulation')
     parser.add_argument('-p', '--plotfile', default='-', help='File to save the graphs to.  '
                         'The graphs are shown interactively if "-".  Default: %(default)s')
+    parser.add_argument('-r', '--rasterize', action='store_true', default=False,
+                        help='Rasterize the data (but not the axes and labels) '
+                        'when saving to a vector format such as PDF.')
     parser.add_argument('file', help='File to plot.')
     opts = parser.parse_args(args)
-    return (opts.file, opts.plotfile)
+    return (opts.file, opts.plotfile, opts.rasterize)
 
 if __name__ == '__main__':
 
-    (datafile, plotfile) = parse_args(sys.argv[1:])
-    main(datafile, plotfile)
+    (datafile, plotfile, rasterize) = parse_args(sys.argv[1:])
+    main(datafile, plotfile, rasterize)
@@ -10,11 +10,40 @@ data analysis tasks on the data obtained.  See the documentation for each
 submodule for more details.
 '''
 
-# For convenience, import all submodules so the user need only import pyhande.
-import pyhande.analysis
-import pyhande.canonical
-import pyhande.extract
-import pyhande.lazy
-import pyhande.utils
-import pyhande.weight
-import pyhande.dmqmc
+import importlib
+import sys
+
+# For convenience, the user need only import pyhande: all submodules are
+# available as attributes of pyhande.  Importing pandas, scipy and matplotlib
+# dominates the start-up time, so submodules are only imported on first access.
+_submodules = [
+    'analysis',
+    'canonical',
+    'dmqmc',
+    'extract',
+    'fcidump',
+    'lazy',
+    'logs',
+    'monitor',
+    'perf',
+    'plot',
+    'rdm',
+    'restart',
+    'utils',
+    'weight',
+]
+
+def __getattr__(name):
+    '''Import a pyhande submodule on first access.'''
+    if name in _submodules:
+        return importlib.import_module('pyhande.' + name)
+    raise AttributeError("module 'pyhande' has no attribute '%s'" % (name,))
+
+def __dir__():
+    return sorted(list(globals().keys()) + _submodules)
+
+if sys.version_info < (3, 7):
+    # Module-level __getattr__ (PEP 562) is not available so fall back to
+    # importing all submodules up front.
+    for _name in _submodules:
+        importlib.import_module('pyhande.' + _name)
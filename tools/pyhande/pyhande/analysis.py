@@ -51,15 +51,142 @@ proje : :class:`pandas.DataFrame`
 See also
 --------
 :func:`pyblock.pd_utils.reblock` for producing the input parameters.
+:func:`projected_energies` for evaluating multiple (or complex) projected
+energy estimators at once.
 '''
 
-    proje_sum = reblock_data.ix[:, sum_key]
-    ref_pop = reblock_data.ix[:, ref_key]
-    proje_ref_cov = covariance.xs(ref_key, level=1)[sum_key]
-    proje = pyblock.error.ratio(proje_sum, ref_pop, proje_ref_cov, data_length)
-    proje.columns = pd.MultiIndex.from_tuples(
-            [(col_name, col) for col in proje.columns])
-    return proje
+    return projected_energies(reblock_data, covariance, data_length,
+                              [(sum_key, ref_key, col_name)])
+
+def projected_energies(reblock_data, covariance, data_length, estimators):
+    '''Calculate multiple projected energy estimators and associated errors.
+
+All estimators are evaluated at all reblock iterations at once, using the
+covariance between all numerators and denominators.  Complex estimators,
+
+.. math::
+
+    E = \\frac{Re\\{\\sum H_0j N_j\\} + i Im\\{\\sum H_0j N_j\\}}{Re\\{N_0\\} + i Im\\{N_0\\}},
+
+are also supported, in which case the error in the real and imaginary parts
+accounts for the covariance between all four quantities.
+
+Parameters
+----------
+reblock_data, covariance, data_length :
+    See :func:`projected_energy`.
+estimators : list of tuples
+    (sum_key, ref_key, col_name) for each projected energy estimator, where
+    sum_key and ref_key are the column names in reblock_data containing the
+    numerator and denominator and col_name is the name to give the
+    estimator (see :func:`projected_energy`).  For a complex estimator, sum_key
+    and ref_key are instead tuples of the columns containing the real and
+    imaginary parts (e.g. ``('Re{\\sum H_0j N_j}', 'Im{\\sum H_0j N_j}')``), and
+    the real and imaginary parts of the estimator are named 'Re{col_name}' and
+    'Im{col_name}'.
+
+Returns
+-------
+proje : :class:`pandas.DataFrame`
+    The projected energy estimators at each reblock iteration.
+
+See also
+--------
+:func:`pyblock.pd_utils.reblock` for producing the input parameters.
+'''
+
+    columns = list(covariance.columns)
+    icol = dict((c, i) for (i, c) in enumerate(columns))
+    nreblock = len(reblock_data)
+    cov = covariance.values.reshape(nreblock, len(columns), len(columns))
+    means = reblock_data.xs('mean', axis=1, level=1)
+    data_length = numpy.asarray(data_length, dtype=float)
+
+    real = [est for est in estimators if not isinstance(est[0], tuple)]
+    cmplx = [est for est in estimators if isinstance(est[0], tuple)]
+    stats = {}
+    if real:
+        a = means[[est[0] for est in real]].values
+        b = means[[est[1] for est in real]].values
+        mean = a / b
+        # Derivatives of A/B with respect to A and B.
+        jacobian = numpy.array([1/b, -mean/b])
+        keys = [[est[0] for est in real], [est[1] for est in real]]
+        std_err = _propagate_error(jacobian, keys, icol, cov, data_length)
+        for (i, est) in enumerate(real):
+            stats[est[2]] = (mean[:,i], std_err[:,i], est[:2])
+    if cmplx:
+        (a, b) = (means[[est[0][0] for est in cmplx]].values,
+                  means[[est[0][1] for est in cmplx]].values)
+        (c, d) = (means[[est[1][0] for est in cmplx]].values,
+                  means[[est[1][1] for est in cmplx]].values)
+        denom = c**2 + d**2
+        re = (a*c + b*d) / denom
+        im = (b*c - a*d) / denom
+        keys = [[est[0][0] for est in cmplx], [est[0][1] for est in cmplx],
+                [est[1][0] for est in cmplx], [est[1][1] for est in cmplx]]
+        # Derivatives of the real and imaginary parts of (a+ib)/(c+id) with
+        # respect to a, b, c and d.
+        re_jacobian = numpy.array([c, d, a-2*c*re, b-2*d*re]) / denom
+        im_jacobian = numpy.array([-d, c, b-2*c*im, -a-2*d*im]) / denom
+        re_err = _propagate_error(re_jacobian, keys, icol, cov, data_length)
+        im_err = _propagate_error(im_jacobian, keys, icol, cov, data_length)
+        for (i, est) in enumerate(cmplx):
+            variables = est[0] + est[1]
+            stats['Re{%s}' % (est[2],)] = (re[:,i], re_err[:,i], variables)
+            stats['Im{%s}' % (est[2],)] = (im[:,i], im_err[:,i], variables)
+
+    proje = []
+    names = []
+    for est in estimators:
+        if isinstance(est[0], tuple):
+            names.extend(['Re{%s}' % (est[2],), 'Im{%s}' % (est[2],)])
+        else:
+            names.append(est[2])
+    for name in names:
+        (mean, std_err, variables) = stats[name]
+        df = pd.DataFrame({'mean': mean, 'standard error': std_err},
+                          index=reblock_data.index)
+        # The optimal block of the estimator is the largest of the optimal
+        # blocks of the variables it depends upon (cf pyblock.error.ratio).
+        if all('optimal block' in reblock_data[var].columns
+               for var in variables):
+            opt = [pyblock.pd_utils.optimal_block(reblock_data[var])
+                   for var in variables]
+            df['optimal block'] = reblock_data[variables[numpy.argmax(opt)]]['optimal block']
+        df.columns = pd.MultiIndex.from_tuples([(name, col) for col in df.columns])
+        proje.append(df)
+    return pd.concat(proje, axis=1)
+
+def _propagate_error(jacobian, keys, icol, cov, data_length):
+    '''Propagate the standard error through a function of several variables.
+
+Parameters
+----------
+jacobian : :class:`numpy.ndarray`
+    Derivatives of the function with respect to each variable, of shape
+    (nvariables, nreblock, nfunctions).
+keys : list of lists of strings
+    Name of each variable for each function, in the same order as jacobian.
+icol : dict
+    Index of each variable in the covariance matrix.
+cov : :class:`numpy.ndarray`
+    Covariance matrix of the variables at each reblock iteration.
+data_length : :class:`numpy.ndarray`
+    number of data points in each reblock iteration.
+
+Returns
+-------
+std_err : :class:`numpy.ndarray`
+    Standard error in each function at each reblock iteration.
+'''
+
+    indx = numpy.array([[icol[k] for k in var_keys] for var_keys in keys])
+    # cov_fn[r,i,j,f] is the covariance of variables i and j of function f at
+    # reblock iteration r.
+    cov_fn = cov[:, indx[:,None,:], indx[None,:,:]]
+    var = numpy.einsum('irf,rijf,jrf->rf', jacobian, cov_fn, jacobian)
+    return numpy.sqrt(var / data_length[:,None])
 
 def qmc_summary(data, keys=('\sum H_0j N_j', 'N_0', 'Shift', 'Proj. Energy'),
                             summary_tuple=None):
@@ -90,7 +217,7 @@ no_opt : list of strings
         (opt_data, no_opt) = ([], [])
     for col in keys:
         if col in data:
-            summary = pyblock.pd_utils.reblock_summary(data.ix[:, col])
+            summary = pyblock.pd_utils.reblock_summary(data.loc[:, col])
             if summary.empty:
                 no_opt.append(col)
             else:
@@ -172,21 +299,44 @@ plateau_data : :class:`pandas.DataFrame`
     An estimate of the shoulder (plateau) from a FCIQMC (CCMC) calculation,
     along with the associated standard error.
 '''
-    plateau_data = []
     if pop_data is None:
         pop_data = extract_pop_growth(data, ref_key, shift_key, min_ref_pop)
 
-    pop_data['Shoulder'] = pop_data[total_key]/abs(pop_data[ref_key])
-    sorted_data = pop_data.sort_values('Shoulder')
-    plateau_data.append([sorted_data[-10:]['Shoulder'].mean(),
-                         sorted_data[-10:]['Shoulder'].sem()])
-    plateau_data.append([sorted_data[-10:][total_key].mean(),
-                         sorted_data[-10:][total_key].sem()])
-    plateau_data = pd.DataFrame(data=plateau_data, 
+    plateau_data = _shoulder(pop_data[total_key].values,
+                             pop_data[ref_key].values)
+    plateau_data = pd.DataFrame(data=numpy.reshape(plateau_data, (2, 2)),
                                columns=['mean', 'standard error'],\
                                index=['shoulder estimator', 'shoulder height'])
     return plateau_data
 
+def _shoulder(total_pop, ref_pop, npoints=10):
+    '''Evaluate the shoulder estimator (see :func:`plateau_estimator`).
+
+Parameters
+----------
+total_pop : :class:`numpy.ndarray`
+    Total population during the population growth phase.
+ref_pop : :class:`numpy.ndarray`
+    Population on the reference during the population growth phase.
+npoints : int
+    Number of points with the largest ratio of total population to reference
+    population to average over.
+
+Returns
+-------
+shoulder : tuple of floats
+    Mean and standard error of the shoulder estimator and of the shoulder
+    height.
+'''
+
+    ratio = total_pop/abs(ref_pop)
+    if len(ratio) > npoints:
+        # Only need the largest npoints values, not a full sort.
+        top = numpy.argpartition(ratio, -npoints)[-npoints:]
+        (ratio, total_pop) = (ratio[top], total_pop[top])
+    sem = lambda x: x.std(ddof=1)/numpy.sqrt(len(x)) if len(x) > 1 else numpy.nan
+    return (ratio.mean(), sem(ratio), total_pop.mean(), sem(total_pop))
+
 def plateau_estimator_hist(data, total_key='# H psips', shift_key='Shift',
                           pop_data=None, bin_width_fn=None):
     '''Estimate the plateau height via a histogram of the population.
@@ -251,6 +401,106 @@ Shepherd14
     else:
         return numpy.mean(10**bin_edges[hist_max:hist_max+2])
 
+def plateau_estimators(calcs, total_key='# H psips', ref_key='N_0',
+                       shift_key='Shift', min_ref_pop=10, bin_width=None,
+                       processes=None):
+    '''Estimate the plateau height of many FCIQMC/CCMC calculations.
+
+Both :func:`plateau_estimator` and :func:`plateau_estimator_hist` are evaluated
+for each calculation.
+
+Parameters
+----------
+calcs : list of :class:`pandas.DataFrame`
+    HANDE QMC data for each calculation.
+total_key, ref_key, shift_key, min_ref_pop :
+    See :func:`plateau_estimator`.
+bin_width : float
+    Bin width of the histogram of the logarithm (base 10) of the population.
+    If supplied, all calculations are binned using the same bins, which start
+    at a population of 1.  Otherwise the bin width and bins are chosen for
+    each calculation as in :func:`plateau_estimator_hist`.
+processes : int
+    Number of processes to use to find the population growth phase of and
+    evaluate the estimators for each calculation.  Default: a single process
+    for fewer than 100 calculations and one process per CPU otherwise.
+
+Returns
+-------
+plateaus : :class:`pandas.DataFrame`
+    The shoulder estimator and shoulder height (and associated standard
+    errors) and the histogram estimate of the plateau for each calculation
+    (row).
+'''
+
+    args = [(calc, total_key, ref_key, shift_key, min_ref_pop, bin_width)
+            for calc in calcs]
+    if processes is None:
+        processes = 1 if len(calcs) < 100 else None
+    if processes == 1:
+        estimates = [_plateau_estimates(arg) for arg in args]
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+        try:
+            estimates = pool.map(_plateau_estimates, args)
+        finally:
+            pool.close()
+            pool.join()
+
+    columns = ['shoulder estimator', 'shoulder estimator error',
+               'shoulder height', 'shoulder height error']
+    plateaus = pd.DataFrame([est[0] for est in estimates], columns=columns)
+    if bin_width is None:
+        plateaus['histogram plateau'] = [est[1] for est in estimates]
+    else:
+        # Histogram all calculations at once using the same bins.
+        bins = [est[1] for est in estimates]
+        ncalcs = len(bins)
+        icalc = numpy.repeat(numpy.arange(ncalcs), [len(b) for b in bins])
+        bins = numpy.concatenate(bins).astype(int)
+        nbins = bins.max() + 1 if len(bins) else 1
+        hist = numpy.bincount(icalc*nbins + bins, minlength=ncalcs*nbins)
+        hist = hist.reshape(ncalcs, nbins)
+        hist_max = hist.argmax(axis=1)
+        # Last occupied bin of each calculation.
+        last = nbins - 1 - (hist[:,::-1] > 0).argmax(axis=1)
+        plateau = 0.5*(10**(hist_max*bin_width) + 10**((hist_max+1)*bin_width))
+        # If the histogram peaks in the last bin, then most likely the
+        # simulation has not reached a plateau.
+        plateau[(hist_max == last) | (hist.sum(axis=1) == 0)] = numpy.nan
+        plateaus['histogram plateau'] = plateau
+    return plateaus
+
+def _plateau_estimates(args):
+    '''Evaluate the plateau estimators for a single calculation.
+
+Parameters
+----------
+args : tuple
+    (calc, total_key, ref_key, shift_key, min_ref_pop, bin_width).  See
+    :func:`plateau_estimators`.
+
+Returns
+-------
+shoulder : tuple of floats
+    See :func:`_shoulder`.
+hist : float or :class:`numpy.ndarray`
+    Plateau estimated by :func:`plateau_estimator_hist` if bin_width is None,
+    otherwise the bin index of each point in the population growth phase.
+'''
+
+    (calc, total_key, ref_key, shift_key, min_ref_pop, bin_width) = args
+    pop_data = extract_pop_growth(calc, ref_key, shift_key, min_ref_pop)
+    shoulder = _shoulder(pop_data[total_key].values, pop_data[ref_key].values)
+    pop_data = extract_pop_growth(calc, ref_key, shift_key, min_ref_pop=0)
+    if bin_width is None:
+        hist = plateau_estimator_hist(calc, total_key, shift_key, pop_data)
+    else:
+        hist = numpy.floor(numpy.log10(pop_data[total_key].values)/bin_width)
+        hist = numpy.maximum(hist, 0)
+    return (shoulder, hist)
+
 
 
 def inefficiency(opt_block, dtau, iterations):
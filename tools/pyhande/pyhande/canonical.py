@@ -68,62 +68,109 @@ results : :class:`pandas.Series`
     Averaged estimates.
 '''
 
-    data['U_0'] = data['<T>_0'] + data['<V>_0']
-    data[r'Tr(H\rho_HF)'] = data[r'Tr(T\rho_HF)'] + data[r'Tr(V\rho_HF)']
-
-    ncycles = len(data) # For standard error.
-    # Ensure some backwards compatability.
-    if 'N_ACC/N_ATT' in data.columns:
-        # Work out weights given that number of configurations generated differs
-        # between cycles.
-        w = data['N_ACC/N_ATT'] * metadata['nattempts']
-    else:
-        w = np.ones(ncycles)
-    # Number of configurations.
-    nsamples = sum(w)
+    return multi_sim_estimates([metadata], [data]).iloc[0]
+
+
+def multi_sim_estimates(metadata, data):
+    '''Perform error analysis for canonical thermodynamic estimates from many simulations.
+
+The data from all simulations are stacked into a single (zero-weight padded)
+array, so the weighted means and the required covariances are evaluated for
+all simulations at once.
+
+Parameters
+----------
+metadata : list of dicts
+    metadata (i.e. calculation information, parameters and settings) extracted
+    from output files for each simulation.
+data : list of :class:`pandas.DataFrame`
+    HANDE QMC data for each simulation.
+
+Returns
+-------
+results : :class:`pandas.DataFrame`
+    Averaged estimates (see :func:`estimates`) for each simulation (row).
+'''
+
+    columns = ['<T>_0', '<V>_0', r'Tr(T\rho_HF)', r'Tr(V\rho_HF)',
+               r'Tr(\rho_HF)']
+    acceptance = all('N_ACC/N_ATT' in df.columns for df in data)
+    if acceptance:
+        columns.append('N_ACC/N_ATT')
+    icol = dict((c, i) for (i, c) in enumerate(columns))
+
+    # Stack data, padding with zero-weight entries.
+    ncycles = np.array([len(df) for df in data])
+    values = np.zeros((len(data), ncycles.max(), len(columns)))
+    w = np.zeros((len(data), ncycles.max()))
+    for (i, (md, df)) in enumerate(zip(metadata, data)):
+        values[i,:ncycles[i]] = df[columns].values
+        if acceptance:
+            # Work out weights given that number of configurations generated
+            # differs between cycles.
+            w[i,:ncycles[i]] = df['N_ACC/N_ATT'].values * md['nattempts']
+        else:
+            w[i,:ncycles[i]] = 1.0
+    # Total energies.
+    values = np.concatenate([
+        values,
+        values[:,:,[icol['<T>_0']]] + values[:,:,[icol['<V>_0']]],
+        values[:,:,[icol[r'Tr(T\rho_HF)']]] + values[:,:,[icol[r'Tr(V\rho_HF)']]],
+    ], axis=2)
+    icol['U_0'] = len(columns)
+    icol[r'Tr(H\rho_HF)'] = len(columns) + 1
+
     # Normalise the weights.
-    w = w / nsamples
+    w = w / w.sum(axis=1)[:,None]
     # Weighted estimate for the means.
-    means = (
-        pd.Series(np.average(data, axis=0, weights=w), index=list(data.keys()))
-    )
-    # Weighted estimate for the covariance. See
-    # https://en.wikipedia.org/wiki/Weighted_arithmetic_mean and
+    means = np.einsum('sn,snc->sc', w, values)
+    # Weighted estimate for the covariance of the required pairs of columns.
+    # See https://en.wikipedia.org/wiki/Weighted_arithmetic_mean and
     # http://stats.stackexchange.com/questions/61225/correct-equation-for-weighted-unbiased-sample-covariance
     # for more details.
-    w2 = sum(w**2.0)
-    xm = data.sub(means, axis=1)
-    covariances = 1.0/(1.0-w2) * xm.mul(w, axis=0).T.dot(xm)
-
-    if 'beta' in metadata:
-        # New, richer JSON-based metadata.
-        beta = metadata['beta']
-    else:
-        # Hope to find it in the input file...
-        beta = pyhande.legacy.extract_input(metadata, 'beta')
-    results = {
-        'Beta': beta,
-        # Free estimates contain no denominator so the error is
-        # just the standard error.
-        'U_0': means['U_0'],
-        'U_0_error': np.sqrt(covariances['U_0']['U_0']/ncycles),
-        'T_0': means['<T>_0'],
-        'T_0_error': np.sqrt(covariances['<T>_0']['<T>_0']/ncycles),
-        'V_0': means['<V>_0'],
-        'V_0_error': np.sqrt(covariances['<V>_0']['<V>_0']/ncycles),
-    }
-    if 'N_ACC/N_ATT' in data.columns:
-        if metadata['fermi_temperature']:
-            beta = results['Beta'] / metadata['system']['ueg']['E_fermi']
+    pairs = [('U_0', 'U_0'), ('<T>_0', '<T>_0'), ('<V>_0', '<V>_0'),
+             (r'Tr(\rho_HF)', r'Tr(\rho_HF)')]
+    hf_observables = [
+        ('T_HF', r'Tr(T\rho_HF)'),
+        ('V_HF', r'Tr(V\rho_HF)'),
+        ('U_HF', r'Tr(H\rho_HF)'),
+    ]
+    for (k, v) in hf_observables:
+        pairs.extend([(v, v), (v, r'Tr(\rho_HF)')])
+    if acceptance:
+        pairs.extend([('N_ACC/N_ATT', 'N_ACC/N_ATT'), ('N_ACC/N_ATT', '<T>_0')])
+    xm = values - means[:,None,:]
+    (ia, ib) = ([icol[a] for (a, b) in pairs], [icol[b] for (a, b) in pairs])
+    w2 = (w**2).sum(axis=1)
+    cov = np.einsum('sn,snp,snp->sp', w, xm[:,:,ia], xm[:,:,ib])
+    cov = cov / (1.0-w2)[:,None]
+    cov = dict((pair, cov[:,i]) for (i, pair) in enumerate(pairs))
+    means = dict((c, means[:,i]) for (c, i) in icol.items())
+
+    beta = []
+    for md in metadata:
+        if 'beta' in md:
+            # New, richer JSON-based metadata.
+            beta.append(md['beta'])
         else:
-            beta = results['Beta']
-        correction = metadata['free_energy_corr']
-        results.update({
-            'N_ACC/N_ATT': means['N_ACC/N_ATT'],
-            'N_ACC/N_ATT_error': (
-                np.sqrt(covariances['N_ACC/N_ATT']['N_ACC/N_ATT']/ncycles)
-            ),
-        })
+            # Hope to find it in the input file...
+            beta.append(float(pyhande.legacy.extract_input(md, 'beta')[0]))
+    results = pd.DataFrame({'Beta': np.array(beta, dtype=float)})
+    # Free estimates contain no denominator so the error is just the standard
+    # error.
+    for (k, v) in [('U_0', 'U_0'), ('T_0', '<T>_0'), ('V_0', '<V>_0')]:
+        results[k] = means[v]
+        results[k+'_error'] = np.sqrt(cov[(v, v)]/ncycles)
+    if acceptance:
+        beta = results['Beta'].values.copy()
+        for (i, md) in enumerate(metadata):
+            if md['fermi_temperature']:
+                beta[i] /= md['system']['ueg']['E_fermi']
+        correction = np.array([md['free_energy_corr'] for md in metadata])
+        results['N_ACC/N_ATT'] = means['N_ACC/N_ATT']
+        results['N_ACC/N_ATT_error'] = (
+                np.sqrt(cov[('N_ACC/N_ATT', 'N_ACC/N_ATT')]/ncycles)
+        )
         results['F_0'] = (
                 (-1.0/beta)*np.log(results['N_ACC/N_ATT']) + correction
         )
@@ -137,12 +184,98 @@ results : :class:`pandas.Series`
         # df/dy = -kT/(N_ACC/N_ATT)
         results['S_0_error'] = (beta*np.sqrt(results['T_0_error']**2.0 +
                                 results['F_0_error']**2.0 -
-                                2.0*covariances['N_ACC/N_ATT']['<T>_0'] /
+                                2.0*cov[('N_ACC/N_ATT', '<T>_0')] /
                                 (ncycles*results['N_ACC/N_ATT']*beta)))
-    results = pd.Series(results)
 
     # Take care of the correlation between numerator and denominator
     # in Hartree-Fock estimates.
-    results = results.append(analyse_hf_observables(means, covariances, ncycles))
+    trace = pd.DataFrame({
+        'mean': means[r'Tr(\rho_HF)'],
+        'standard error': np.sqrt(cov[(r'Tr(\rho_HF)', r'Tr(\rho_HF)')]/ncycles),
+    })
+    for (k, v) in hf_observables:
+        num = pd.DataFrame({
+            'mean': means[v],
+            'standard error': np.sqrt(cov[(v, v)]/ncycles),
+        })
+        stats = pyblock.error.ratio(num, trace, cov[(v, r'Tr(\rho_HF)')],
+                                    ncycles)
+        results[k] = stats['mean']
+        results[k+'_error'] = stats['standard error']
+
+    return results
+
+
+def fci_thermodynamics(spectrum, beta, max_size=10**7):
+    '''Evaluate exact canonical thermodynamic quantities from an FCI spectrum.
+
+The Boltzmann factors for all beta values are evaluated together and the
+partition function is found using the log-sum-exp trick, so neither overflows
+or underflows at large beta.  Degenerate eigenvalues are combined before the
+Boltzmann factors are evaluated and, for each batch of beta values, excited
+states with a negligible (less than e^-50 relative to the ground state)
+Boltzmann factor are skipped.
+
+Parameters
+----------
+spectrum : :class:`pandas.Series`, list of :class:`pandas.Series` or :class:`numpy.ndarray`
+    Eigenvalues of the Hamiltonian, e.g. the FCI (LAPACK) eigenvalues obtained
+    from :func:`pyhande.extract.extract_data`.  If a list is given (e.g. the
+    eigenvalues in each symmetry block), the eigenvalues are combined into
+    a single spectrum.
+beta : float or :class:`numpy.ndarray`
+    (Inverse) temperatures at which to evaluate the thermodynamic quantities.
+max_size : int
+    Maximum number of Boltzmann factors to hold in memory at once.  The beta
+    values are handled in batches if necessary.
+
+Returns
+-------
+results : :class:`pandas.DataFrame`
+    Internal energy ('U'), heat capacity ('C_v'), free energy ('F') and entropy
+    ('S') at each beta value (index), in units where k_B=1.
+'''
+
+    if isinstance(spectrum, list):
+        spectrum = np.concatenate([np.asarray(s, dtype=float) for s in spectrum])
+    (eigv, degeneracy) = np.unique(np.asarray(spectrum, dtype=float),
+                                   return_counts=True)
+    beta = np.atleast_1d(np.asarray(beta, dtype=float))
+
+    # Measure energies relative to the ground state to avoid loss of precision
+    # in the energy and heat capacity.
+    e0 = eigv[0]
+    de = eigv - e0
+    log_degeneracy = np.log(degeneracy)
+
+    # Handle the beta values in increasing order, so the number of states
+    # which contribute decreases from batch to batch.
+    order = np.argsort(beta)
+    (log_z, energy, var) = (np.empty(len(beta)), np.empty(len(beta)),
+                            np.empty(len(beta)))
+    step = max(1, max_size//len(eigv))
+    cutoff = 50 + np.log(degeneracy.sum())
+    for start in range(0, len(beta), step):
+        indx = order[start:start+step]
+        b = beta[indx]
+        if b[0] > 0:
+            nstates = np.searchsorted(de, cutoff/b[0], side='right')
+        else:
+            nstates = len(de)
+        # log of the (degeneracy-weighted) Boltzmann factors.
+        exponent = log_degeneracy[:nstates] - b[:,None]*de[:nstates]
+        shift = exponent.max(axis=1)
+        boltzmann = np.exp(exponent - shift[:,None])
+        z = boltzmann.sum(axis=1)
+        e = boltzmann.dot(de[:nstates])/z
+        log_z[indx] = shift + np.log(z) - b*e0
+        energy[indx] = e
+        var[indx] = boltzmann.dot(de[:nstates]**2)/z - e**2
 
+    results = pd.DataFrame(index=pd.Index(beta, name='Beta'))
+    results['U'] = energy + e0
+    results['C_v'] = beta**2*np.maximum(var, 0)
+    with np.errstate(divide='ignore'):
+        results['F'] = -log_z/beta
+    results['S'] = beta*results['U'] + log_z
     return results
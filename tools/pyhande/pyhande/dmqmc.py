@@ -1,10 +1,10 @@
 '''Analysis of data from dmqmc calculations.'''
 
+import collections
+import re
 import pandas as pd
 import numpy as np
 import warnings
-import scipy.interpolate
-import scipy.integrate
 import pyblock
 import pyhande
 
@@ -17,8 +17,12 @@ means : :class:`pandas.DatFrame`
     The mean estimates, obtained by averaging over beta loops, as a function of
     beta, which is used as the index.
 covariances : :class:`pandas.DataFrame`
-    Estimates of the covariance matrix as a function of the beta, which is used
-    as the index.
+    Estimates of the covariance between pairs of columns as a function of beta.
+    Either the covariances of the required pairs of columns, with beta as the
+    index and (column, column) tuples as the columns (as produced by
+    :func:`beta_loop_statistics`), or the full covariance matrix, with
+    a (beta, column) MultiIndex (as produced by
+    :meth:`pandas.core.groupby.DataFrameGroupBy.cov`).
 nsamples : :class:`pandas.Series`
     The number of samples contributing to the various beta values.
 
@@ -31,6 +35,47 @@ None.
     columns = list(means.columns.values)
     beta_values = means.index.values
 
+    observables = _observables(columns)
+
+    # DataFrame to hold the final mean and error estimates.
+    results = pd.DataFrame(index=beta_values)
+    # DataFrame for the numerator.
+    num = pd.DataFrame(columns=['mean','standard error'], index=beta_values)
+    # DataFrame for the trace from the first replica.
+    tr1 = pd.DataFrame(columns=['mean','standard error'], index=beta_values)
+
+    tr1['mean'] = means['Trace']
+    tr1['standard error'] = np.sqrt(_cov(covariances, 'Trace', 'Trace')/nsamples)
+
+    for (k,v) in observables.items():
+        if v in columns:
+            num['mean'] = means[v]
+            num['standard error'] = np.sqrt(_cov(covariances, v, v)/nsamples)
+            cov_AB = _cov(covariances, 'Trace', v)
+
+            stats = pyblock.error.ratio(num, tr1, cov_AB, nsamples)
+
+            results[k] = stats['mean']
+            results[k+'_error'] = stats['standard error']
+
+    return results
+
+
+def _observables(columns):
+    '''Find observables of the form Tr(\\rho O)/Tr(\\rho) in a DMQMC data table.
+
+Parameters
+----------
+columns : list
+    Columns in hande output.
+
+Returns
+-------
+observables : dict
+    The keys hold the names to be output and the values hold the possible
+    columns names in the data table.
+'''
+
     # The keys hold the names to be output and the values hold the possible
     # columns names in the means and covariances DataFrames.
     observables = dict([
@@ -53,28 +98,8 @@ None.
     add_observable_to_dict(observables, columns, 'Suu_')
     # Add spin down static structure factor to dict of observables to be analaysed.
     add_observable_to_dict(observables, columns, 'Sud_')
-    # DataFrame to hold the final mean and error estimates.
-    results = pd.DataFrame(index=beta_values)
-    # DataFrame for the numerator.
-    num = pd.DataFrame(columns=['mean','standard error'], index=beta_values)
-    # DataFrame for the trace from the first replica.
-    tr1 = pd.DataFrame(columns=['mean','standard error'], index=beta_values)
-
-    tr1['mean'] = means['Trace']
-    tr1['standard error'] = np.sqrt(covariances.xs('Trace',level=1)['Trace']/nsamples)
-
-    for (k,v) in observables.items():
-        if v in columns:
-            num['mean'] = means[v]
-            num['standard error'] = np.sqrt(covariances.xs(v,level=1)[v]/nsamples)
-            cov_AB = covariances.xs('Trace',level=1)[v]
 
-            stats = pyblock.error.ratio(num, tr1, cov_AB, nsamples)
-
-            results[k] = stats['mean']
-            results[k+'_error'] = stats['standard error']
-
-    return results
+    return observables
 
 
 def add_observable_to_dict(observables, columns, label):
@@ -96,41 +121,70 @@ label : string
     observables.update(dict(zip(new_obs, new_obs)))
 
 
-def free_energy_error_analysis(data, results, dtau):
+def free_energy_error_analysis(data, results, dtau, jackknife_blocks=None):
     '''Calculate the mean and error estimates for the exchange correlation
        free energy (appropriately defined)
 
 Parameters
 ----------
 data : :class:`pandas.DataFrame`
-    Raw dmqmc data.
+    Raw dmqmc data.  The beta values must be either in a 'Beta' column or
+    a 'Beta' level of the index.
 results : :class:`pandas.DataFrame`
     The mean estimates, obtained by averaging over beta loops, as a function of
     beta, which is used as the index. On output estimates for f_xc and its error
     are appended.
 dtau : float
     Time step used in simulation.
+jackknife_blocks : int or None
+    If not None, estimate the error using a jackknife analysis of the integral
+    of the ratio of the mean estimates, with the beta loops divided into
+    ``jackknife_blocks`` blocks.  Otherwise (default) the error is estimated
+    from the variance of the integral evaluated for each beta loop.
 '''
+
     # Integral is evaulated as cumulative integral of integral for each
     # temperature/imaginary time value. Naturally I(tau=0) = 0.
-    I = scipy.integrate.cumtrapz(results['VI'], dx=dtau, initial=0)
+    I = cumulative_trapezoid(results['VI'].values, dtau)
+
+    # Integral evaluated for all beta loops at once from an array of shape
+    # (number of beta loops, number of beta values).
+    if 'Beta' in data.columns:
+        beta_values = data['Beta'].values
+    else:
+        beta_values = data.index.get_level_values('Beta')
+    (beta, cube) = beta_loop_cube(data[[r'\sum\rho_{ij}VI_{ji}', 'Trace']],
+                                  beta_values)
+    (vi, trace) = (cube[:,:,0], cube[:,:,1])
 
     # An estimate for the error can be found by considering the variance of each
     # simulations estimate for the Integral.
-    grouped = pyhande.utils.groupby_beta_loops(data.reset_index(), name='Beta')
-    I_single = [scipy.integrate.cumtrapz(d[r'\sum\rho_{ij}VI_{ji}']/d['Trace'],
-                dx=dtau, initial=0) for (i, d) in grouped]
-
-    # Place cumulative integrals in frame so variance can be easily calculated.
-    frame = pd.DataFrame(I_single)
-    I_single_mean = frame.mean()
-    I_error = ((frame.var() / len(grouped)))**0.5
+    I_single = cumulative_trapezoid(vi/trace, dtau, axis=1)
+    nloops = (~np.isnan(I_single)).sum(axis=0)
+    I_single_mean = np.nanmean(I_single, axis=0)
+    if jackknife_blocks:
+        # Jackknife estimate of the error in the integral of the ratio of the
+        # means, with the estimates from each block of beta loops left out in
+        # turn.
+        valid = ~np.isnan(cube).any(axis=2)
+        vi = np.where(valid, vi, 0.0)
+        trace = np.where(valid, trace, 0.0)
+        blocks = np.array_split(np.arange(len(cube)), jackknife_blocks)
+        starts = [block[0] for block in blocks if len(block)]
+        nblocks = len(starts)
+        vi_jk = vi.sum(axis=0) - np.add.reduceat(vi, starts, axis=0)
+        trace_jk = trace.sum(axis=0) - np.add.reduceat(trace, starts, axis=0)
+        I_jk = cumulative_trapezoid(vi_jk/trace_jk, dtau, axis=1)
+        I_error = np.sqrt((nblocks-1.0)/nblocks *
+                          ((I_jk - I_jk.mean(axis=0))**2).sum(axis=0))
+    else:
+        I_error = np.sqrt(np.nanvar(I_single, axis=0, ddof=1) / nloops)
 
     # Some sort of check for poor estimation of mean/error.
     # Check if last point's 'ratio' error (not quite the normal definition) is
     # significant (so comparible to the stochastic error).
-    err = abs(I[-1]-I_single_mean.iloc[-1])
-    if (abs(err) > I_error.iloc[-1]):
+    err = abs(I[-1]-I_single_mean[-1])
+    if (abs(err) > I_error[-1]):
         warnings.warn("Ratio error of %f is not insignificant - check results."
                       %err)
 
@@ -141,6 +195,32 @@ dtau : float
     results['f_xc_error'] = I_error/results['Beta'].iloc[-1]
 
 
+def cumulative_trapezoid(y, dx, axis=-1):
+    '''Cumulatively integrate using the trapezium rule.
+
+Equivalent to :func:`scipy.integrate.cumtrapz` with ``initial=0`` for evenly
+spaced samples.
+
+Parameters
+----------
+y : :class:`numpy.ndarray`
+    Values to integrate.
+dx : float
+    Spacing between the samples.
+axis : int
+    Axis along which to integrate.
+
+Returns
+-------
+integral : :class:`numpy.ndarray`
+    Cumulative integral of ``y`` along ``axis``, of the same shape as ``y``.
+'''
+
+    y = np.moveaxis(np.asarray(y, dtype=float), axis, -1)
+    integral = np.zeros(y.shape)
+    integral[...,1:] = np.cumsum(0.5*dx*(y[...,1:] + y[...,:-1]), axis=-1)
+    return np.moveaxis(integral, -1, axis)
+
 def analyse_renyi_entropy(means, covariances, nsamples):
     '''Calculate the mean and error estimates for the Renyi entropy (S2), for
        all subsystems, including the entire system if present.
@@ -151,8 +231,12 @@ means : :class:`pandas.DatFrame`
     The mean estimates, obtained by averaging over beta loops, as a function of
     beta, which is used as the index.
 covariances : :class:`pandas.DataFrame`
-    Estimates of the covariance matrix as a function of the beta, which is used
-    as the index.
+    Estimates of the covariance between pairs of columns as a function of beta.
+    Either the covariances of the required pairs of columns, with beta as the
+    index and (column, column) tuples as the columns (as produced by
+    :func:`beta_loop_statistics`), or the full covariance matrix, with
+    a (beta, column) MultiIndex (as produced by
+    :meth:`pandas.core.groupby.DataFrameGroupBy.cov`).
 nsamples : :class:`pandas.Series`
     The number of samples contributing to the various beta values.
 
@@ -177,43 +261,333 @@ None.
 
     # Compute the mean and standard error estimates for the Renyi entropy (S2),
     # for all subsystems.
+    for (num_col, tr1_col, tr2_col, out_str) in _renyi_columns(columns):
+        num['mean'] = means[num_col]
+        tr1['mean'] = means[tr1_col]
+        tr2['mean'] = means[tr2_col]
+        num['standard error'] = np.sqrt(_cov(covariances, num_col, num_col)/nsamples)
+        tr1['standard error'] = np.sqrt(_cov(covariances, tr1_col, tr1_col)/nsamples)
+        tr2['standard error'] = np.sqrt(_cov(covariances, tr2_col, tr2_col)/nsamples)
+
+        # A denotes the numerator, B denotes the first trace and C denotes
+        # the second trace.
+        cov_AB = _cov(covariances, num_col, tr1_col)
+        cov_AC = _cov(covariances, num_col, tr2_col)
+        cov_BC = _cov(covariances, tr1_col, tr2_col)
+
+        results[out_str], results[out_str+' error'] = \
+            calc_S2(num, tr1, tr2, cov_AB, cov_AC, cov_BC, nsamples)
+
+    return results
+
+
+def _renyi_columns(columns):
+    '''Find the columns required to evaluate the Renyi entropy (S2).
+
+Parameters
+----------
+columns : list
+    Columns in hande output.
+
+Returns
+-------
+renyi : list of tuples
+    (numerator, first trace, second trace, output name) columns for each
+    subsystem (and the entire system if present).
+'''
+
+    renyi = []
     nrdms = 0
     for column in columns:
-        have_s2 = False
         if 'RDM' in column and 'S2' in column: # RDM S2
             nrdms += 1
-            have_s2 = True
-            num_col = column
-            tr1_col = 'RDM'+str(nrdms)+' trace 1'
-            tr2_col = 'RDM'+str(nrdms)+' trace 2'
-            out_str = 'RDM'+str(nrdms)+' S2'
+            renyi.append((column, 'RDM'+str(nrdms)+' trace 1',
+                          'RDM'+str(nrdms)+' trace 2', 'RDM'+str(nrdms)+' S2'))
         elif 'Full S2' in column: # Full S2
-            have_s2 = True
-            num_col = column
-            tr1_col = 'Trace'
-            tr2_col = 'Trace 2'
-            out_str = 'Full S2'
-
-        if have_s2:
-            num['mean'] = means[num_col]
-            tr1['mean'] = means[tr1_col]
-            tr2['mean'] = means[tr2_col]
-            num['standard error'] = np.sqrt(covariances.xs(num_col,level=1)[num_col]/nsamples)
-            tr1['standard error'] = np.sqrt(covariances.xs(tr1_col,level=1)[tr1_col]/nsamples)
-            tr2['standard error'] = np.sqrt(covariances.xs(tr2_col,level=1)[tr2_col]/nsamples)
-
-            # A denotes the numerator, B denotes the first trace and C denotes
-            # the second trace.
-            cov_AB = covariances.xs(num_col,level=1)[tr1_col]
-            cov_AC = covariances.xs(num_col,level=1)[tr2_col]
-            cov_BC = covariances.xs(tr1_col,level=1)[tr2_col]
-
-            results[out_str], results[out_str+' error'] = \
-                calc_S2(num, tr1, tr2, cov_AB, cov_AC, cov_BC, nsamples)
+            renyi.append((column, 'Trace', 'Trace 2', 'Full S2'))
+    return renyi
 
-    return results
+
+def _cov(covariances, col_a, col_b):
+    '''Get the covariance between two columns as a function of beta.
+
+Parameters
+----------
+covariances : :class:`pandas.DataFrame`
+    Covariances between columns.  See :func:`analyse_observables`.
+col_a, col_b : string
+    Column names.
+
+Returns
+-------
+cov : :class:`pandas.Series`
+    Covariance between ``col_a`` and ``col_b`` for each beta value.
+'''
+
+    if isinstance(covariances.index, pd.MultiIndex):
+        return covariances.xs(col_a, level=1)[col_b]
+    elif (col_a, col_b) in covariances:
+        return covariances[(col_a, col_b)]
+    else:
+        return covariances[(col_b, col_a)]
+
+
+def covariance_pairs(columns, shift=False, trace=False):
+    '''Select the pairs of columns for which covariances are required.
+
+Only a small fraction of the full covariance matrix of a DMQMC data table is
+needed: the variance of each observable and its covariance with the trace and
+the covariances between the numerator and traces for each Renyi entropy.
+
+Parameters
+----------
+columns : list
+    Columns in hande output.
+shift : bool
+    Also include the variance of the shift.
+trace : bool
+    Also include the variance of the traces.
+
+Returns
+-------
+pairs : list of tuples
+    Unique (column, column) pairs.
+'''
+
+    pairs = [('Trace', 'Trace')]
+    for v in _observables(columns).values():
+        if v in columns:
+            pairs.extend([(v, v), ('Trace', v)])
+    for (num_col, tr1_col, tr2_col, out_str) in _renyi_columns(columns):
+        pairs.extend([(num_col, num_col), (tr1_col, tr1_col),
+                      (tr2_col, tr2_col), (num_col, tr1_col),
+                      (num_col, tr2_col), (tr1_col, tr2_col)])
+    if shift:
+        pairs.append(('Shift', 'Shift'))
+    if trace and 'Trace 2' in columns:
+        pairs.append(('Trace 2', 'Trace 2'))
+    unique = []
+    for pair in pairs:
+        if pair not in unique and pair[::-1] not in unique:
+            unique.append(pair)
+    return unique
+
+
+def complete_beta_loops(data, name='Beta'):
+    '''Discard the final beta loop if it did not reach the final iteration.
+
+Parameters
+----------
+data : :class:`pandas.DataFrame`
+    DMQMC data table from a single calculation.
+name : string
+    Name of the column containing the iteration number (or beta value).
+
+Returns
+-------
+data : :class:`pandas.DataFrame`
+    DMQMC data table containing only complete beta loops.
+'''
+
+    loops = np.diff(pyhande.utils.beta_loop_segments(data[name].values))
+    if len(loops) > 1 and loops[-1] < loops[0]:
+        data = data.iloc[:len(data)-loops[-1]]
+    return data
+
+
+def beta_loop_cube(data, beta_values):
+    '''Reshape a DMQMC data table into an array indexed by beta loop and beta.
+
+Parameters
+----------
+data : :class:`pandas.DataFrame`
+    DMQMC data table.
+beta_values : :class:`numpy.ndarray`
+    Beta value of each row in ``data``.  A new beta loop is assumed to start
+    whenever the beta value does not increase.
+
+Returns
+-------
+beta : :class:`numpy.ndarray`
+    Sorted unique beta values.
+cube : :class:`numpy.ndarray`
+    Array of shape (number of beta loops, number of beta values, number of
+    columns) containing ``data``.  Entries for beta values not reached in
+    a beta loop (e.g. if calculations with different target beta values are
+    combined) are set to NaN.
+'''
+
+    beta_values = np.asarray(beta_values)
+    (beta, ibeta) = np.unique(beta_values, return_inverse=True)
+    loops = np.diff(pyhande.utils.beta_loop_segments(beta_values))
+    nloops = len(loops)
+    iloop = np.repeat(np.arange(nloops), loops)
+    values = np.asarray(data.values, dtype=float)
+    if nloops*len(beta) == len(values) and \
+            (ibeta == np.tile(np.arange(len(beta)), nloops)).all():
+        # All beta loops contain the same beta values: no need to copy.
+        cube = values.reshape(nloops, len(beta), values.shape[1])
+    else:
+        cube = np.empty((nloops, len(beta), values.shape[1]))
+        cube.fill(np.nan)
+        cube[iloop, ibeta] = values
+    return (beta, cube)
+
+
+def beta_loop_statistics(cube, beta, columns, pairs):
+    '''Calculate the mean and required covariances across beta loops.
+
+Parameters
+----------
+cube : :class:`numpy.ndarray`
+    Array of shape (number of beta loops, number of beta values, number of
+    columns), as produced by :func:`beta_loop_cube`.  Rows (i.e. beta values in
+    a given beta loop) containing only NaN entries are excluded.
+beta : :class:`numpy.ndarray`
+    Beta values.
+columns : list
+    Names of the columns in ``cube``.
+pairs : list of tuples
+    (column, column) pairs for which the covariance is evaluated, e.g. from
+    :func:`covariance_pairs`.
+
+Returns
+-------
+means : :class:`pandas.DataFrame`
+    Mean of each column at each beta value.
+covariances : :class:`pandas.DataFrame`
+    Covariance of each pair of columns in ``pairs`` at each beta value.
+nsamples : :class:`pandas.Series`
+    The number of beta loops contributing to each beta value.
+'''
+
+    return moments_statistics(beta_loop_moments(cube, beta, columns, pairs))
+
+
+BetaLoopMoments = collections.namedtuple('BetaLoopMoments',
+                                         'beta columns pairs count mean comoment')
 
 
+def beta_loop_moments(cube, beta, columns, pairs):
+    '''Accumulate the moments of a set of beta loops.
+
+Parameters
+----------
+cube, beta, columns, pairs :
+    See :func:`beta_loop_statistics`.
+
+Returns
+-------
+moments : :func:`collections.namedtuple`
+    The beta values, columns and pairs of columns along with, at each beta
+    value, the number of beta loops (count), the mean of each column (mean) and
+    the sum over beta loops of the product of the deviations from the mean of
+    each pair of columns (comoment).
+'''
+
+    present = ~np.isnan(cube).all(axis=2)
+    count = present.sum(axis=0)
+    mean = np.where(present[:,:,None], cube, 0.0).sum(axis=0)
+    mean /= np.maximum(count, 1)[:,None]
+    deviation = np.where(present[:,:,None], cube - mean, 0.0)
+    index = dict((col, i) for (i, col) in enumerate(columns))
+    comoment = np.empty((len(beta), len(pairs)))
+    for (i, (col_a, col_b)) in enumerate(pairs):
+        comoment[:,i] = np.einsum('ij,ij->j', deviation[:,:,index[col_a]],
+                                  deviation[:,:,index[col_b]])
+    return BetaLoopMoments(np.asarray(beta), list(columns), list(pairs), count,
+                           mean, comoment)
+
+
+def merge_moments(moments_a, moments_b):
+    '''Combine the moments of two independent sets of beta loops.
+
+The moments are combined using the pairwise update of [Chan79]_, so the
+statistics of an arbitrary number of beta loops can be accumulated without
+holding all the beta loops in memory at once.
+
+Parameters
+----------
+moments_a, moments_b : :func:`collections.namedtuple`
+    Moments of each set of beta loops, as produced by :func:`beta_loop_moments`
+    or :func:`merge_moments`.  The beta values and columns need not be the same
+    in both sets.
+
+Returns
+-------
+moments : :func:`collections.namedtuple`
+    Moments of the combined set of beta loops, for the columns (and pairs of
+    columns) in either set.  As when concatenating the beta loops in a
+    :class:`pandas.DataFrame`, the mean of a column (and the comoments of
+    pairs including it) is NaN at beta values reached by beta loops which do
+    not contain it.
+
+References
+----------
+Chan79
+    T.F. Chan, G.H. Golub and R.J. LeVeque, Updating Formulae and a Pairwise
+    Algorithm for Computing Sample Variances, Technical Report STAN-CS-79-773,
+    Stanford University (1979).
+'''
+
+    beta = np.union1d(moments_a.beta, moments_b.beta)
+    columns = moments_a.columns + [col for col in moments_b.columns
+                                   if col not in moments_a.columns]
+    pairs = moments_a.pairs + [pair for pair in moments_b.pairs
+                               if pair not in moments_a.pairs]
+
+    def expand(moments):
+        # Place moments onto the combined set of beta values and columns.
+        # Columns missing from moments are NaN wherever it has beta loops.
+        indx = np.searchsorted(beta, moments.beta)
+        count = np.zeros(len(beta), dtype=int)
+        count[indx] = moments.count
+        missing = np.where(count > 0, np.nan, 0.0)[:,None]
+        mean = np.zeros((len(beta), len(columns))) + missing
+        comoment = np.zeros((len(beta), len(pairs))) + missing
+        icol = [columns.index(col) for col in moments.columns]
+        ipair = [pairs.index(pair) for pair in moments.pairs]
+        mean[indx[:,None], icol] = moments.mean
+        comoment[indx[:,None], ipair] = moments.comoment
+        return (count, mean, comoment)
+
+    (count_a, mean_a, comoment_a) = expand(moments_a)
+    (count_b, mean_b, comoment_b) = expand(moments_b)
+    count = count_a + count_b
+    frac_b = count_b / np.maximum(count, 1).astype(float)
+    delta = mean_b - mean_a
+    mean = mean_a + delta*frac_b[:,None]
+    index = dict((col, i) for (i, col) in enumerate(columns))
+    ia = [index[col_a] for (col_a, col_b) in pairs]
+    ib = [index[col_b] for (col_a, col_b) in pairs]
+    comoment = (comoment_a + comoment_b +
+                delta[:,ia]*delta[:,ib]*(count_a*frac_b)[:,None])
+    return BetaLoopMoments(beta, columns, pairs, count, mean, comoment)
+
+
+def moments_statistics(moments):
+    '''Convert moments of a set of beta loops into means and covariances.
+
+Parameters
+----------
+moments : :func:`collections.namedtuple`
+    Moments of the beta loops, as produced by :func:`beta_loop_moments` or
+    :func:`merge_moments`.
+
+Returns
+-------
+means, covariances, nsamples :
+    See :func:`beta_loop_statistics`.
+'''
+
+    beta = moments.beta
+    means = pd.DataFrame(moments.mean, index=beta, columns=moments.columns)
+    covariances = pd.DataFrame(moments.comoment / (moments.count[:,None] - 1.0),
+                               index=beta,
+                               columns=pd.MultiIndex.from_tuples(moments.pairs))
+    nsamples = pd.Series(moments.count, index=beta)
+    return (means, covariances, nsamples)
+
 def calc_S2(stats_A, stats_B, stats_C, cov_AB, cov_AC, cov_BC, data_len):
     '''Calculate the mean and standard error of :math:`f = -log(A/BC)`.
 
@@ -266,17 +640,25 @@ column: string
     Column name of estimate for which to find a spline fit.
 estimates : :class:`pandas.DataFrame`
     Must contain a column with the above name, and another with the name
-    column+' error'. The indices are used for the beta values.
+    column+'_error' or column+' error'. The indices are used for the beta
+    values.
 
 Returns
 -------
 spline_fit : :class:`pandas.Series`
     Cubic B-spline fit.
+
+See Also
+--------
+:func:`calc_spline_fits` : fit many columns with a common set of knots.
 '''
 
+    # scipy is slow to import, so only do so when required.
+    import scipy.interpolate
+
     beta_values = list(estimates.index.values)
     values = list(estimates[column].values)
-    weights = list(1/estimates[column+' error'].values)
+    weights = list(1/estimates[_error_column(column, estimates)].values)
 
     tck = scipy.interpolate.splrep(beta_values, values, weights, k=3)
     spline_fit = scipy.interpolate.splev(beta_values, tck)
@@ -284,6 +666,140 @@ spline_fit : :class:`pandas.Series`
     return pd.Series(spline_fit, index=beta_values)
 
 
+def calc_spline_fits(columns, estimates, nknots=None):
+    '''Find weighted least-squares cubic B-spline fits for many columns at once.
+
+All columns share the same beta grid and knots, so the B-spline basis is
+evaluated only once and the (small) normal equations for all columns are
+solved together.  Unlike :func:`calc_spline_fit`, the knots are fixed rather
+than chosen adaptively for each column.
+
+Parameters
+----------
+columns : list of strings
+    Column names of estimates for which to find a spline fit.
+estimates : :class:`pandas.DataFrame`
+    Must contain the above columns and, for each column, another with the name
+    column+'_error' or column+' error'. The indices are used for the beta
+    values.  Points with a NaN value or error are ignored.
+nknots : int or None
+    Number of interior knots, which are placed at quantiles of the beta
+    values.  Default: the square root of the number of beta values.
+
+Returns
+-------
+spline_fits : :class:`pandas.DataFrame`
+    Cubic B-spline fit for each column.
+'''
+
+    beta_values = estimates.index.values.astype(float)
+    values = estimates[columns].values.astype(float)
+    errors = estimates[[_error_column(c, estimates) for c in columns]]
+    errors = errors.values.astype(float)
+
+    if nknots is None:
+        nknots = int(np.sqrt(len(beta_values)))
+    # Need more data points than B-spline coefficients.
+    nknots = max(0, min(nknots, len(beta_values)-4))
+    interior = np.percentile(beta_values,
+                             np.linspace(0, 100, nknots+2)[1:-1])
+    knots = np.concatenate(([beta_values.min()]*4, interior,
+                            [beta_values.max()]*4))
+    basis = bspline_basis(beta_values, knots)
+
+    # Weight each point by 1/error (as in splrep).  Errors of zero (e.g. at
+    # beta=0) are given the largest finite weight in the column.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = 1/errors
+    missing = np.isnan(values) | np.isnan(errors)
+    weights[missing] = 0
+    values[missing] = 0
+    finite = np.isfinite(weights)
+    wmax = np.where(finite, weights, 0).max(axis=0)
+    wmax[wmax == 0] = 1
+    weights = np.where(finite, weights, wmax)**2
+
+    # Solve the normal equations B^T W B c = B^T W y for each column.
+    lhs = np.einsum('ip,ic,iq->cpq', basis, weights, basis)
+    rhs = np.einsum('ip,ic->cp', basis, weights*values)
+    # Columns without enough data to determine the fit (e.g. if there is only
+    # a single beta loop and hence no error estimates) are set to NaN.
+    underdetermined = (weights > 0).sum(axis=0) < basis.shape[1]
+    lhs[underdetermined] = np.identity(basis.shape[1])
+    try:
+        coeffs = np.linalg.solve(lhs, rhs[:,:,None])[:,:,0]
+    except np.linalg.LinAlgError:
+        coeffs = np.empty_like(rhs)
+        for i in range(len(columns)):
+            try:
+                coeffs[i] = np.linalg.solve(lhs[i], rhs[i])
+            except np.linalg.LinAlgError:
+                coeffs[i] = np.nan
+    coeffs[underdetermined] = np.nan
+
+    return pd.DataFrame(basis.dot(coeffs.T), index=estimates.index,
+                        columns=columns)
+
+
+def _error_column(column, estimates):
+    '''Find the column containing the error in an estimate.
+
+Parameters
+----------
+column : string
+    Column name of estimate.
+estimates : :class:`pandas.DataFrame`
+    Data table containing the estimate and its error.
+
+Returns
+-------
+error_column : string
+    Column name of error, column+'_error' (observables) or column+' error'
+    (Renyi entropies).
+'''
+
+    if column+'_error' in estimates.columns:
+        return column+'_error'
+    else:
+        return column+' error'
+
+
+def bspline_basis(x, knots, k=3):
+    '''Evaluate all B-spline basis functions using the Cox-de Boor recursion.
+
+Parameters
+----------
+x : :class:`numpy.ndarray`
+    Points at which to evaluate the basis functions.  Must lie within
+    [knots[k], knots[-k-1]].
+knots : :class:`numpy.ndarray`
+    Non-decreasing knot vector, including k+1 repeated knots at each end.
+k : int
+    Degree of the B-splines.
+
+Returns
+-------
+basis : :class:`numpy.ndarray`
+    Array of shape (len(x), len(knots)-k-1), where basis[i,j] is the value of
+    the j-th B-spline at x[i].
+'''
+
+    x = np.asarray(x, dtype=float)[:,None]
+    t = np.asarray(knots, dtype=float)
+    basis = ((t[:-1] <= x) & (x < t[1:])).astype(float)
+    # Include the right-hand end point in the last non-empty knot interval.
+    last = np.flatnonzero(t[:-1] < t[1:])[-1]
+    basis[x[:,0] == t[last+1], last] = 1.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for d in range(1, k+1):
+            left = np.where(t[d:-1] > t[:-d-1],
+                            (x - t[:-d-1])/(t[d:-1] - t[:-d-1]), 0)
+            right = np.where(t[d+1:] > t[1:-d],
+                             (t[d+1:] - x)/(t[d+1:] - t[1:-d]), 0)
+            basis = left*basis[:,:-1] + right*basis[:,1:]
+    return basis
+
+
 def sort_momentum(columns):
     ''' Naturally sort results columns based off of their numeric values.
 
@@ -307,61 +823,142 @@ sort : list
     return sort
 
 
-def extract_momentum_correlation_function(data, beta):
-    '''Extract correlation function from analysed DMQMC data.
+MomentumCorrelation = collections.namedtuple('MomentumCorrelation',
+                                             'beta k columns values')
+
+# Correlation functions in analysed DMQMC data and whether the columns in the
+# output omit the factor of 1 for the upup+downdown contributions or the
+# spin-averaged contribution.
+_momentum_labels = ['n', 'S', 'Suu', 'Sud']
+_momentum_offset = dict(n=0.0, S=1.0, Suu=1.0, Sud=0.0)
+
+
+def momentum_columns(columns):
+    '''Find the momentum space correlation functions in analysed DMQMC data.
+
+The k value of each column is parsed from the column name once, so the result
+can be reused for data tables with the same columns.
 
 Parameters
 ----------
-data : :class:`pandas.DataFrame`
-    Analysed DMQMC output at a specific temperature / imaginary time.
-beta : float
-    Temperature / imaginary time value to extrat correlation function at.
+columns : list
+    Columns in analysed DMQMC data, where the correlation function at a given
+    k is in the column `<label>_<k>` and its error in `<label>_<k>_error`.
 
 Returns
 -------
-full : :class:`pandas.DataFrame`
-    Momentum space correlation functions as a function of k at given
-    temperature.
+kcolumns : :class:`collections.OrderedDict`
+    For each correlation function found (in the order n, S, Suu, Sud), a tuple
+    of the k values, the corresponding columns and the corresponding error
+    columns (or None if the error column does not exist), sorted by k.
 '''
 
-    dbeta = data.groupby('Beta').get_group(beta)
-    base_headers = ['n_', 'S_', 'Suu_', 'Sud_']
+    pattern = re.compile('^(n|S|Suu|Sud)_([^_]+)$')
+    found = dict((label, []) for label in _momentum_labels)
+    for c in columns:
+        match = pattern.match(c)
+        if match:
+            try:
+                k = float(match.group(2))
+            except ValueError:
+                continue
+            error = c+'_error'
+            found[match.group(1)].append((k, c, error if error in columns else None))
+    kcolumns = collections.OrderedDict()
+    for label in _momentum_labels:
+        if found[label]:
+            (kvals, cols, errors) = zip(*sorted(found[label]))
+            kcolumns[label] = (np.array(kvals), list(cols), list(errors))
+    return kcolumns
+
+
+def momentum_correlation_functions(data, kcolumns=None, as_array=False):
+    '''Extract correlation functions at all temperatures from analysed DMQMC data.
 
-    frames = []
+Parameters
+----------
+data : :class:`pandas.DataFrame`
+    Analysed DMQMC output, with the temperature / imaginary time either in a
+    'Beta' column or as the index.
+kcolumns : :class:`collections.OrderedDict`
+    Correlation functions to extract, as returned by :func:`momentum_columns`.
+    Found from the columns of data if not given.
+as_array : bool
+    If true, return the correlation functions as a 3D array rather than as
+    a :class:`pandas.DataFrame`.
 
-    for h in base_headers:
+Returns
+-------
+full : :class:`pandas.DataFrame`
+    Momentum space correlation functions with one row for each (beta, k)
+    pair.  Columns are 'Beta', 'k' and '<label>_k' and '<label>_k_error' for
+    each correlation function.  Correlation functions not evaluated at a given
+    k are set to NaN.  Only returned if as_array is false.
+correlation : :func:`collections.namedtuple`
+    Tuple containing the beta values, the k values, the correlation function
+    names (as used in full) and an array of shape (len(beta), len(k),
+    len(columns)) holding the correlation functions.  Only returned if
+    as_array is true.
+'''
 
-        mom = [c for c in dbeta.columns.values if h in c and '_error' not in c]
-        mome = [c for c in dbeta.columns.values if h in c and '_error' in c]
+    if kcolumns is None:
+        kcolumns = momentum_columns(list(data.columns.values))
+    if 'Beta' in data.columns:
+        beta = data['Beta'].values
+    else:
+        beta = data.index.values
+
+    # Union of the k values of all correlation functions.
+    if kcolumns:
+        kvals = np.unique(np.concatenate([v[0] for v in kcolumns.values()]))
+    else:
+        kvals = np.zeros(0)
+    columns = []
+    values = np.empty((len(beta), len(kvals), 2*len(kcolumns)))
+    values.fill(np.nan)
+    for (i, (label, (k, cols, errors))) in enumerate(kcolumns.items()):
+        ik = np.searchsorted(kvals, k)
+        values[:,ik,2*i] = data[cols].values + _momentum_offset[label]
+        kspace_fn_error = np.zeros((len(beta), len(k)))
+        for (j, error) in enumerate(errors):
+            if error is not None:
+                kspace_fn_error[:,j] = data[error].values
+        kspace_fn_error[np.isnan(kspace_fn_error)] = 0
+        values[:,ik,2*i+1] = kspace_fn_error
+        columns.extend([label+'_k', label+'_k_error'])
 
-        kvals = [float(c.split('_')[1]) for c in mom]
+    if as_array:
+        return MomentumCorrelation(beta, kvals, columns, values)
+    else:
+        full = pd.DataFrame(values.reshape(-1, len(columns)), columns=columns)
+        full.insert(0, 'k', np.tile(kvals, len(beta)))
+        full.insert(0, 'Beta', np.repeat(beta, len(kvals)))
+        return full
 
-        # The columns in the output do not contain the factors of 1
-        # necessary for the upup+downdown contributions or the spin-averaged
-        # contribution.
-        if h == 'S_' or h == 'Suu_':
-            kspace_fn = 1.0 + dbeta[mom].values
-        else:
-            kspace_fn = dbeta[mom].values
-        kspace_fn_error = dbeta[mome].values
-        kspace_fn_error[np.isnan(kspace_fn_error)] = 0
-        frames.append(pd.DataFrame({'Beta': beta, 'k': kvals,
-                                    h+'k': kspace_fn.ravel(),
-                                    h+'k_error': kspace_fn_error.ravel()}))
 
+def extract_momentum_correlation_function(data, beta):
+    '''Extract correlation function from analysed DMQMC data.
 
-    # Want to perform merge so that the correlation function with the most k points
-    # defines the total number of k points in the final frame.
-    frames.sort(key=lambda x: len(x.k))
-    full = frames[0]
-    for f in frames[1:]:
-        full = full.merge(f, on=['Beta', 'k'], how='right')
+Parameters
+----------
+data : :class:`pandas.DataFrame`
+    Analysed DMQMC output at a specific temperature / imaginary time.
+beta : float
+    Temperature / imaginary time value to extrat correlation function at.
 
-    return full
+Returns
+-------
+full : :class:`pandas.DataFrame`
+    Momentum space correlation functions as a function of k at given
+    temperature.  See :func:`momentum_correlation_functions`.
+'''
+
+    return momentum_correlation_functions(data[data['Beta'] == beta])
 
 
 def analyse_data(hande_out, shift=False, free_energy=False, spline=False,
-                 trace=False, calc_number=None):
+                 trace=False, calc_number=None, jackknife_blocks=None,
+                 spline_knots=None):
     '''Clean up Hande output so that analysis can be performed.
 
 Parameters
@@ -382,6 +979,12 @@ trace : bool
     Perform analysis on the trace of the density matrix.
 calc_number : int or None
     If not None then only perform analysis on the calc_number calculation.
+jackknife_blocks : int or None
+    If not None, use a blocked jackknife estimate for the error in the free
+    energy.  See :func:`free_energy_error_analysis`.
+spline_knots : int or None
+    Number of interior knots used in the spline fits.  See
+    :func:`calc_spline_fits`.
 
 Returns
 -------
@@ -401,7 +1004,8 @@ results : :class:`pandas.DataFrame`
             tau = md['qmc']['tau']
             df.rename(columns={'iterations' : 'Beta'}, inplace=True)
             df['Beta'] = df['Beta']*tau
-            data.append(df)
+            # Discard beta loop which didn't reach final iteration.
+            data.append(complete_beta_loops(df))
     if data:
         if calc_number is not None:
             data = data[calc_number]
@@ -417,17 +1021,8 @@ results : :class:`pandas.DataFrame`
             if 'tau' in md['qmc'] and md['qmc']['tau'] != tau:
                 warnings.warn('Tau values in input files not consistent.')
 
-    # Discard beta loops which didn't reach final iteration.
-    grouped = pyhande.utils.groupby_beta_loops(data, name='Beta')
-    niterations = len(grouped.get_group(0))
-    last_group = len(grouped) - 1
-    if len(grouped.get_group(last_group)) < niterations:
-        data.drop(grouped.get_group(last_group).index, inplace=True)
     # Make the Beta column a MultiIndex.
     data.set_index('Beta', inplace=True, append=True)
-    # The number of beta loops contributing to each beta value.
-    nsamples = data['Trace'].groupby(level=1).count()
-    beta_values = nsamples.index.values
     # The data that we are going to use.
     estimates = data.loc[:,'Shift':'# H psips']
 
@@ -454,13 +1049,109 @@ results : :class:`pandas.DataFrame`
             estimates[r'\sum\rho_{ij}VI_{ji}'] = data[r'\sum\rho_{ij}H_{ji}']
 
 
-    # Compute the mean of all estimates across all beta loops.
-    means = estimates.groupby(level=1).mean()
-    # Compute the covariances between all pairs of columns.
-    covariances = estimates.groupby(level=1).cov()
-
     columns = list(estimates.columns.values)
 
+    # Compute the mean of all estimates and the covariances between the
+    # required pairs of columns across all beta loops.
+    (beta_values, cube) = beta_loop_cube(estimates,
+                                         estimates.index.get_level_values(1))
+    (means, covariances, nsamples) = beta_loop_statistics(cube, beta_values,
+            columns, covariance_pairs(columns, shift, trace))
+
+    results = _analyse_statistics(means, covariances, nsamples, shift, spline,
+                                  trace, spline_knots)
+
+    # If requested, calculate excess free-energy.
+    if free_energy:
+        free_energy_error_analysis(estimates, results, cycles*tau,
+                                   jackknife_blocks)
+
+    return (metadata, results)
+
+
+def analyse_data_stream(filenames, shift=False, spline=False, trace=False,
+                        calc_number=None, spline_knots=None):
+    '''Analyse DMQMC calculations one output file at a time.
+
+Equivalent to :func:`analyse_data` (without the free energy analysis) but the
+beta loops in each file are reduced to their moments (see
+:func:`beta_loop_moments`) before the next file is read, and the moments from
+all files are combined using :func:`merge_moments`.  The memory required is
+hence independent of the total number of beta loops.  Incomplete final beta
+loops are discarded from each calculation.
+
+Parameters
+----------
+filenames : list of strings
+    names of files containing HANDE DMQMC calculation output.
+shift, spline, trace, calc_number, spline_knots :
+    See :func:`analyse_data`.
+
+Returns
+-------
+metadata : list of dicts
+    Calculation metadata for each simulation analysed.
+results : :class:`pandas.DataFrame`
+    Analysed DMQMC data.
+'''
+
+    (metadata, moments) = ([], None)
+    icalc = -1
+    for filename in filenames:
+        for (md, df) in pyhande.extract.extract_data(filename):
+            if 'DMQMC' in md['calc_type'] and not md['dmqmc']['find_weights']:
+                icalc += 1
+                if calc_number is not None and icalc != calc_number:
+                    continue
+                metadata.append(md)
+                # Sanity check: Same time step used in all calculations?
+                # Only check for new metadata format...
+                tau = md['qmc']['tau']
+                if 'qmc' in metadata[0] and 'tau' in metadata[0]['qmc'] and \
+                        metadata[0]['qmc']['tau'] != tau:
+                    warnings.warn('Tau values in input files not consistent.')
+                # Discard beta loop which didn't reach final iteration.
+                df = complete_beta_loops(df, 'iterations')
+                estimates = df.loc[:,'Shift':'# H psips']
+                columns = list(estimates.columns.values)
+                (beta_values, cube) = beta_loop_cube(estimates,
+                                                     df['iterations']*tau)
+                pairs = covariance_pairs(columns, shift, trace)
+                calc_moments = beta_loop_moments(cube, beta_values, columns,
+                                                 pairs)
+                if moments is None:
+                    moments = calc_moments
+                else:
+                    moments = merge_moments(moments, calc_moments)
+    if moments is None:
+        raise ValueError('No DMQMC data found in '+' '.join(filenames))
+
+    (means, covariances, nsamples) = moments_statistics(moments)
+    results = _analyse_statistics(means, covariances, nsamples, shift, spline,
+                                  trace, spline_knots)
+
+    return (metadata, results)
+
+
+def _analyse_statistics(means, covariances, nsamples, shift=False, spline=False,
+                        trace=False, spline_knots=None):
+    '''Evaluate final estimates from the statistics accumulated over beta loops.
+
+Parameters
+----------
+means, covariances, nsamples :
+    See :func:`analyse_observables`.
+shift, spline, trace, spline_knots :
+    See :func:`analyse_data`.
+
+Returns
+-------
+results : :class:`pandas.DataFrame`
+    Analysed DMQMC data.
+'''
+
+    beta_values = means.index.values
+
     # results will hold all of the final values to be printed.
     results = pd.DataFrame({'Beta' : pd.Series(beta_values, index=beta_values)})
     results = results.join(analyse_observables(means, covariances, nsamples))
@@ -469,25 +1160,22 @@ results : :class:`pandas.DataFrame`
     # If requested, add the averaged shift profile to results.
     if shift:
         results['Shift'] = means['Shift']
-        results['Shift s.d.'] = np.sqrt(covariances.xs('Shift',level=1)['Shift'])
+        results['Shift s.d.'] = np.sqrt(_cov(covariances, 'Shift', 'Shift'))
 
     # If requested, calculate a spline fit for all mean estimates.
     if spline:
-        results_columns = list(results.columns.values)
-        for column in results_columns:
-            if ('Tr[p]' in column or 'S2' in column) and (not 'error' in column):
-                results[column+' spline'] = calc_spline_fit(column, results)
+        columns = [c for c in results.columns.values
+                   if ('Tr[p]' in c or 'S2' in c) and (not 'error' in c)]
+        spline_fits = calc_spline_fits(columns, results, spline_knots)
+        for column in columns:
+            results[column+' spline'] = spline_fits[column]
 
     # If requested, add the averaged trace profiles to results.
     if trace:
         results['Trace'] = means['Trace']
-        results['Trace s.d.'] = np.sqrt(covariances.xs('Trace',level=1)['Trace'])
-        if 'Trace 2' in columns:
+        results['Trace s.d.'] = np.sqrt(_cov(covariances, 'Trace', 'Trace'))
+        if 'Trace 2' in means:
             results['Trace 2'] = means['Trace 2']
-            results['Trace 2 s.d.'] = np.sqrt(covariances.xs('Trace 2',level=1)['Trace 2'])
-
-    # If requested, calculate excess free-energy.
-    if free_energy:
-        free_energy_error_analysis(estimates, results, cycles*tau)
+            results['Trace 2 s.d.'] = np.sqrt(_cov(covariances, 'Trace 2', 'Trace 2'))
 
-    return (metadata, results)
+    return results
@@ -0,0 +1,630 @@
+'''Convert FCIDUMP files into HANDE HDF5 system files.
+
+HANDE reads the (text) FCIDUMP file at the start of every calculation, which
+can take a substantial fraction of the run time for large basis sets.  Instead
+the FCIDUMP can be converted once into the HDF5 system file produced by
+write_read_in_system, which HANDE reads directly.  The integrals are stored
+using HANDE's compressed format (see molecular_integrals.F90), in which only
+integrals which are unique under permutation symmetry and allowed by point
+group symmetry are held.
+
+The FCIDUMP file is streamed in chunks and each chunk parsed using whole-array
+operations, so only the compressed integral store, rather than the FCIDUMP
+file, need fit into memory.
+
+.. note::
+
+    Writing HDF5 system files requires h5py.  Complex integrals, translational
+    symmetry and complete active spaces are not supported: use
+    write_read_in_system in HANDE instead.
+'''
+
+import collections
+import datetime
+import itertools
+import re
+import uuid
+import warnings
+import numpy as np
+
+Basis = collections.namedtuple('Basis', 'spatial_index sym sym_index '
+                               'sym_spin_index ms lz sp_eigv fcidump_basis '
+                               'uhf pg_mask lz_mask lz_offset nsym')
+Basis.__doc__ = '''Spin-orbital basis set, as set up by HANDE from a FCIDUMP file.
+
+All arrays other than fcidump_basis are indexed by the (0-indexed) basis
+function and are as stored in basis_fn_t.
+
+Attributes
+----------
+spatial_index : :class:`numpy.ndarray`
+    index of the spatial orbital of each basis function.
+sym : :class:`numpy.ndarray`
+    symmetry label (including the Lz contribution, if used) of each basis
+    function.
+sym_index : :class:`numpy.ndarray`
+    index of each basis function within its symmetry.
+sym_spin_index : :class:`numpy.ndarray`
+    index of each basis function within its symmetry and spin.
+ms : :class:`numpy.ndarray`
+    spin (in units of 1/2) of each basis function.
+lz : :class:`numpy.ndarray`
+    Lz of each basis function.
+sp_eigv : :class:`numpy.ndarray`
+    single-particle eigenvalue of each basis function.
+fcidump_basis : :class:`numpy.ndarray`
+    (1-indexed) basis function corresponding to each orbital in the FCIDUMP
+    file.  Element 0 is 0, as 0 is the null index in a FCIDUMP file.  In
+    restricted calculations, the down-spin basis function is given.
+uhf : bool
+    True if the FCIDUMP file was produced by an unrestricted calculation.
+pg_mask, lz_mask, lz_offset : int
+    bit masks and offset used to combine symmetry labels (see pg_symmetry.f90).
+nsym : int
+    total number of symmetry labels, including all possible values of Lz.
+'''
+
+PackedIntegrals = collections.namedtuple('PackedIntegrals',
+                                         'ecore one_body coulomb nforbidden')
+PackedIntegrals.__doc__ = '''Integrals in HANDE's compressed storage format.
+
+Attributes
+----------
+ecore : float
+    core energy (e.g. nuclear repulsion).
+one_body : list of list of :class:`numpy.ndarray`
+    lower triangle of the one-body integrals in each block, indexed by spin
+    channel and then symmetry.
+coulomb : list of :class:`numpy.ndarray`
+    unique Coulomb integrals in each spin channel.
+nforbidden : int
+    number of non-zero integrals in the FCIDUMP file which are forbidden by
+    symmetry and so were ignored.
+'''
+
+# Version of the HDF5 system file format (see hdf5_system.F90).
+_SYSDUMP_VERSION = 0
+
+# System type of read_in systems (see system.f90).
+_READ_IN_SYSTEM = 2
+
+# Precision used by HANDE to compare floating point numbers (see const.F90).
+_DEPSILON = 1.e-12
+
+# Namelist parameters which hold an array of values.
+_ARRAY_PARAMETERS = ('orbsym', 'syml', 'symlz', 'nprop')
+
+
+def read_header(filename):
+    '''Read the FCI namelist at the start of a FCIDUMP file.
+
+Parameters
+----------
+filename : string
+    name of FCIDUMP file.
+
+Returns
+-------
+header : dict
+    parameters set in the namelist, with lower-case keys.  Integer (or
+    repeated integer) values are converted to int and logical values to
+    bool.  Array parameters (e.g. orbsym) are given as lists.
+nlines : int
+    number of lines in the namelist, i.e. the number of lines to skip to
+    reach the integrals.
+'''
+
+    lines = []
+    with open(filename) as f:
+        for line in f:
+            lines.append(line)
+            if '&END' in line.upper() or '/' in line:
+                break
+    text = ' '.join(lines)
+    text = re.sub(r'&FCI|&END|/', ' ', text, flags=re.IGNORECASE)
+    fields = re.split(r'([A-Za-z]\w*)\s*=', text)
+    header = {}
+    for (key, values) in zip(fields[1::2], fields[2::2]):
+        key = key.lower()
+        parsed = []
+        for value in re.split(r'[\s,]+', values.strip()):
+            if value:
+                if '*' in value:
+                    (repeat, value) = value.split('*')
+                    parsed.extend([_namelist_value(value)]*int(repeat))
+                else:
+                    parsed.append(_namelist_value(value))
+        if key in _ARRAY_PARAMETERS:
+            header[key] = parsed
+        elif parsed:
+            header[key] = parsed[0]
+    return (header, len(lines))
+
+
+def integral_chunks(filename, chunk_size=1000000):
+    '''Read the integrals from a FCIDUMP file in chunks.
+
+Parameters
+----------
+filename : string
+    name of FCIDUMP file.
+chunk_size : int
+    number of integrals to read at a time.
+
+Returns
+-------
+chunks : generator of (:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+    Values of each integral in the chunk and the corresponding four orbital
+    indices, in the order given in the FCIDUMP file.  For the Coulomb
+    integrals this is chemists' notation, i.e. x i a j b is (ia|jb) = <ij|ab>.
+'''
+
+    nlines = read_header(filename)[1]
+    with open(filename) as f:
+        for line in itertools.islice(f, nlines):
+            pass
+        while True:
+            lines = [line for line in itertools.islice(f, chunk_size)
+                     if line.strip()]
+            if not lines:
+                break
+            text = ' '.join(lines)
+            if '(' in text:
+                raise ValueError('Complex integrals are not supported: %s.'
+                                 % (filename,))
+            if 'D' in text or 'd' in text:
+                # Fortran double precision exponent.
+                text = text.replace('D', 'E').replace('d', 'E')
+            values = np.fromstring(text, sep=' ')
+            if len(values) != 5*len(lines):
+                raise ValueError('Problem reading integrals file: %s.'
+                                 % (filename,))
+            values = values.reshape(-1, 5)
+            yield (values[:,0], values[:,1:].astype(np.int64))
+
+
+def sp_eigenvalues(filename, norb, nel, uhf=False, chunk_size=1000000):
+    '''Get the single-particle eigenvalues of the orbitals in a FCIDUMP file.
+
+If the FCIDUMP file does not contain the eigenvalues, they are calculated from
+the integrals assuming that the first nel/2 orbitals are doubly occupied, as in
+HANDE.
+
+Parameters
+----------
+filename : string
+    name of FCIDUMP file.
+norb : int
+    number of orbitals in the FCIDUMP file.
+nel : int
+    number of electrons.
+uhf : bool
+    True if the FCIDUMP file was produced by an unrestricted calculation.
+chunk_size : int
+    number of integrals to read at a time.
+
+Returns
+-------
+sp_eigv : :class:`numpy.ndarray`
+    single-particle eigenvalue of each orbital, in the order given in the
+    FCIDUMP file.
+'''
+
+    eigv = np.zeros(norb+1)
+    found = np.zeros(norb+1, dtype=bool)
+    hii = np.zeros(norb+1)
+    iiii = np.zeros(norb+1)
+    coulomb = np.zeros((norb+1, norb+1))
+    exchange = np.zeros((norb+1, norb+1))
+    for (x, orbs) in integral_chunks(filename, chunk_size):
+        (i, a, j, b) = orbs.T
+        sp = (i > 0) & (a == 0) & (j == 0) & (b == 0)
+        eigv[i[sp]] = x[sp]
+        found[i[sp]] = True
+        if found.any():
+            continue
+        # \epsilon_i = h_ii + \sum_{j \in occ} (2 <ij|ij> - <ij|ji>)
+        diag = (i > 0) & (i == a) & (j == 0) & (b == 0)
+        hii[i[diag]] = x[diag]
+        same = (i > 0) & (i == a) & (i == j) & (i == b)
+        iiii[i[same]] = x[same]
+        ijij = (i == a) & (j == b) & (b > 0) & ~same
+        coulomb[i[ijij], j[ijij]] = x[ijij]
+        coulomb[j[ijij], i[ijij]] = x[ijij]
+        ijji = (((i == b) & (j == a)) | ((i == j) & (a == b))) & (b > 0) & ~same
+        exchange[i[ijji], a[ijji]] = x[ijji]
+        exchange[a[ijji], i[ijji]] = x[ijji]
+
+    if found.any():
+        return eigv[1:]
+    if uhf:
+        raise ValueError('Calculation of single particle eigenvalues not '
+                         'implemented for UHF.')
+    warnings.warn('Assuming orbitals are in energy order.  If not, calculated '
+                  'eigenvalues may be incorrect.')
+    occ = np.arange(norb+1) <= nel//2
+    occ[0] = False
+    eigv = hii + np.where(occ, iiii, 0)
+    eigv += (2*coulomb - exchange)[:,occ].sum(axis=1)
+    return eigv[1:]
+
+
+def init_basis(header, sp_eigv, uselz=False):
+    '''Set up the spin-orbital basis defined by a FCIDUMP file.
+
+This follows init_basis_fns_read_in and init_pg_symmetry in HANDE: the basis
+functions are ordered by single-particle eigenvalue, with alternating spins.
+
+Parameters
+----------
+header : dict
+    FCI namelist, as returned by :func:`read_header`.
+sp_eigv : :class:`numpy.ndarray`
+    single-particle eigenvalue of each orbital in the FCIDUMP file.
+uselz : bool
+    use Lz symmetry (HANDE's Lz input option).
+
+Returns
+-------
+basis : :class:`Basis`
+    basis functions and symmetry information.
+'''
+
+    norb = header['norb']
+    uhf = header.get('uhf', False)
+    orbsym = np.zeros(norb+1, dtype=np.int64)
+    symlz = np.zeros(norb+1, dtype=np.int64)
+    orbsym[1:] = _pad_list(header.get('orbsym', []), norb)
+    symlz[1:] = _pad_list(header.get('symlz', []), norb)
+    momentum_sym = (header.get('nprop', [-1]*3) != [-1]*3 and
+                    header.get('propbitlen', -1) != -1)
+    if momentum_sym:
+        # Real supercell with a single kpoint: HANDE turns symmetry off.
+        orbsym[:] = 0
+
+    # Rank orbitals by energy using a stable sort; in UHF calculations each
+    # spin channel is ranked separately so the spins continue to alternate.
+    if uhf:
+        nbasis = norb
+        rank = np.zeros(norb, dtype=np.int64)
+        rank[0::2] = 2*_insertion_rank(sp_eigv[0::2], _DEPSILON)
+        rank[1::2] = 2*_insertion_rank(sp_eigv[1::2], _DEPSILON) + 1
+        orbs = rank + 1
+        ms = np.where(np.arange(nbasis) % 2 == 0, 1, -1)
+        spatial_index = np.arange(nbasis)//2 + 1
+    else:
+        nbasis = 2*norb
+        orbs = np.repeat(_insertion_rank(sp_eigv, _DEPSILON) + 1, 2)
+        ms = np.tile([1, -1], norb)
+        spatial_index = np.arange(nbasis)//2 + 1
+    fcidump_basis = np.zeros(norb+1, dtype=np.int64)
+    if uhf:
+        fcidump_basis[orbs] = np.arange(1, nbasis+1)
+    else:
+        fcidump_basis[orbs[1::2]] = np.arange(2, nbasis+1, 2)
+
+    sym = orbsym[orbs] - 1
+    lz = symlz[orbs]
+    if sym.min() < 0:
+        # Unconverged symmetry: turn point group symmetry off.
+        sym[:] = 0
+
+    maxsym = 2**int(sym.max()).bit_length()
+    maxlz = int(lz.max()) if uselz else 0
+    lz_mask = (2**(6*maxlz).bit_length() - 1)*maxsym
+    lz_offset = 3*maxlz*maxsym
+    if maxlz > 0:
+        sym = sym + lz*maxsym + lz_offset
+    nsym = (6*maxlz + 1)*maxsym
+
+    sym_index = np.zeros(nbasis, dtype=np.int64)
+    sym_spin_index = np.zeros(nbasis, dtype=np.int64)
+    for s in np.unique(sym):
+        in_sym = sym == s
+        sym_index[in_sym] = np.arange(1, in_sym.sum()+1)
+        for spin in (-1, 1):
+            in_sym_spin = in_sym & (ms == spin)
+            sym_spin_index[in_sym_spin] = np.arange(1, in_sym_spin.sum()+1)
+
+    return Basis(spatial_index, sym, sym_index, sym_spin_index, ms, lz,
+                 sp_eigv[orbs-1], fcidump_basis, uhf, maxsym-1, lz_mask,
+                 lz_offset, nsym)
+
+
+def pack_integrals(filename, basis, chunk_size=1000000, tolerance=1.e-10):
+    '''Read the integrals in a FCIDUMP file into HANDE's compressed format.
+
+Each unique integral may appear any number of times (e.g. under different
+permutations) in the FCIDUMP file, provided each occurrence has the same value.
+As in HANDE, non-zero integrals forbidden by symmetry are ignored.
+
+Parameters
+----------
+filename : string
+    name of FCIDUMP file.
+basis : :class:`Basis`
+    basis set, as returned by :func:`init_basis`.
+chunk_size : int
+    number of integrals to read at a time.
+tolerance : float
+    maximum difference allowed between repeated occurrences of an integral.
+
+Returns
+-------
+integrals : :class:`PackedIntegrals`
+    core energy and compressed one-body and Coulomb integral stores.  Integrals
+    not given in the FCIDUMP file are zero.
+
+Raises
+------
+ValueError
+    if an integral occurs in the FCIDUMP file with inconsistent values.
+'''
+
+    nbasis = len(basis.sym)
+    if basis.uhf:
+        (nspin_one, nspin_two) = (2, 4)
+    else:
+        (nspin_one, nspin_two) = (1, 1)
+    nsym_spin = np.zeros((2, basis.nsym), dtype=np.int64)
+    np.add.at(nsym_spin, ((basis.ms+1)//2, basis.sym), 1)
+    # Integrals not yet seen are NaN, so repeated integrals can be checked.
+    one_body = [[np.full(n*(n+1)//2, np.nan) for n in nsym_spin[ispin]]
+                for ispin in range(nspin_one)]
+    npairs = (nbasis//2)*(nbasis//2 + 1)//2
+    coulomb = [np.full(npairs*(npairs+1)//2, np.nan)
+               for ispin in range(nspin_two)]
+
+    ecore = 0.0
+    nforbidden = 0
+    for (x, orbs) in integral_chunks(filename, chunk_size):
+        # Convert to (1-indexed) basis functions, so 0 remains the null index.
+        (i, a, j, b) = basis.fcidump_basis[orbs].T
+        core = (i == 0) & (a == 0) & (j == 0) & (b == 0)
+        ecore += x[core].sum()
+        one = (a > 0) & (j == 0) & (b == 0)
+        two = (j > 0) & (b > 0)
+
+        (ii, aa, xo, labels) = (i[one]-1, a[one]-1, x[one], orbs[one])
+        allowed = ((basis.sym[ii] == basis.sym[aa]) &
+                   (basis.ms[ii] == basis.ms[aa]))
+        nforbidden += np.count_nonzero(abs(xo[~allowed]) > _DEPSILON)
+        (ii, aa, xo, labels) = (ii[allowed], aa[allowed], xo[allowed],
+                                labels[allowed])
+        (p, q) = (basis.sym_spin_index[ii], basis.sym_spin_index[aa])
+        indx = _tri_ind(np.maximum(p, q), np.minimum(p, q)) - 1
+        spin = (basis.ms[ii]+1)//2 if basis.uhf else np.zeros_like(ii)
+        for ispin in range(nspin_one):
+            for isym in np.unique(basis.sym[ii]):
+                sel = (spin == ispin) & (basis.sym[ii] == isym)
+                _store(one_body[ispin][isym], indx[sel], xo[sel], labels[sel],
+                       tolerance)
+
+        (ii, jj, aa, bb) = (i[two]-1, j[two]-1, a[two]-1, b[two]-1)
+        (xt, labels) = (x[two], orbs[two])
+        allowed = ((_cross_product(basis, basis.sym[ii], basis.sym[jj]) ==
+                    _cross_product(basis, basis.sym[aa], basis.sym[bb])) &
+                   (basis.ms[ii] == basis.ms[aa]) &
+                   (basis.ms[jj] == basis.ms[bb]))
+        nforbidden += np.count_nonzero(abs(xt[~allowed]) > _DEPSILON)
+        (ii, jj, aa, bb) = (ii[allowed], jj[allowed], aa[allowed], bb[allowed])
+        (xt, labels) = (xt[allowed], labels[allowed])
+        (indx, spin) = _two_body_index(basis, ii, jj, aa, bb)
+        for ispin in range(nspin_two):
+            sel = spin == ispin
+            _store(coulomb[ispin], indx[sel], xt[sel], labels[sel], tolerance)
+
+    for store in itertools.chain(coulomb, *one_body):
+        store[np.isnan(store)] = 0.0
+    return PackedIntegrals(ecore, one_body, coulomb, nforbidden)
+
+
+def write_system(filename, basis, integrals, nel, ms, fcidump='FCIDUMP',
+                 uselz=False):
+    '''Write a HANDE HDF5 system file.
+
+Parameters
+----------
+filename : string
+    name of HDF5 file to write.
+basis : :class:`Basis`
+    basis set, as returned by :func:`init_basis`.
+integrals : :class:`PackedIntegrals`
+    compressed integral stores, as returned by :func:`pack_integrals`.
+nel : int
+    number of electrons.
+ms : int
+    spin polarisation (in units of 1/2).
+fcidump : string
+    name of the FCIDUMP file from which the system was produced.  For
+    information only.
+uselz : bool
+    use Lz symmetry.
+
+Returns
+-------
+None.
+'''
+
+    import h5py
+    with h5py.File(filename, 'w') as h5f:
+        metadata = h5f.create_group('metadata')
+        metadata['hande version'] = np.bytes_('pyhande.fcidump')
+        metadata['uuid'] = np.bytes_(str(uuid.uuid4()))
+        metadata['date'] = np.bytes_(
+                datetime.datetime.now().strftime('%H:%M:%S %d/%m/%Y'))
+        metadata['sysdump version'] = np.int32(_SYSDUMP_VERSION)
+
+        system = h5f.create_group('system')
+        system['system'] = np.int32(_READ_IN_SYSTEM)
+        system['nelectrons'] = np.int32(nel)
+        system['Ms'] = np.int32(ms)
+        system['CAS'] = np.array([-1, -1], dtype=np.int32)
+        system['momentum_space'] = np.int32(False)
+
+        group = system.create_group('basis')
+        group['nbasis'] = np.int32(len(basis.sym))
+        for (name, values) in (('basis_spatial_index', basis.spatial_index),
+                               ('basis_symmetry', basis.sym),
+                               ('basis_symmetry_index', basis.sym_index),
+                               ('basis_symmetry_spin_index', basis.sym_spin_index),
+                               ('basis_ms', basis.ms),
+                               ('basis_lz', basis.lz)):
+            group[name] = np.asarray(values, dtype=np.int32)
+        group['basis_sp_eigv'] = np.asarray(basis.sp_eigv, dtype=np.float64)
+
+        read_in = system.create_group('read_in')
+        read_in['fcidump'] = np.bytes_(fcidump)
+        read_in['uhf'] = np.int32(basis.uhf)
+        read_in['ecore'] = np.array([integrals.ecore], dtype=np.float64)
+        read_in['uselz'] = np.int32(uselz)
+        read_in['comp'] = np.int32(False)
+        read_in['pg_mask'] = np.int32(basis.pg_mask)
+
+        group = read_in.create_group('integrals')
+        for (ispin, blocks) in enumerate(integrals.one_body):
+            for (isym, block) in enumerate(blocks):
+                group['one_body_ispin%02i_isym%02i' % (ispin+1, isym)] = block
+        for (ispin, store) in enumerate(integrals.coulomb):
+            group['coulomb_ints_ispin%02i' % (ispin+1,)] = store
+
+
+def convert(fcidump, filename=None, nel=None, ms=None, uselz=False,
+            chunk_size=1000000, tolerance=1.e-10):
+    '''Convert a FCIDUMP file into a HANDE HDF5 system file.
+
+The FCIDUMP file is read twice (first to obtain the single-particle eigenvalues
+and then the integrals), in the same way as HANDE does on start-up.
+
+Parameters
+----------
+fcidump : string
+    name of FCIDUMP file.
+filename : string
+    name of HDF5 file to write.  Default: fcidump + '.H5', as used by
+    write_read_in_system.
+nel : int
+    number of electrons.  Default: value in the FCIDUMP file.
+ms : int
+    spin polarisation (in units of 1/2).  Default: value in the FCIDUMP file.
+uselz : bool
+    use Lz symmetry (HANDE's Lz input option).
+chunk_size : int
+    number of integrals to read at a time.
+tolerance : float
+    maximum difference allowed between repeated occurrences of an integral.
+
+Returns
+-------
+filename : string
+    name of HDF5 file written.
+'''
+
+    (header, nlines) = read_header(fcidump)
+    if 'norb' not in header:
+        raise ValueError('norb not provided in FCIDUMP header.')
+    if nel is None:
+        nel = header.get('nelec', 0)
+    if ms is None:
+        ms = header.get('ms2')
+    if not nel or ms is None:
+        raise ValueError('Nelec and ms not provided in FCIDUMP file or as '
+                         'arguments.')
+    if not filename:
+        filename = fcidump + '.H5'
+
+    sp_eigv = sp_eigenvalues(fcidump, header['norb'], nel,
+                             header.get('uhf', False), chunk_size)
+    basis = init_basis(header, sp_eigv, uselz)
+    integrals = pack_integrals(fcidump, basis, chunk_size, tolerance)
+    if integrals.nforbidden:
+        warnings.warn('Found and ignored %i integrals which should be zero by '
+                      'symmetry in file: %s' % (integrals.nforbidden, fcidump))
+    write_system(filename, basis, integrals, nel, ms, fcidump, uselz)
+    return filename
+
+
+def _namelist_value(value):
+    '''Convert a value in a Fortran namelist to a python int or bool.'''
+    upper = value.upper().strip('.')
+    if upper in ('T', 'TRUE'):
+        return True
+    elif upper in ('F', 'FALSE'):
+        return False
+    else:
+        return int(value)
+
+
+def _pad_list(values, length):
+    '''Pad (or truncate) a list of integers with zeros to the given length.'''
+    return (list(values) + [0]*length)[:length]
+
+
+def _insertion_rank(values, tolerance):
+    '''Rank values in increasing order, as HANDE's (stable) insertion_rank.
+
+Values which differ by less than tolerance are treated as equal.  Returns the
+(0-indexed) position in values of each item of the sorted list.
+'''
+    rank = list(range(len(values)))
+    for i in range(1, len(values)):
+        tmp = rank[i]
+        j = i - 1
+        while j >= 0 and values[rank[j]] - values[tmp] >= tolerance:
+            rank[j+1] = rank[j]
+            j -= 1
+        rank[j+1] = tmp
+    return np.array(rank, dtype=np.int64)
+
+
+def _tri_ind(i, j):
+    '''(1-indexed) index of element (i,j), i >= j, of a lower-triangular array.'''
+    i = np.asarray(i, dtype=np.int64)
+    return (i*(i-1))//2 + j
+
+
+def _cross_product(basis, sym_i, sym_j):
+    '''Symmetry of the direct product of two symmetries (cross_product_pg_sym).'''
+    return (((sym_i ^ sym_j) & basis.pg_mask) |
+            ((sym_i & basis.lz_mask) + (sym_j & basis.lz_mask) - basis.lz_offset))
+
+
+def _two_body_index(basis, i, j, a, b):
+    '''Position and spin channel of <ij|ab> in the Coulomb integral store.
+
+See two_body_int_indx in molecular_integrals.F90.  All basis function indices
+are 0-indexed, as are the returned position and spin channel.
+'''
+
+    (ii, aa) = (np.maximum(i, a), np.minimum(i, a))
+    (jj, bb) = (np.maximum(j, b), np.minimum(j, b))
+    ia = _tri_ind(basis.spatial_index[ii], basis.spatial_index[aa])
+    jb = _tri_ind(basis.spatial_index[jj], basis.spatial_index[bb])
+    indx = _tri_ind(np.maximum(ia, jb), np.minimum(ia, jb)) - 1
+    if basis.uhf:
+        swap = (ia < jb) | ((ia == jb) & (ii < jj))
+        (ii, jj) = (np.where(swap, jj, ii), np.where(swap, ii, jj))
+        # Spin channels: down-down, up-up, down-up, up-down.
+        channels = np.array([[0, 2], [3, 1]])
+        spin = channels[(basis.ms[ii]+1)//2, (basis.ms[jj]+1)//2]
+    else:
+        spin = np.zeros_like(indx)
+    return (indx, spin)
+
+
+def _store(store, indx, values, orbs, tolerance):
+    '''Store integrals, checking repeated integrals have consistent values.'''
+    if not len(indx):
+        return
+    order = np.argsort(indx, kind='mergesort')
+    (indx, values, orbs) = (indx[order], values[order], orbs[order])
+    previous = store[indx]
+    repeat = np.zeros(len(indx), dtype=bool)
+    repeat[1:] = indx[1:] == indx[:-1]
+    previous[repeat] = values[np.nonzero(repeat)[0] - 1]
+    bad = np.nonzero(abs(previous - values) > tolerance)[0]
+    if len(bad):
+        raise ValueError('Inconsistent values of repeated integral %s: %r and %r.'
+                         % (' '.join(str(o) for o in orbs[bad[0]]),
+                            previous[bad[0]], values[bad[0]]))
+    store[indx] = values
@@ -7,7 +7,7 @@ import pkgutil
 import sys
 import warnings
 
-import matplotlib.pyplot as plt
+import numpy
 import pandas as pd
 
 if pkgutil.find_loader('pyblock'):
@@ -95,6 +95,96 @@ Umrigar93
                      extract_psips, calc_inefficiency))
     return infos
 
+def reweight_scan(datafiles, histories, start=None, select_function=None,
+                  mean_shift=0.0, arith_mean=False, verbosity=1):
+    '''Scan the reweighted projected energy over the reweighting history.
+
+The population control bias in the reweighted projected energy is removed once
+the reweighting history is sufficiently long; choosing ``reweight_history`` in
+:func:`std_analysis` hence requires the weighted projected energy for a range of
+reweighting histories.  The calculations are extracted and the starting
+iteration found once, the weights for all histories are evaluated together (see
+:func:`pyhande.weight.calc_weights`) and the weighted estimators for all
+histories are reblocked together.
+
+Parameters
+----------
+datafiles : list of strings
+    names of files containing HANDE QMC calculation output.
+histories : list of integers
+    reweighting histories to scan over.  A history of 0 corresponds to no
+    reweighting.
+start, select_function, mean_shift, arith_mean, verbosity :
+    See :func:`std_analysis`.
+
+Returns
+-------
+scans : list of :class:`pandas.DataFrame`
+    For each calculation, the weighted projected energy (mean, standard error
+    and a 'pretty-printed' estimate) from
+    the optimal block size for each reweighting history, which is used as the
+    index.  The statistics are NaN if no optimal block size was found for
+    a reweighting history.
+
+Examples
+--------
+
+Compare the weighted projected energy from reweighting over 0 (i.e. no
+reweighting) to 1000 iterations from the 10000th iteration onwards:
+
+>>> reweight_scan(['hande.fciqmc.out'], [0, 10, 100, 1000], 10000)
+'''
+
+    # Reweight each calculation before they are concatenated, as in
+    # std_analysis, so the weights do not span restarted calculations.
+    (calcs, calcs_md) = zeroT_qmc(datafiles, list(histories), mean_shift,
+                                  arith_mean)
+    scans = []
+    for (calc, md) in zip(calcs, calcs_md):
+        calc_start = start
+        if calc_start is None:
+            calc_start = find_starting_iteration(calc, md, verbose=verbosity)
+        if (verbosity > -1) :
+            print('Block from: %i' % calc_start)
+        if select_function is None:
+            indx = calc['iterations'] > calc_start
+        else:
+            indx = select_function(calc)
+        indx = indx.values
+
+        weights = calc[['Weight %i' % (history,) for history in histories]]
+        weights = weights.values.T[:,indx]
+        proje_sum = calc['\sum H_0j N_j'].values[indx]
+        ref_pop = calc['N_0'].values[indx]
+
+        # Reblock the weighted estimators for all histories together.
+        (sum_keys, ref_keys, proje_keys) = ([], [], [])
+        mc_data = []
+        for (history, weight) in zip(histories, weights):
+            sum_keys.append('W * \sum H_0j N_j (%i)' % (history,))
+            ref_keys.append('W * N_0 (%i)' % (history,))
+            proje_keys.append('Weighted Proj. E. (%i)' % (history,))
+            mc_data.extend([proje_sum*weight, ref_pop*weight])
+        columns = [key for keys in zip(sum_keys, ref_keys) for key in keys]
+        mc_data = pd.DataFrame(numpy.array(mc_data).T, columns=columns)
+        (data_len, reblock, covariance) = pyblock.pd_utils.reblock(mc_data)
+
+        proje = pyhande.analysis.projected_energies(reblock, covariance,
+                    data_len, list(zip(sum_keys, ref_keys, proje_keys)))
+        (opt_block, no_opt_block) = pyhande.analysis.qmc_summary(proje,
+                                                                 proje_keys)
+
+        scan = opt_block.reindex(index=proje_keys,
+                                 columns=['mean', 'standard error'])
+        scan.index = pd.Index(histories, name='reweight history')
+        scan['estimate'] = [
+                pyblock.error.pretty_fmt_err(row['mean'], row['standard error'])
+                if key not in no_opt_block else ''
+                for (key, (history, row)) in zip(proje_keys, scan.iterrows())
+                           ]
+        scans.append(scan)
+    return scans
+
 def zeroT_qmc(datafiles, reweight_history=0, mean_shift=0.0, arith_mean=False):
     '''Extract zero-temperature QMC (i.e. FCIQMC and CCMC) calculations.
 
@@ -108,7 +198,9 @@ Reweighting information is added to the calculation data if requested.
 Parameters
 ----------
 datafiles, reweight_history, mean_shift, arith_mean :
-    See :func:`std_analysis`.
+    See :func:`std_analysis`.  If ``reweight_history`` is a list, the weights
+    for each value are added to each calculation (see
+    :func:`pyhande.weight.reweight`) but the weighted estimators are not.
 
 Returns
 -------
@@ -125,12 +217,13 @@ metadata : list of dict
     data = []
     metadata = []
     for (md, df) in filter_calcs(hande_out, ('FCIQMC', 'CCMC', 'Simple FCIQMC')):
-        if reweight_history > 0:
+        if numpy.ndim(reweight_history) > 0 or reweight_history > 0:
             df = pyhande.weight.reweight(df, md['qmc']['ncycles'],
                 md['qmc']['tau'], reweight_history, mean_shift,
                 arith_mean=arith_mean)
-            df['W * \sum H_0j N_j'] = df['\sum H_0j N_j'] * df['Weight']
-            df['W * N_0'] = df['N_0'] * df['Weight']
+            if numpy.ndim(reweight_history) == 0:
+                df['W * \sum H_0j N_j'] = df['\sum H_0j N_j'] * df['Weight']
+                df['W * N_0'] = df['N_0'] * df['Weight']
         data.append(df)
         metadata.append(md)
     if data:
@@ -168,6 +261,7 @@ info : :func:`collections.namedtuple`
     info_tuple = collections.namedtuple('HandeInfo', tuple_fields)
     # Reblock Monte Carlo data over desired window.
     reweight_calc = 'W * N_0' in calc
+    complex_calc = 'Re{N_0}' in calc
     if select_function is None:
         indx = calc['iterations'] > start
     else:
@@ -175,11 +269,19 @@ info : :func:`collections.namedtuple`
     to_block = []
     if extract_psips:
         to_block.append('# H psips')
-    to_block.extend(['\sum H_0j N_j', 'N_0', 'Shift'])
+    if complex_calc:
+        sum_key = ('Re{\sum H_0j N_j}', 'Im{\sum H_0j N_j}')
+        ref_key = ('Re{N_0}', 'Im{N_0}')
+        to_block.extend(sum_key + ref_key + ('Shift',))
+    else:
+        (sum_key, ref_key) = ('\sum H_0j N_j', 'N_0')
+        to_block.extend([sum_key, ref_key, 'Shift'])
+    estimators = [(sum_key, ref_key, 'Proj. Energy')]
     if reweight_calc:
         to_block.extend(['W * \sum H_0j N_j', 'W * N_0'])
+        estimators.append(('W * \sum H_0j N_j', 'W * N_0', 'Weighted Proj. E.'))
 
-    mc_data = calc.ix[indx, to_block]
+    mc_data = calc.loc[indx, to_block]
 
     if mc_data['Shift'].iloc[0] == mc_data['Shift'].iloc[1]:
         if calc['Shift'][~indx].iloc[-1] == mc_data['Shift'].iloc[0]:
@@ -188,16 +290,11 @@ info : :func:`collections.namedtuple`
 
     (data_len, reblock, covariance) = pyblock.pd_utils.reblock(mc_data)
 
-    proje = pyhande.analysis.projected_energy(reblock, covariance, data_len)
+    # Evaluate all projected energy estimators together.
+    proje = pyhande.analysis.projected_energies(reblock, covariance, data_len,
+                                                estimators)
     reblock = pd.concat([reblock, proje], axis=1)
-    to_block.append('Proj. Energy')
-
-    if reweight_calc:
-        proje = pyhande.analysis.projected_energy(reblock, covariance,
-                    data_len, sum_key='W * \sum H_0j N_j', ref_key='W * N_0',
-                    col_name='Weighted Proj. E.')
-        reblock = pd.concat([reblock, proje], axis=1)
-        to_block.append('Weighted Proj. E.')
+    to_block.extend(proje.columns.get_level_values(0).unique())
 
     # Summary (including pretty printing of estimates).
     (opt_block, no_opt_block) = pyhande.analysis.qmc_summary(reblock, to_block)
@@ -205,7 +302,7 @@ info : :func:`collections.namedtuple`
     if calc_inefficiency:
         # Calculate quantities needed for the inefficiency.
         dtau = md['qmc']['tau']
-        reblocked_iters = calc.ix[indx, 'iterations']
+        reblocked_iters = calc.loc[indx, 'iterations']
         N = reblocked_iters.iloc[-1] - reblocked_iters.iloc[0]
 
         # This returns a data frame with inefficiency data from the
@@ -443,7 +540,10 @@ starting_iteration: integer
             shift_variation_indx)/frac_screen_interval)
 
     min_index = -1
-    err_keys = ['Shift',  'N_0', '\sum H_0j N_j', '# H psips']
+    if 'Re{N_0}' in data:
+        err_keys = ['Shift',  'Re{N_0}', 'Re{\sum H_0j N_j}', '# H psips']
+    else:
+        err_keys = ['Shift',  'N_0', '\sum H_0j N_j', '# H psips']
     min_error_frac_weighted = pd.Series([float('inf')]*len(err_keys), index=err_keys)
     starting_iteration_found = False
 
@@ -490,6 +590,8 @@ starting_iteration: integer
                            "might not be converged.")
 
     if show_graph:
+        # Only import matplotlib when required: it is slow to import.
+        import matplotlib.pyplot as plt
         plt.xlabel('Iterations')
         plt.ylabel('Shift')
         plt.plot(data['iterations'], data['Shift'], 'b-', label='data')
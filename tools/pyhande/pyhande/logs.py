@@ -0,0 +1,441 @@
+'''Parse and summarise the log files produced by debug builds of HANDE.
+
+Debug builds of HANDE can write detailed logs of the calculation (CALC), each
+spawning event (SPAWN), each death event (DEATH), each stochastically selected
+CCMC cluster (STOCH_SELECTION) and the CCMC selection statistics (SELECT).  One
+file is written by each processor, named X.Y.pZ.log for log type X, index Y and
+processor Z.  These logs can easily run to many GB, so they are parsed in a
+single streaming pass and returned in chunks of numpy arrays, which can then be
+reduced to per-iteration summaries.
+'''
+
+import collections
+import re
+import warnings
+import numpy as np
+import pandas as pd
+
+LogChunk = collections.namedtuple('LogChunk', 'iterations columns data')
+LogChunk.__doc__ = '''A contiguous block of entries from a HANDE log file.
+
+Attributes
+----------
+iterations : :class:`numpy.ndarray`
+    iteration of each entry.
+columns : list of strings
+    name of each column of data, as in the header of the log file.
+data : :class:`numpy.ndarray`
+    2D array of entries, with one row per entry.
+'''
+
+# Title of each log file and the verbosity setting which identifies the log
+# type where multiple log types share the same title.
+_LOG_TYPES = [
+    ('HANDE QMC Calculation Log File', None, 'calc'),
+    ('HANDE QMC Spawning Log File', None, 'spawn'),
+    ('HANDE QMC Death Log File', None, 'death'),
+    ('HANDE QMC Selection Log File', 'Write Valid Stochastic Selection',
+     'stoch_selection'),
+    ('HANDE QMC Selection Log File', 'Write Amp P_select', 'select'),
+]
+
+# Log types where each entry includes the iteration.  Entries in other log
+# types are preceded by a header giving the iteration.
+_ITER_COLUMN = ('calc', 'select')
+
+_ITER_MARKER = re.compile(r'^#\s*Iteration\s+(-?\d+)')
+
+
+def log_type(filename):
+    '''Identify the type of a HANDE log file.
+
+Parameters
+----------
+filename : string
+    name of a HANDE log file.
+
+Returns
+-------
+log : string
+    type of the log file: 'calc', 'spawn', 'death', 'stoch_selection' or
+    'select'.
+'''
+
+    with open(filename) as f:
+        title = None
+        for line in f:
+            if line.startswith('#'):
+                break
+            if title is None and line.strip():
+                title = line.strip()
+            for (log_title, verbosity, log) in _LOG_TYPES:
+                if title == log_title and (verbosity is None or
+                                           verbosity in line):
+                    return log
+    raise ValueError('Unknown log file type: %s.' % (filename,))
+
+
+def log_columns(log, ncols):
+    '''Get the column names of a HANDE log file.
+
+The column headers written by HANDE are truncated (and, for the stochastic
+selection log, incomplete), so the names are instead set from the log type and
+number of columns.
+
+Parameters
+----------
+log : string
+    type of the log file (see :func:`log_type`).
+ncols : int
+    number of columns in each entry.
+
+Returns
+-------
+columns : list of strings
+    name of each column.
+'''
+
+    if log == 'calc':
+        columns = ['iter', '# spawn events', '# death particles', '# attempts']
+        if ncols > len(columns):
+            columns += ['# D0 select', '# stochastic', '# single excit']
+    elif log == 'spawn':
+        if ncols == 7:
+            columns = ['Re{H_ij}', 'Im{H_ij}', 'pgen', 'qn weighting',
+                       'parent amplitude', '# spawn', '# spawn im']
+        else:
+            columns = ['H_ij', 'pgen', 'qn weighting', 'parent amplitude',
+                       '# spawn']
+    elif log == 'death':
+        columns = ['Kii', 'proj_energy', 'loc_shift', 'qn_weight', 'p_death',
+                   'nkill', 'init pop', 'fin pop']
+    elif log == 'stoch_selection':
+        columns = (['nexcitors', 'ex_level'] +
+                   ['pops %i' % (i+1) for i in range(ncols-5)] +
+                   ['pselect', 'Re{amplitude}', 'Im{amplitude}'])
+    elif log == 'select':
+        columns = ['iter']
+        for i in range((ncols-1)//2):
+            columns += ['<Amp/psel> %i' % (i,), 'Var{Amp/psel} %i' % (i,)]
+    else:
+        raise ValueError('Unknown log type: %s.' % (log,))
+    if len(columns) != ncols:
+        raise ValueError('Unexpected number of columns (%i) in %s log.'
+                         % (ncols, log))
+    return columns
+
+
+def parse_log(filename, start_iter=0, end_iter=None, chunk_size=100000):
+    '''Parse a HANDE log file.
+
+Parameters
+----------
+filename : string
+    name of a HANDE log file.
+start_iter, end_iter : int
+    only entries from iterations in [start_iter, end_iter] are returned, with
+    the same meaning as the start and finish options of the logging table in
+    the HANDE input.  If end_iter is None, all iterations from start_iter
+    onwards are returned.
+chunk_size : int
+    maximum number of entries in each chunk.
+
+Returns
+-------
+chunks : generator of :class:`LogChunk`
+    entries from the log file.  Every entry of a chunk from a spawn, death or
+    stochastic selection log is from the same iteration.
+'''
+
+    log = log_type(filename)
+    if end_iter is None:
+        end_iter = np.iinfo(np.int64).max
+    iteration = None
+    in_window = log in _ITER_COLUMN
+    lines = []
+    with open(filename) as f:
+        # Skip preamble.
+        for line in f:
+            if line.startswith('#'):
+                break
+        for line in f:
+            if line.startswith('#'):
+                match = _ITER_MARKER.match(line)
+                if match:
+                    if lines:
+                        yield _log_chunk(log, lines, iteration)
+                        lines = []
+                    iteration = int(match.group(1))
+                    if iteration > end_iter:
+                        # Logs are written in order of iteration.
+                        return
+                    in_window = iteration >= start_iter
+            elif in_window and ',' in line and not line.lstrip()[0].isalpha():
+                # Column headers in the stochastic selection log are not
+                # commented out, so also skip lines which are not numeric.
+                lines.append(line)
+                if len(lines) == chunk_size:
+                    chunk = _log_chunk(log, lines, iteration)
+                    lines = []
+                    past_end = chunk.iterations[-1] > end_iter
+                    if log in _ITER_COLUMN:
+                        chunk = _select_iterations(chunk, start_iter, end_iter)
+                    if len(chunk.iterations):
+                        yield chunk
+                    if past_end:
+                        return
+    if lines:
+        chunk = _log_chunk(log, lines, iteration)
+        if log in _ITER_COLUMN:
+            chunk = _select_iterations(chunk, start_iter, end_iter)
+        if len(chunk.iterations):
+            yield chunk
+
+
+def log_data(filenames, start_iter=0, end_iter=None):
+    '''Read HANDE log files into a single table.
+
+This is only appropriate for logs of modest size (e.g. calculation and
+selection logs); use :func:`parse_log` or the summary functions for large logs.
+
+Parameters
+----------
+filenames : string or list of strings
+    names of HANDE log files of the same type (e.g. from different
+    processors).
+start_iter, end_iter : int
+    see :func:`parse_log`.
+
+Returns
+-------
+data : :class:`pandas.DataFrame`
+    entries from all log files, with the iteration ('iter') and processor
+    ('proc'; index of file in filenames) of each entry.
+'''
+
+    frames = []
+    for (iproc, filename) in enumerate(_filenames(filenames)):
+        for chunk in parse_log(filename, start_iter, end_iter):
+            frame = pd.DataFrame(chunk.data, columns=chunk.columns)
+            frame['iter'] = chunk.iterations
+            frame['proc'] = iproc
+            frames.append(frame)
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+    else:
+        return pd.DataFrame()
+
+
+def spawn_acceptance(filenames, start_iter=0, end_iter=None, chunk_size=100000):
+    '''Summarise spawning events in each iteration.
+
+.. note::
+
+    Failed spawning attempts are only logged if the spawn verbosity level is
+    at least 2.  Otherwise all logged attempts are (by definition) accepted.
+
+Parameters
+----------
+filenames : string or list of strings
+    names of HANDE spawn log files (e.g. from each processor).
+start_iter, end_iter : int
+    see :func:`parse_log`.
+chunk_size : int
+    number of entries to read at a time.
+
+Returns
+-------
+acceptance : :class:`pandas.DataFrame`
+    number of logged spawning attempts ('attempts'), number of successful
+    attempts ('accepted'), the fraction of attempts which were successful
+    ('acceptance'), the total number of particles spawned ('spawned') and the
+    mean of |H_ij|/pgen over all attempts ('|H_ij|/pgen') in each iteration.
+'''
+
+    def reduce_chunk(chunk):
+        data = chunk.data
+        if '# spawn im' in chunk.columns:
+            hij = np.hypot(data[:,0], data[:,1])
+            nspawn = abs(data[:,-2]) + abs(data[:,-1])
+        else:
+            hij = abs(data[:,0])
+            nspawn = abs(data[:,-1])
+        pgen = data[:,chunk.columns.index('pgen')]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = hij/pgen
+        return pd.DataFrame({'attempts': np.ones(len(data), dtype=int),
+                             'accepted': (nspawn > 0).astype(int),
+                             'spawned': nspawn,
+                             '|H_ij|/pgen': ratio})
+
+    summary = _reduce(filenames, reduce_chunk, start_iter, end_iter, chunk_size,
+                      ['attempts', 'accepted', 'spawned', '|H_ij|/pgen'])
+    summary['|H_ij|/pgen'] /= summary['attempts']
+    summary['acceptance'] = summary['accepted']/summary['attempts']
+    return summary[['attempts', 'accepted', 'acceptance', 'spawned',
+                    '|H_ij|/pgen']]
+
+
+def death_rates(filenames, start_iter=0, end_iter=None, chunk_size=100000):
+    '''Summarise death events in each iteration.
+
+Parameters
+----------
+filenames : string or list of strings
+    names of HANDE death log files (e.g. from each processor).
+start_iter, end_iter : int
+    see :func:`parse_log`.
+chunk_size : int
+    number of entries to read at a time.
+
+Returns
+-------
+rates : :class:`pandas.DataFrame`
+    number of logged death events ('events'), net number of particles killed
+    ('nkill'), mean probability of death of a particle ('p_death'), total
+    absolute population before and after death ('init pop', 'fin pop') and the
+    fraction of the population removed by death ('death rate') in each
+    iteration.
+'''
+
+    def reduce_chunk(chunk):
+        data = pd.DataFrame(chunk.data, columns=chunk.columns)
+        return pd.DataFrame({'events': np.ones(len(data), dtype=int),
+                             'nkill': data['nkill'],
+                             'p_death': data['p_death'],
+                             'init pop': data['init pop'].abs(),
+                             'fin pop': data['fin pop'].abs()})
+
+    summary = _reduce(filenames, reduce_chunk, start_iter, end_iter, chunk_size,
+                      ['events', 'nkill', 'p_death', 'init pop', 'fin pop'])
+    summary['p_death'] /= summary['events']
+    summary['death rate'] = 1 - summary['fin pop']/summary['init pop']
+    return summary[['events', 'nkill', 'p_death', 'init pop', 'fin pop',
+                    'death rate']]
+
+
+def cluster_size_histogram(filenames, start_iter=0, end_iter=None,
+                           chunk_size=100000):
+    '''Count the number of stochastically selected clusters of each size.
+
+Parameters
+----------
+filenames : string or list of strings
+    names of HANDE stochastic selection log files (e.g. from each processor).
+start_iter, end_iter : int
+    see :func:`parse_log`.
+chunk_size : int
+    number of entries to read at a time.
+
+Returns
+-------
+histogram : :class:`pandas.DataFrame`
+    number of logged selections of clusters containing each number of excitors
+    (columns) in each iteration (index).
+'''
+
+    def reduce_chunk(chunk):
+        sizes = chunk.data[:,0].astype(int)
+        counts = np.zeros((len(sizes), sizes.max()+1), dtype=int)
+        counts[np.arange(len(sizes)), sizes] = 1
+        return pd.DataFrame(counts)
+
+    histogram = _reduce(filenames, reduce_chunk, start_iter, end_iter,
+                        chunk_size)
+    histogram = histogram.fillna(0).astype(int)
+    histogram.columns.name = 'nexcitors'
+    return histogram[sorted(histogram.columns)]
+
+
+def _filenames(filenames):
+    '''Convert a single filename into a list of filenames.'''
+    if isinstance(filenames, str):
+        return [filenames]
+    else:
+        return filenames
+
+
+def _reduce(filenames, reduce_chunk, start_iter, end_iter, chunk_size,
+            columns=()):
+    '''Sum quantities derived from each log entry over each iteration.
+
+Parameters
+----------
+filenames : string or list of strings
+    names of HANDE log files.
+reduce_chunk : function
+    function which takes a :class:`LogChunk` and returns a
+    :class:`pandas.DataFrame` of quantities, with one row per entry, to be
+    summed.
+start_iter, end_iter, chunk_size : int
+    see :func:`parse_log`.
+columns : list of strings
+    names of the quantities returned by reduce_chunk, used if there are no
+    entries in the iteration window.
+
+Returns
+-------
+summary : :class:`pandas.DataFrame`
+    sum of each quantity over all entries in each iteration.  Empty (with the
+    given columns) if there are no entries in the iteration window.
+'''
+
+    sums = []
+    for filename in _filenames(filenames):
+        for chunk in parse_log(filename, start_iter, end_iter, chunk_size):
+            sums.append(reduce_chunk(chunk).groupby(chunk.iterations).sum())
+    if sums:
+        summary = pd.concat(sums).groupby(level=0).sum()
+    else:
+        summary = pd.DataFrame(columns=list(columns), dtype=float,
+                               index=pd.Index([], dtype=np.int64))
+    summary.index.name = 'iter'
+    return summary
+
+
+def _log_chunk(log, lines, iteration):
+    '''Convert a set of log entries into a :class:`LogChunk`.'''
+    data = _parse_values(lines)
+    if log in _ITER_COLUMN:
+        iterations = data[:,0].astype(np.int64)
+    else:
+        iterations = np.empty(len(data), dtype=np.int64)
+        iterations.fill(iteration if iteration is not None else -1)
+    return LogChunk(iterations, log_columns(log, data.shape[1]), data)
+
+
+def _select_iterations(chunk, start_iter, end_iter):
+    '''Remove entries outside the iteration window from a :class:`LogChunk`.'''
+    in_window = (chunk.iterations >= start_iter) & (chunk.iterations <= end_iter)
+    if in_window.all():
+        return chunk
+    else:
+        return LogChunk(chunk.iterations[in_window], chunk.columns,
+                        chunk.data[in_window])
+
+
+def _parse_values(lines):
+    '''Parse a set of comma-separated log entries into a 2D array.
+
+Entries which cannot be converted (e.g. due to a Fortran overflow) are set to
+NaN.
+'''
+    ncols = lines[0].rstrip().rstrip(',').count(',') + 1
+    text = ','.join(line.rstrip().rstrip(',') for line in lines)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            data = np.fromstring(text, sep=',')
+        if data.size == len(lines)*ncols:
+            return data.reshape(len(lines), ncols)
+    except (ValueError, DeprecationWarning):
+        pass
+    data = np.empty((len(lines), ncols))
+    data.fill(np.nan)
+    for (i, line) in enumerate(lines):
+        for (j, value) in enumerate(line.rstrip().rstrip(',').split(',')[:ncols]):
+            try:
+                data[i,j] = float(value)
+            except ValueError:
+                pass
+    return data
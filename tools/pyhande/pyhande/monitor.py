@@ -0,0 +1,618 @@
+'''Monitor running FCIQMC and CCMC calculations.
+
+The output of a running calculation is followed (as in ``tail -f``) and each new
+report loop is added to an online reblocking analysis of the projected energy
+and shift, so that the statistical error can be monitored at negligible cost
+whilst the calculation is running.  The calculation can be controlled by
+writing to HANDE.COMM in its working directory.
+'''
+
+import collections
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+import pyblock
+
+BlockTuple = collections.namedtuple('BlockTuple',
+                                    'block ndata mean cov std_err std_err_err')
+BlockTuple.__doc__ = '''Statistics of a single reblocking transformation.
+
+Identical in format to the statistics returned by
+:func:`pyblock.blocking.reblock`.
+
+Attributes
+----------
+block : int
+    reblocking iteration: each block contains 2^block data points.
+ndata : int
+    number of blocks.
+mean : :class:`numpy.ndarray`
+    mean of each variable.
+cov : :class:`numpy.ndarray`
+    covariance matrix of the variables.
+std_err : :class:`numpy.ndarray`
+    standard error of each variable.
+std_err_err : :class:`numpy.ndarray`
+    error in the standard error of each variable.
+'''
+
+BlockAccumulator = collections.namedtuple('BlockAccumulator',
+                                'offset count sums products pending has_pending')
+BlockAccumulator.__doc__ = '''Running sums for an online reblocking analysis.
+
+Each data point is added to the sums for reblocking iteration 0 and averaged
+with the pending data point at that iteration, if present, to give a data
+point for the next reblocking iteration, and so on.  Hence adding a data point
+requires O(log N) operations and memory and the statistics at each reblocking
+iteration are identical to those obtained by :func:`pyblock.blocking.reblock`
+on the entire data set.  The arrays are updated in place by
+:func:`accumulate`.
+
+Attributes
+----------
+offset : :class:`numpy.ndarray`
+    first data point, which is subtracted from all data points to reduce
+    rounding error in the sums of squares.
+count : :class:`numpy.ndarray`
+    number of (complete) blocks at each reblocking iteration.
+sums : :class:`numpy.ndarray`
+    sum of the blocks of each variable at each reblocking iteration.
+products : :class:`numpy.ndarray`
+    sum of the products of the blocks of each pair of variables at each
+    reblocking iteration.
+pending : :class:`numpy.ndarray`
+    block at each reblocking iteration waiting to be paired with the next
+    block.
+has_pending : :class:`numpy.ndarray`
+    true if a block is waiting to be paired at each reblocking iteration.
+'''
+
+Convergence = collections.namedtuple('Convergence',
+        'iterations start ndata proj_energy proj_energy_error shift '
+        'shift_error optimal_block')
+Convergence.__doc__ = '''Current estimates from a running calculation.
+
+Attributes
+----------
+iterations : int
+    last iteration read.
+start : int
+    iteration from which data is reblocked, or None if the shift is not yet
+    varying.
+ndata : int
+    number of report loops reblocked.
+proj_energy, proj_energy_error : float
+    projected energy and its standard error.
+shift, shift_error : float
+    mean shift and its standard error.
+optimal_block : int
+    optimal reblocking iteration for the projected energy.  The means and
+    errors are NaN if an optimal block has not been found.
+'''
+
+
+def block_accumulator(nvar, max_blocks=64):
+    '''Create an empty online reblocking analysis.
+
+Parameters
+----------
+nvar : int
+    number of variables.
+max_blocks : int
+    maximum number of reblocking iterations.  The analysis can hold up to
+    2^max_blocks data points.
+
+Returns
+-------
+acc : :class:`BlockAccumulator`
+    empty online reblocking analysis.
+'''
+
+    return BlockAccumulator(
+        offset=np.full(nvar, np.nan),
+        count=np.zeros(max_blocks, dtype=int),
+        sums=np.zeros((max_blocks, nvar)),
+        products=np.zeros((max_blocks, nvar, nvar)),
+        pending=np.zeros((max_blocks, nvar)),
+        has_pending=np.zeros(max_blocks, dtype=bool),
+    )
+
+
+def accumulate(acc, data):
+    '''Add data points to an online reblocking analysis.
+
+Parameters
+----------
+acc : :class:`BlockAccumulator`
+    online reblocking analysis, updated in place.
+data : :class:`numpy.ndarray`
+    2D array of data points, with one row per data point and one column per
+    variable.
+
+Returns
+-------
+None.
+'''
+
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    if len(data) and np.isnan(acc.offset[0]):
+        acc.offset[:] = data[0]
+    for point in data - acc.offset:
+        for block in range(len(acc.count)):
+            acc.count[block] += 1
+            acc.sums[block] += point
+            acc.products[block] += np.outer(point, point)
+            if not acc.has_pending[block]:
+                acc.pending[block] = point
+                acc.has_pending[block] = True
+                break
+            point = 0.5*(acc.pending[block] + point)
+            acc.has_pending[block] = False
+
+
+def block_stats(acc):
+    '''Get the statistics at each reblocking iteration of an online analysis.
+
+Parameters
+----------
+acc : :class:`BlockAccumulator`
+    online reblocking analysis.
+
+Returns
+-------
+stats : list of :class:`BlockTuple`
+    statistics at each reblocking iteration with at least two blocks, in the
+    same format as :func:`pyblock.blocking.reblock`, and so can be passed to
+    :func:`pyblock.blocking.find_optimal_block`.
+'''
+
+    stats = []
+    for block in range(len(acc.count)):
+        ndata = acc.count[block]
+        if ndata < 2:
+            break
+        mean = acc.sums[block]/ndata
+        cov = (acc.products[block] - ndata*np.outer(mean, mean))/(ndata - 1)
+        std_err = np.sqrt(np.maximum(cov.diagonal(), 0)/ndata)
+        std_err_err = std_err/np.sqrt(2*(ndata - 1))
+        stats.append(BlockTuple(block, ndata, mean + acc.offset, cov, std_err,
+                                std_err_err))
+    return stats
+
+
+def follow(filename, keys=('\\sum H_0j N_j', 'N_0', 'Shift'), start=None):
+    '''Start following the output of a (running) calculation.
+
+Parameters
+----------
+filename : string
+    name of the HANDE output file.
+keys : tuple of strings
+    columns containing the numerator and denominator of the projected energy
+    and the shift, which are reblocked.
+start : int
+    iteration from which to start reblocking.  If None, reblocking starts once
+    the shift starts varying.
+
+Returns
+-------
+job : dict
+    state of the calculation, to be passed to :func:`update`.  The items
+    'filename', 'columns' (columns of the current data table), 'iterations'
+    (last iteration read), 'start' (iteration from which data is reblocked),
+    'ncalcs' (number of data tables read), 'finished' (true once the end of
+    the output has been reached), 'blocks' (the :class:`BlockAccumulator`
+    of the current data table, or None if it does not contain keys), 'tau'
+    (current timestep), 'blooms' (list of (iteration, number of blooms) for
+    each bloom warning) and 'ncomms' (number of times HANDE.COMM has been read
+    by HANDE) can be inspected.
+'''
+
+    return dict(filename=filename, fhandle=None, partial='', keys=keys,
+                start_iteration=start, start=None, columns=None,
+                iterations=None, last_shift=None, ncalcs=0, blocks=None,
+                finished=False, tau=None, blooms=[], ncomms=0)
+
+
+def update(job):
+    '''Read any new output from a calculation.
+
+New report loops are added to the online reblocking analysis.  If a new data
+table is found (e.g. a subsequent calculation in the same output file), the
+reblocking analysis is restarted.
+
+Parameters
+----------
+job : dict
+    state of the calculation, as returned by :func:`follow`, updated in place.
+
+Returns
+-------
+data : :class:`pandas.DataFrame`
+    report loops read (from the current data table only).
+'''
+
+    iteration_pattern = re.compile('^ #  *iterations')
+    tau_pattern = re.compile('^ *"tau": *([-+.0-9Ee]+)|'
+                             '^ # Warning timestep changed to: *([-+.0-9Ee]+)')
+    bloom_pattern = re.compile('^ # WARNING: more than.*single event *([0-9]+) '
+                               'times in the last report loop')
+    if job['fhandle'] is None:
+        if not os.path.exists(job['filename']):
+            return pd.DataFrame()
+        job['fhandle'] = open(job['filename'])
+    rows = []
+    text = job['partial'] + job['fhandle'].read()
+    lines = text.split('\n')
+    # Keep any incomplete line until the rest of it has been written.
+    job['partial'] = lines.pop()
+    for line in lines:
+        if iteration_pattern.match(line):
+            # Columns are separated by at least two spaces but each column name
+            # can contain words separated by just one space.
+            job['columns'] = re.split('   *', line[3:].strip())
+            job['ncalcs'] += 1
+            job['start'] = None
+            job['last_shift'] = None
+            job['recent'] = None
+            rows = []
+            if all(key in job['columns'] for key in job['keys']):
+                job['blocks'] = block_accumulator(len(job['keys']))
+            else:
+                job['blocks'] = None
+        elif job['columns'] and line[:1] == ' ' and line.strip()[:1].isdigit():
+            try:
+                row = [float(val) for val in line.split()]
+            except ValueError:
+                continue
+            if len(row) == len(job['columns']):
+                rows.append(row)
+        elif line.startswith(' Finished running on'):
+            job['finished'] = True
+        elif 'use the information provided in HANDE.COMM' in line:
+            job['ncomms'] += 1
+        elif tau_pattern.match(line):
+            match = tau_pattern.match(line)
+            job['tau'] = float(match.group(1) or match.group(2))
+        elif bloom_pattern.match(line):
+            # Warnings are printed after the report loop they refer to.
+            iteration = rows[-1][0] if rows else job['iterations']
+            job['blooms'].append((iteration,
+                                  int(bloom_pattern.match(line).group(1))))
+
+    data = pd.DataFrame(rows, columns=job['columns'])
+    if not data.empty:
+        job['iterations'] = int(data['iterations'].iloc[-1])
+        if job['blocks'] is not None:
+            _accumulate_table(job, data)
+    return data
+
+
+def _accumulate_table(job, data):
+    '''Add report loops from the current data table to the reblocking analysis.
+
+Parameters
+----------
+job : dict
+    state of the calculation, as returned by :func:`follow`, updated in place.
+data : :class:`pandas.DataFrame`
+    new report loops from the current data table.
+
+Returns
+-------
+None.
+'''
+
+    # Look up columns by position as replica calculations have repeated
+    # column names.
+    index = [job['columns'].index(key) for key in job['keys']]
+    iterations = data.values[:,0]
+    values = data.values[:,index]
+    if job['start'] is None:
+        if job['start_iteration'] is not None:
+            varying = iterations >= job['start_iteration']
+        else:
+            shift = values[:,-1]
+            previous = np.roll(shift, 1)
+            previous[0] = shift[0] if job['last_shift'] is None \
+                                   else job['last_shift']
+            varying = shift != previous
+        if varying.any():
+            job['start'] = int(iterations[varying][0])
+        job['last_shift'] = values[-1,-1]
+    if job['start'] is not None:
+        accumulate(job['blocks'], values[iterations >= job['start']])
+
+
+def convergence(job):
+    '''Estimate the projected energy and shift of a running calculation.
+
+Parameters
+----------
+job : dict
+    state of the calculation, as returned by :func:`follow`.
+
+Returns
+-------
+estimates : :class:`Convergence`
+    current estimates.  The optimal block is the largest of the optimal blocks
+    of the numerator and denominator of the projected energy.
+'''
+
+    nan = float('nan')
+    stats = block_stats(job['blocks']) if job['blocks'] is not None else []
+    ndata = stats[0].ndata if stats else 0
+    estimates = Convergence(job['iterations'], job['start'], ndata, nan, nan,
+                            nan, nan, nan)
+    if stats:
+        opt = pyblock.blocking.find_optimal_block(ndata, stats)
+        if not np.isnan(opt[:2]).any():
+            block = stats[int(max(opt[:2]))]
+            (num, den) = block.mean[:2]
+            (se_num, se_den) = block.std_err[:2]
+            energy = num/den
+            # As pyblock.error.ratio.
+            energy_error = abs(energy*np.sqrt((se_num/num)**2 + (se_den/den)**2
+                               - 2*block.cov[0,1]/(block.ndata*num*den)))
+            estimates = estimates._replace(proj_energy=energy,
+                                           proj_energy_error=energy_error,
+                                           optimal_block=block.block)
+        if not np.isnan(opt[2]):
+            block = stats[int(opt[2])]
+            estimates = estimates._replace(shift=block.mean[2],
+                                           shift_error=block.std_err[2])
+    return estimates
+
+
+SteeringPolicy = collections.namedtuple('SteeringPolicy',
+        'window cooldown max_blooms jump tau_decrease low_rspawn tau_increase '
+        'min_tau max_tau pop_factor')
+SteeringPolicy.__new__.__defaults__ = (10, 10, 1, 0.5, 0.8, None, 1.1, 0.0,
+                                       float('inf'), None)
+SteeringPolicy.__doc__ = '''Policy for steering a running calculation.
+
+All attributes have default values, so a policy can be created by, e.g.,
+``SteeringPolicy(low_rspawn=0.01)``.
+
+Attributes
+----------
+window : int
+    number of report loops over which the spawning statistics, blooms and
+    population growth are assessed.  Default: 10.
+cooldown : int
+    number of report loops to wait after an intervention before making another,
+    to allow its effect to be observed.  Default: 10.
+max_blooms : int
+    reduce the timestep if at least this many blooms occur within the window.
+    Default: 1.
+jump : float
+    once the shift is varying, an increase in the population by more than this
+    fraction between successive report loops is also counted as a bloom, as
+    HANDE only prints the first bloom warning.  None to disable.  Default: 0.5.
+tau_decrease : float
+    factor by which the timestep is reduced.  Default: 0.8.
+low_rspawn : float
+    increase the timestep if the median spawning rate (R_spawn) within the
+    window is below this value and there are no blooms.  None to disable.
+    Default: None.
+tau_increase : float
+    factor by which the timestep is increased.  Default: 1.1.
+min_tau, max_tau : float
+    range within which the timestep is kept.  Default: 0 and infinity.
+pop_factor : float
+    once the shift is varying, if the population changes by more than this
+    fraction within the window, set the shift to the value which would have
+    held the population constant.  None to disable.  Default: None.
+'''
+
+
+def steer(job, data, policy=SteeringPolicy(), pop_key='# H psips',
+          rspawn_key='R_spawn', hold=False):
+    '''Decide how (if at all) to change the parameters of a running calculation.
+
+Parameters
+----------
+job : dict
+    state of the calculation, as returned by :func:`follow` and updated by
+    :func:`update`.  The report loops not yet assessed (and the last window of
+    those already assessed) and the number of report loops since the last
+    intervention are stored in job.
+data : :class:`pandas.DataFrame`
+    report loops returned by the last call to :func:`update`.  All report loops
+    are assessed, however many are passed at once, so blooms are not missed if
+    more than a window of report loops is read between calls.
+policy : :class:`SteeringPolicy`
+    policy for changing the calculation.
+pop_key : string
+    column containing the total population.
+rspawn_key : string
+    column containing the spawning rate.
+hold : boolean
+    if true, only store data in job, to be assessed by the next call to
+    :func:`steer` (e.g. whilst a previous change has not yet been read by
+    HANDE).
+
+Returns
+-------
+settings : dict
+    settings to be written to HANDE.COMM (see :func:`write_comm`).  Empty if
+    no change is required.
+reason : string
+    reason for the change, or None if no change is required.
+
+.. note::
+
+    The timestep is only known if it is printed in the output (in the JSON
+    input block or by the timestep search) or set by :func:`steer`.  The
+    timestep search in HANDE should be turned off when steering the timestep.
+'''
+
+    if job['columns'] is None or pop_key not in job['columns'] or \
+            job['keys'][-1] not in job['columns']:
+        return ({}, None)
+    recent = pd.concat([job.get('recent'), data])
+    job['recent'] = recent
+    job['since_steer'] = job.get('since_steer', policy.cooldown) + len(data)
+    if hold or len(recent) < policy.window or \
+            job['since_steer'] < policy.cooldown:
+        return ({}, None)
+
+    # Look up columns by position as replica calculations have repeated column
+    # names.
+    columns = list(recent.columns)
+    iterations = recent.values[:,0]
+    pop = recent.values[:,columns.index(pop_key)]
+    shift = recent.values[:,columns.index(job['keys'][-1])]
+    varying = job['start'] is not None
+
+    nblooms = sum(n for (it, n) in job['blooms'] if it >= iterations[0])
+    if varying and policy.jump is not None:
+        jumps = (pop[1:] > (1 + policy.jump)*pop[:-1]) & \
+                (iterations[1:] > job['start'])
+        nblooms += jumps.sum()
+    tau = job['tau']
+
+    settings = {}
+    reason = None
+    if tau and nblooms >= policy.max_blooms:
+        new_tau = max(tau*policy.tau_decrease, policy.min_tau)
+        if new_tau < tau:
+            settings['tau'] = new_tau
+            reason = '%i blooms since iteration %i' % (nblooms, iterations[0])
+    elif tau and policy.low_rspawn is not None and nblooms == 0 and \
+            rspawn_key in columns:
+        rspawn = np.median(recent.values[:,columns.index(rspawn_key)])
+        new_tau = min(tau*policy.tau_increase, policy.max_tau)
+        if rspawn < policy.low_rspawn and new_tau > tau:
+            settings['tau'] = new_tau
+            reason = 'median R_spawn of %g since iteration %i' % (rspawn,
+                                                                  iterations[0])
+    if not settings and tau and varying and policy.pop_factor is not None:
+        change = pop[-1]/pop[0]
+        if abs(change - 1) > policy.pop_factor:
+            growth = np.log(change)/(tau*(iterations[-1] - iterations[0]))
+            settings['shift'] = shift[-1] - growth
+            reason = 'population changed by a factor of %g since iteration %i' \
+                     % (change, iterations[0])
+    if settings:
+        job['since_steer'] = 0
+        job['recent'] = None
+        if 'tau' in settings:
+            job['tau'] = settings['tau']
+    else:
+        # Only the last window is needed to assess subsequent report loops.
+        job['recent'] = recent.iloc[-policy.window+1:] if policy.window > 1 \
+                        else None
+    return (settings, reason)
+
+
+def replay(source, filename, nlines=10, delay=0.1):
+    '''Write an existing output file gradually, as if from a running calculation.
+
+This is a fake HANDE calculation for testing tools which monitor and steer
+running calculations.  HANDE.COMM in the directory containing filename is read
+and removed after each chunk is written, as HANDE does after each report loop.
+
+Parameters
+----------
+source : string
+    HANDE output file to replay.
+filename : string
+    file to write to.
+nlines : int
+    number of lines to write at a time.
+delay : float
+    time (in seconds) to wait between writing each chunk.
+
+Returns
+-------
+comms : list of strings
+    contents of each HANDE.COMM read.  Writing stops (and the end of the
+    output is written) if softexit is set in HANDE.COMM.
+'''
+
+    comm_file = os.path.join(os.path.dirname(filename), 'HANDE.COMM')
+    comms = []
+    with open(source) as f:
+        lines = f.readlines()
+    footer = [line for line in lines if line.startswith(' Finished running on')]
+    with open(filename, 'w') as out:
+        for i in range(0, len(lines), nlines):
+            out.writelines(lines[i:i+nlines])
+            if os.path.exists(comm_file):
+                with open(comm_file) as f:
+                    comms.append(f.read())
+                os.remove(comm_file)
+                out.write(' #\n # From now on we use the information provided '
+                          'in HANDE.COMM.\n # %s\n' % ('-'*62,))
+                if re.search('softexit *= *true', comms[-1]):
+                    out.writelines(footer)
+                    break
+            out.flush()
+            time.sleep(delay)
+    return comms
+
+
+def write_comm(directory='.', **settings):
+    '''Write settings to HANDE.COMM to control a running calculation.
+
+Parameters
+----------
+directory : string
+    working directory of the calculation.
+settings :
+    options to set (e.g. softexit=True, tau=0.01, shift=[-1, -2]).  See the
+    HANDE manual for the options which can be changed.
+
+Returns
+-------
+filename : string
+    name of HANDE.COMM.
+
+.. note::
+
+    If HANDE.COMM already exists (i.e. has not yet been read by HANDE), the
+    settings are appended to it.  The file is written atomically, so HANDE
+    never reads a partially written file.
+'''
+
+    filename = os.path.join(directory, 'HANDE.COMM')
+    lines = []
+    if os.path.exists(filename):
+        with open(filename) as f:
+            lines = f.read().splitlines()
+    for (key, val) in sorted(settings.items()):
+        lines.append('%s = %s' % (key, _lua_value(val)))
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.rename(tmp_filename, filename)
+    return filename
+
+
+def _lua_value(val):
+    '''Convert a python value into a lua value.
+
+Parameters
+----------
+val : bool, int, float, string or list
+    python value.
+
+Returns
+-------
+lua : string
+    lua representation of val.
+'''
+
+    if isinstance(val, bool):
+        return 'true' if val else 'false'
+    elif isinstance(val, (list, tuple, np.ndarray)):
+        return '{ %s }' % (', '.join(_lua_value(v) for v in val),)
+    elif isinstance(val, str):
+        return '"%s"' % (val,)
+    elif isinstance(val, (int, np.integer)):
+        return '%d' % (val,)
+    else:
+        return repr(float(val))
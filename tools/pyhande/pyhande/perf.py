@@ -0,0 +1,334 @@
+'''Analyse the performance of FCIQMC and CCMC calculations.
+
+Each report line of a FCIQMC or CCMC calculation contains the number of
+occupied states, the number of spawning events and the time taken per Monte
+Carlo cycle, and the footer of the calculation contains the distribution of
+particles, determinants and communication time over the MPI processes.  These
+give the throughput of a calculation, how the cost of an iteration scales with
+the population and how well balanced the calculation is, which are useful for
+sizing allocations and for spotting calculations which ran unusually slowly
+(e.g. on a slow node).
+'''
+
+import collections
+import hashlib
+import numpy as np
+import pandas as pd
+import pyhande.extract
+
+ScalingFit = collections.namedtuple('ScalingFit', 'prefactor exponent r2')
+ScalingFit.__doc__ = '''Power-law fit of the time per iteration to the population.
+
+The time per iteration, t, is fitted to :math:`t = a N^b`, where N is the
+population, by a linear fit of :math:`\\log t` against :math:`\\log N`.
+
+Attributes
+----------
+prefactor : float
+    prefactor, a, of the fit.
+exponent : float
+    exponent, b, of the fit.
+r2 : float
+    coefficient of determination of the fit (in log-log space).
+'''
+
+
+def throughput(data, pop_key='# H psips', spawn_key='# spawn_events',
+               states_key='# states', time_key='time'):
+    '''Calculate the throughput of a calculation at each report loop.
+
+Parameters
+----------
+data : :class:`pandas.DataFrame`
+    HANDE QMC data table for a single calculation.
+pop_key : string
+    column containing the total population.
+spawn_key : string
+    column containing the number of spawning events per iteration.
+states_key : string
+    column containing the number of occupied states.
+time_key : string
+    column containing the (wall) time per iteration.
+
+Returns
+-------
+rates : :class:`pandas.DataFrame`
+    iterations, spawn events/s, states/s and psips/s for each report loop.
+    Report loops with a recorded time of zero (e.g. the initial report) are
+    discarded.
+
+.. note::
+
+    The time per iteration is printed to 4 decimal places by HANDE, so
+    throughputs of very small calculations are only rough estimates.
+'''
+
+    data = data[data[time_key] > 0]
+    rates = pd.DataFrame({'iterations': data['iterations']})
+    rates['spawn events/s'] = data[spawn_key] / data[time_key]
+    rates['states/s'] = data[states_key] / data[time_key]
+    rates['psips/s'] = data[pop_key] / data[time_key]
+    return rates
+
+
+def scaling_fit(data, pop_key='# H psips', time_key='time'):
+    '''Fit the time per iteration as a power law of the population.
+
+Parameters
+----------
+data : :class:`pandas.DataFrame`
+    HANDE QMC data table for a single calculation.
+pop_key : string
+    column containing the population to fit against.  '# states' is also
+    useful, as the cost of annihilation depends upon the number of occupied
+    states rather than the number of particles.
+time_key : string
+    column containing the (wall) time per iteration.
+
+Returns
+-------
+fit : :class:`ScalingFit`
+    fit of the time per iteration.  All attributes are NaN if fewer than two
+    distinct populations with non-zero time are available.
+'''
+
+    data = data[(data[time_key] > 0) & (data[pop_key] > 0)]
+    log_pop = np.log(data[pop_key].values.astype(float))
+    log_time = np.log(data[time_key].values.astype(float))
+    if len(np.unique(log_pop)) < 2:
+        return ScalingFit(np.nan, np.nan, np.nan)
+    (exponent, log_prefactor) = np.polyfit(log_pop, log_time, 1)
+    residuals = log_time - (exponent*log_pop + log_prefactor)
+    total = ((log_time - log_time.mean())**2).sum()
+    r2 = 1 - (residuals**2).sum()/total if total > 0 else np.nan
+    return ScalingFit(np.exp(log_prefactor), exponent, r2)
+
+
+def load_imbalance(metadata):
+    '''Calculate load imbalance ratios from the footer of a calculation.
+
+Parameters
+----------
+metadata : dict
+    metadata of a QMC calculation, as returned by
+    :func:`pyhande.extract.extract_data`.
+
+Returns
+-------
+imbalance : :class:`pandas.Series`
+    ratio of the maximum to the mean number of particles ('psips imbalance'),
+    determinants ('dets imbalance') and communication time ('comms
+    imbalance') on a processor, and the fraction of the calculation time
+    spent in walker communication ('comms fraction').  A perfectly balanced
+    calculation has imbalance ratios of 1.  Quantities which are not in the
+    metadata (e.g. for serial calculations) are NaN.
+'''
+
+    def ratio(num, denom):
+        num = metadata.get(num, np.nan)
+        denom = metadata.get(denom, np.nan)
+        if num is None or denom is None or not denom > 0:
+            return np.nan
+        return float(num)/float(denom)
+
+    imbalance = pd.Series(collections.OrderedDict([
+        ('psips imbalance', ratio('max_psips_per_mpi_process',
+                                  'mean_psips_per_mpi_process')),
+        ('dets imbalance', ratio('max_dets_per_mpi_process',
+                                 'mean_dets_per_mpi_process')),
+        ('comms imbalance', ratio('max_communication_time',
+                                  'mean_communication_time')),
+        ('comms fraction', ratio('mean_communication_time',
+                                 'calculation_time')),
+    ]))
+    return imbalance
+
+
+def input_hash(metadata, index=None):
+    '''Hash the input of a calculation.
+
+Parameters
+----------
+metadata : dict
+    metadata of a calculation, as returned by
+    :func:`pyhande.extract.extract_data`.
+index : int
+    position of the calculation within the output file.  An input file can
+    contain multiple calculations, which share the same (echoed) input, so
+    the position is included in the hash if given.
+
+Returns
+-------
+digest : string
+    hash of the input file echoed in the output, the calculation type and the
+    position of the calculation, so that the same calculation run from the
+    same input (e.g. on different numbers of processors) can be grouped
+    together, or None if the input is not available.
+'''
+
+    inp = metadata.get('input')
+    if not inp:
+        return None
+    key = '\n'.join(inp + ['%s %s' % (metadata.get('calc_type'), index)])
+    return hashlib.md5(key.encode('utf-8')).hexdigest()[:12]
+
+
+def performance_summary(filenames, pop_key='# H psips'):
+    '''Summarise the performance of a set of calculations.
+
+Parameters
+----------
+filenames : list of strings
+    names of files containing HANDE QMC calculation output.
+pop_key : string
+    column containing the total population.
+
+Returns
+-------
+summary : :class:`pandas.DataFrame`
+    one row for each FCIQMC or CCMC calculation, containing the filename,
+    position of the calculation in the file ('calc index'), calculation type,
+    input hash (see :func:`input_hash`), number of MPI
+    processes and OpenMP threads, number of iterations, calculation and wall
+    times, median throughputs (see :func:`throughput`), exponent of the fit of the
+    time per iteration to the population (see :func:`scaling_fit`), load
+    imbalance (see :func:`load_imbalance`) and the median cost, in core
+    seconds per particle per iteration.
+'''
+
+    rows = []
+    for filename in filenames:
+        for (index, (md, data)) in \
+                enumerate(pyhande.extract.extract_data(filename)):
+            if not isinstance(data, pd.DataFrame) or 'time' not in data:
+                continue
+            nprocs = int(md.get('MPI_procs', 1))
+            nthreads = int(md.get('OpenMP_threads', 1))
+            row = collections.OrderedDict([
+                ('filename', filename),
+                ('calc index', index),
+                ('calc_type', md.get('calc_type')),
+                ('input hash', input_hash(md, index)),
+                ('MPI_procs', nprocs),
+                ('OpenMP_threads', nthreads),
+                ('iterations', data['iterations'].iloc[-1]),
+                ('calculation_time', md.get('calculation_time', np.nan)),
+                ('wall_time', md.get('wall_time', np.nan)),
+            ])
+            rates = throughput(data, pop_key)
+            for col in ('spawn events/s', 'states/s', 'psips/s'):
+                row[col] = rates[col].median()
+            row['time exponent'] = scaling_fit(data, pop_key).exponent
+            row.update(load_imbalance(md))
+            row['cost'] = nprocs*nthreads/rates['psips/s'].median()
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def find_regressions(summary, reference=None, by='input hash', threshold=0.2,
+                     imbalance_threshold=1.5):
+    '''Flag calculations which performed unusually badly.
+
+Parameters
+----------
+summary : :class:`pandas.DataFrame`
+    summary of a set of calculations, as produced by
+    :func:`performance_summary`.
+reference : :class:`pandas.DataFrame`
+    summary of a set of reference calculations (e.g. with a previous version of
+    HANDE or on a known good set of nodes).  If not given, each calculation is
+    compared to the set of calculations in summary.
+by : string or list of strings
+    column(s) used to group comparable calculations.  Calculations are only
+    compared to reference calculations in the same group.  Set to None to
+    compare all calculations together.
+threshold : float
+    fractional increase in cost relative to the median cost of the reference
+    calculations above which a calculation is flagged as a regression.
+imbalance_threshold : float
+    ratio of the maximum to mean number of particles on a processor above
+    which a calculation is flagged as imbalanced.  The communication time
+    imbalance is not used as it is dominated by noise in short calculations.
+
+Returns
+-------
+flagged : :class:`pandas.DataFrame`
+    summary with additional columns: 'reference cost' (median cost of the
+    reference calculations in the same group), 'relative cost', 'regression'
+    and 'imbalanced'.  Calculations without any reference calculation in the
+    same group have a reference cost of NaN and are not flagged as
+    regressions.
+'''
+
+    if reference is None:
+        reference = summary
+    flagged = summary.copy()
+    if by is None:
+        flagged['reference cost'] = reference['cost'].median()
+    else:
+        if isinstance(by, str):
+            by = [by]
+        ref_cost = reference.groupby(by)['cost'].median()
+        ref_cost = ref_cost.rename('reference cost').reset_index()
+        flagged = flagged.merge(ref_cost, how='left', on=by)
+    flagged['relative cost'] = flagged['cost'] / flagged['reference cost']
+    flagged['regression'] = flagged['relative cost'] > 1 + threshold
+    flagged['imbalanced'] = flagged['psips imbalance'] > imbalance_threshold
+    return flagged
+
+
+def scaling(summary, by='input hash', time_key='calculation_time', weak=False):
+    '''Calculate the parallel scaling of sets of calculations.
+
+Parameters
+----------
+summary : :class:`pandas.DataFrame`
+    summary of a set of calculations, as produced by
+    :func:`performance_summary`.
+by : string or list of strings
+    column(s) used to group calculations into scaling studies.  Set to None to
+    treat all calculations as a single study.
+time_key : string
+    column containing the time taken by each calculation.
+weak : bool
+    if true, treat each study as a weak scaling study, in which the amount of
+    work (e.g. the target population) is proportional to the number of cores,
+    otherwise as a strong scaling study, in which the amount of work is fixed.
+    Note that the inputs of a weak scaling study differ, so grouping by the
+    input hash is not appropriate.
+
+Returns
+-------
+scaling : :class:`pandas.DataFrame`
+    for each calculation, the group(s) given by `by`, the number of MPI
+    processes, OpenMP threads and cores, the time taken, speedup, parallel
+    efficiency and the communication fraction (see :func:`load_imbalance`),
+    sorted by group and number of cores.  Each calculation is compared to the
+    calculation(s) in the same group using the fewest cores (taking the median
+    time if there is more than one).  For weak scaling, the (scaled) speedup
+    is the speedup in the time taken to do the same amount of work.
+'''
+
+    scaling = summary.copy()
+    if by is None:
+        by = ['group']
+        scaling['group'] = 0
+    elif isinstance(by, str):
+        by = [by]
+    scaling['cores'] = scaling['MPI_procs']*scaling['OpenMP_threads']
+    scaling = scaling.sort_values(by + ['cores', 'MPI_procs'])
+
+    ref_cores = scaling.groupby(by)['cores'].transform('min')
+    ref_time = scaling[time_key].where(scaling['cores'] == ref_cores)
+    ref_time = ref_time.groupby([scaling[key] for key in by]).transform('median')
+
+    relative_cores = scaling['cores'] / ref_cores
+    if weak:
+        scaling['efficiency'] = ref_time / scaling[time_key]
+        scaling['speedup'] = scaling['efficiency'] * relative_cores
+    else:
+        scaling['speedup'] = ref_time / scaling[time_key]
+        scaling['efficiency'] = scaling['speedup'] / relative_cores
+    columns = by + ['MPI_procs', 'OpenMP_threads', 'cores', time_key,
+                    'speedup', 'efficiency', 'comms fraction']
+    return scaling[columns].reset_index(drop=True)
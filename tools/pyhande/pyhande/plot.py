@@ -0,0 +1,98 @@
+'''Helpers for plotting long HANDE calculations.
+
+Calculations can produce millions of report loops, far more than can be
+resolved in a plot.  Passing every point to matplotlib is slow and produces very
+large vector (e.g. PDF) files, so data is first decimated to at most a few
+points per pixel.  The minimum and maximum within each bucket of x values are
+kept, so blooms, spikes and the envelope of the noise are preserved.
+'''
+
+import numpy as np
+
+
+def decimate(x, y, nbuckets=1000):
+    '''Decimate a data set, keeping the extrema within buckets of x values.
+
+Parameters
+----------
+x : :class:`numpy.ndarray` or :class:`pandas.Series`
+    x values, usually in ascending order (e.g. iterations).  If x is not in
+    ascending order (e.g. iterations in a DMQMC calculation with multiple beta
+    loops), buckets instead contain equal numbers of points.
+y : :class:`numpy.ndarray` or :class:`pandas.Series`
+    y values.
+nbuckets : int
+    number of buckets of equal width spanning the range of x (e.g. the width
+    of the plot in pixels).
+
+Returns
+-------
+x, y : :class:`numpy.ndarray`
+    the first and last points and the points with the minimum and maximum y
+    value within each bucket, in ascending order of x.  At most 2*nbuckets+2
+    points are returned, regardless of the size of the data set.  NaN values
+    of y are ignored (unless a bucket contains only NaN values).
+'''
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= 2*nbuckets + 2:
+        return (x, y)
+
+    # Assign each point to a bucket such that each bucket is a contiguous range
+    # of points.
+    width = (x[-1] - x[0])/float(nbuckets)
+    if width > 0 and (np.diff(x) >= 0).all():
+        bucket = np.minimum(((x - x[0])/width).astype(int), nbuckets-1)
+    else:
+        bucket = np.arange(len(x))*nbuckets//len(x)
+    starts = np.flatnonzero(np.diff(bucket)) + 1
+    starts = np.concatenate([[0], starts])
+    counts = np.diff(np.append(starts, len(x)))
+
+    keep = [[0, len(x)-1]]
+    for reduce_func in (np.fmin, np.fmax):
+        extrema = np.repeat(reduce_func.reduceat(y, starts), counts)
+        # First point in each bucket attaining the extremum.
+        (match,) = np.nonzero(y == extrema)
+        (_, first) = np.unique(bucket[match], return_index=True)
+        keep.append(match[first])
+    keep = np.unique(np.concatenate(keep))
+    return (x[keep], y[keep])
+
+
+def plot_decimated(x, y, fmt='-', ax=None, nbuckets=None, rasterized=False,
+                   **kwargs):
+    '''Plot a data set after decimation.
+
+Parameters
+----------
+x, y : :class:`numpy.ndarray` or :class:`pandas.Series`
+    data to plot.  See :func:`decimate`.
+fmt : string
+    matplotlib format string.
+ax : :class:`matplotlib.axes.Axes`
+    axes on which to plot.  Default: current axes.
+nbuckets : int
+    number of buckets used in :func:`decimate`.  Default: the width of the
+    axes in pixels.
+rasterized : bool
+    rasterise the line when saving to a vector format (e.g. PDF).  The axes
+    and labels are still saved as vector graphics.
+kwargs :
+    passed to :func:`matplotlib.axes.Axes.plot`.
+
+Returns
+-------
+lines : list of :class:`matplotlib.lines.Line2D`
+    plotted lines.
+'''
+
+    if ax is None:
+        # Only import matplotlib when required: it is slow to import.
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
+    if nbuckets is None:
+        nbuckets = max(int(ax.get_window_extent().width), 1)
+    (x, y) = decimate(x, y, nbuckets)
+    return ax.plot(x, y, fmt, rasterized=rasterized, **kwargs)
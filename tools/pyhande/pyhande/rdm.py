@@ -0,0 +1,307 @@
+'''Analysis of reduced density matrices from DMQMC and FCI calculations.'''
+
+import re
+import numpy as np
+import pandas as pd
+import pyblock
+
+
+def count_rdm_elements(filenames):
+    '''Count the number of RDM elements in a set of collated RDM files.
+
+Parameters
+----------
+filenames : list of strings
+    names of files containing collated stochastic RDMs, i.e. with each line
+    containing all estimates of a given element (as produced by
+    join_rdms.sh), preceded by the estimates of the trace.
+
+Returns
+-------
+nelements : int
+    Total number of RDM elements (excluding the trace) in all files.
+'''
+
+    nelements = 0
+    for filename in filenames:
+        with open(filename) as f:
+            for line in f:
+                if line.strip() and not line.startswith('Trace'):
+                    nelements += 1
+    return nelements
+
+
+def rdm_row_size(nelements):
+    '''Find the dimension of a symmetric RDM given its number of unique elements.
+
+Parameters
+----------
+nelements : int
+    number of elements on and above the diagonal of the RDM.
+
+Returns
+-------
+row_size : int
+    d, where a d-by-d RDM has nelements = d(d+1)/2 unique elements.
+'''
+
+    return int(-0.5 + 0.5*np.sqrt(1 + 8*nelements))
+
+
+def average_rdm(filenames, chunk_size=100000):
+    '''Average a set of stochastic RDMs and normalise by the averaged trace.
+
+The files are read in blocks of chunk_size elements, so the memory required is
+independent of the size of the RDM.  The statistics of each block are computed
+using whole-array operations.
+
+Parameters
+----------
+filenames : list of strings
+    names of files containing collated stochastic RDMs (see
+    :func:`count_rdm_elements`).  The trace must be given before any RDM
+    elements in the first file; a trace given in subsequent files replaces it
+    for the elements which follow.
+chunk_size : int
+    number of RDM elements to read at a time.
+
+Returns
+-------
+estimates : generator of :class:`pandas.DataFrame`
+    For each block of RDM elements, the mean and standard error of the
+    normalised RDM element, indexed by the element label.  The standard error
+    takes into account the covariance between each element and the trace and
+    is zero if all estimates of an element are identical.
+'''
+
+    trace = None
+    for filename in filenames:
+        reader = pd.read_csv(filename, sep=r'\s+', header=None, index_col=0,
+                             chunksize=chunk_size)
+        for block in reader:
+            is_trace = (block.index == 'Trace')
+            if is_trace.any():
+                trace = block.values[is_trace][-1].astype(float)
+                block = block[~is_trace]
+            if trace is None:
+                raise ValueError('Trace not found before RDM elements in %s.'
+                                 % (filename,))
+            if len(block):
+                yield rdm_block_statistics(block, trace)
+
+
+def rdm_block_statistics(block, trace):
+    '''Evaluate the normalised mean and error of a block of RDM elements.
+
+Parameters
+----------
+block : :class:`pandas.DataFrame`
+    Estimates of each RDM element, with one row per element and one column per
+    stochastic RDM.
+trace : :class:`numpy.ndarray`
+    Estimates of the trace of each stochastic RDM.
+
+Returns
+-------
+stats : :class:`pandas.DataFrame`
+    Mean and standard error of each normalised RDM element.
+'''
+
+    values = block.values.astype(float)
+    nsamples = len(trace)
+    sqrt_n = np.sqrt(nsamples)
+
+    elements = pd.DataFrame(index=block.index)
+    elements['mean'] = values.mean(axis=1)
+    elements['standard error'] = values.std(axis=1, ddof=1)/sqrt_n
+    tr = pd.DataFrame(index=block.index)
+    tr['mean'] = trace.mean()
+    tr['standard error'] = trace.std(ddof=1)/sqrt_n
+    cov = (values - elements['mean'].values[:,None]).dot(trace - trace.mean())
+    cov = pd.Series(cov/(nsamples-1), index=block.index)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats = pyblock.error.ratio(elements, tr, cov, nsamples)
+    stats.loc[elements['standard error'] == 0, 'standard error'] = 0.0
+    return stats[['mean', 'standard error']]
+
+
+def extract_rdm_eigenvalues(filenames):
+    '''Extract the RDM eigenvalues printed by a HANDE FCI calculation.
+
+Parameters
+----------
+filenames : list of strings
+    names of files containing HANDE FCI output.
+
+Returns
+-------
+eigvs : list of :class:`numpy.ndarray`
+    RDM eigenvalues from each table of RDM eigenvalues in the output files.
+'''
+
+    eigvs = []
+    for filename in filenames:
+        with open(filename) as f:
+            have_data = False
+            for line in f:
+                if not line.strip():
+                    have_data = False
+                elif have_data:
+                    eigvs[-1].append(float(line.split()[1]))
+                elif 'State' in line and 'RDM eigenvalue' in line:
+                    have_data = True
+                    eigvs.append([])
+    return [np.array(eigv) for eigv in eigvs]
+
+
+def von_neumann_entropy(eigv):
+    '''Calculate the von Neumann entropy, -\\sum_i \\lambda_i \\log_2 \\lambda_i.
+
+Parameters
+----------
+eigv : :class:`numpy.ndarray`
+    RDM eigenvalues.  The last axis contains the eigenvalues of a single RDM;
+    any other axes are used to evaluate the entropy of many RDMs at once.
+    Eigenvalues which are not positive (e.g. zero or negative due to
+    stochastic noise) do not contribute to the entropy.
+
+Returns
+-------
+entropy : float or :class:`numpy.ndarray`
+    von Neumann entropy of each RDM.
+'''
+
+    eigv = np.asarray(eigv, dtype=float)
+    positive = eigv > 0
+    log_eigv = np.log2(np.where(positive, eigv, 1))
+    return -np.where(positive, eigv*log_eigv, 0).sum(axis=-1)
+
+
+def renyi_2_entropy(eigv):
+    '''Calculate the Renyi-2 entropy, -\\log_2 \\sum_i \\lambda_i^2.
+
+Parameters
+----------
+eigv : :class:`numpy.ndarray`
+    RDM eigenvalues.  See :func:`von_neumann_entropy`.
+
+Returns
+-------
+entropy : float or :class:`numpy.ndarray`
+    Renyi-2 entropy of each RDM.
+'''
+
+    eigv = np.asarray(eigv, dtype=float)
+    return -np.log2((eigv**2).sum(axis=-1))
+
+
+def extract_entropy_estimates(filenames):
+    '''Extract the unnormalised entropy, concurrence and RDM traces from DMQMC output.
+
+Parameters
+----------
+filenames : list of strings
+    names of files containing HANDE DMQMC output.
+
+Returns
+-------
+estimates : dict of :class:`numpy.ndarray`
+    Estimates of the unnormalised von Neumann entropy ('entropy'), the
+    unnormalised concurrence ('concurrence') and the RDM trace ('trace') from
+    each beta loop.
+'''
+
+    labels = {
+        'Unnormalised von Neumann entropy': 'entropy',
+        'Unnormalised concurrence': 'concurrence',
+        'RDM trace': 'trace',
+    }
+    pattern = re.compile('^ # (%s) =\\s*(\\S+)' % ('|'.join(labels.keys())),
+                         re.MULTILINE)
+    estimates = dict((v, []) for v in labels.values())
+    for filename in filenames:
+        with open(filename) as f:
+            for (label, value) in pattern.findall(f.read()):
+                estimates[labels[label]].append(float(value))
+    return dict((k, np.array(v)) for (k, v) in estimates.items())
+
+
+def ratio_statistics(numerator, trace):
+    '''Calculate the mean and standard error of an estimate normalised by the trace.
+
+Parameters
+----------
+numerator : :class:`numpy.ndarray`
+    Estimates of the unnormalised quantity (e.g. the concurrence) from each
+    beta loop.
+trace : :class:`numpy.ndarray`
+    Estimates of the RDM trace from each beta loop.
+
+Returns
+-------
+mean : float
+    Mean of the normalised quantity.
+error : float
+    Standard error of the normalised quantity.
+'''
+
+    (num, tr, cov) = _sample_statistics(numerator, trace)
+    stats = pyblock.error.ratio(num, tr, cov, len(trace))
+    return (stats['mean'], stats['standard error'])
+
+
+def entropy_statistics(entropy, trace):
+    '''Calculate the mean and standard error of the normalised von Neumann entropy.
+
+The normalised entropy is S/Tr + \\log_2 Tr, where S is the von Neumann entropy
+of the unnormalised RDM and Tr is its trace.
+
+Parameters
+----------
+entropy : :class:`numpy.ndarray`
+    Estimates of the unnormalised von Neumann entropy from each beta loop.
+trace : :class:`numpy.ndarray`
+    Estimates of the RDM trace from each beta loop.
+
+Returns
+-------
+mean : float
+    Mean of the normalised von Neumann entropy.
+error : float
+    Standard error of the normalised von Neumann entropy.
+'''
+
+    (num, tr, cov) = _sample_statistics(entropy, trace)
+    mean = num['mean']/tr['mean']
+    rel_cov = cov/(len(trace)*num['mean']*tr['mean'])
+    error = np.sqrt((num['standard error']*mean/num['mean'])**2 +
+                    ((tr['standard error']/tr['mean'])**2)*(np.log(2)-mean)**2 -
+                    2*rel_cov*(mean-np.log(2))*mean)
+    return (mean + np.log2(tr['mean']), error)
+
+
+def _sample_statistics(numerator, trace):
+    '''Calculate the mean, standard error and covariance of two sets of estimates.
+
+Parameters
+----------
+numerator, trace : :class:`numpy.ndarray`
+    Estimates from each beta loop.
+
+Returns
+-------
+num, tr : :class:`pandas.Series`
+    Mean and standard error of numerator and trace.
+cov : float
+    Covariance between numerator and trace.
+'''
+
+    (numerator, trace) = (np.asarray(numerator), np.asarray(trace))
+    sqrt_n = np.sqrt(len(trace))
+    num = pd.Series([numerator.mean(), numerator.std(ddof=1)/sqrt_n],
+                    index=['mean', 'standard error'])
+    tr = pd.Series([trace.mean(), trace.std(ddof=1)/sqrt_n],
+                   index=['mean', 'standard error'])
+    cov = np.cov(numerator, trace)[0,1]
+    return (num, tr, cov)
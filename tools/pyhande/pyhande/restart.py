@@ -0,0 +1,686 @@
+'''Read the psip distribution and state from HANDE HDF5 restart files.
+
+A restart set consists of one file per processor, named HANDE.RS.X.pY.H5 where
+X is the restart index and Y the processor.  The layout of each file is
+described in restart_hdf5.F90.  The psip lists can be many times larger than the
+available memory, so they are read one chunk at a time and, where possible,
+directly from a memory-mapped view of the file.
+
+.. note::
+
+    Reading restart files requires h5py.
+'''
+
+import collections
+import glob
+import os
+import re
+import numpy as np
+import pandas as pd
+
+PsipChunk = collections.namedtuple('PsipChunk',
+                                   'processor start determinants populations data')
+PsipChunk.__doc__ = '''A contiguous block of the psip list stored on one processor.
+
+Attributes
+----------
+processor : int
+    processor which held the psips when the restart file was written.
+start : int
+    index of the first psip of the chunk within the psip list of the processor.
+determinants : :class:`numpy.ndarray`
+    bit strings of the determinants (or excitors), with shape
+    (nstates, tot_string_len).  Each element holds i0_length bits.
+populations : :class:`numpy.ndarray`
+    populations of each determinant in each space, rescaled by the population
+    scale factor (i.e. as printed by HANDE).
+data : :class:`numpy.ndarray`
+    additional data (e.g. diagonal Hamiltonian matrix element) of each
+    determinant.
+'''
+
+# Name of the dataset holding the psips spawned in the final iteration of a
+# calculation using non-blocking communication (dspawn in restart_hdf5.F90).
+_SPAWNED = 'received_list'
+
+# Number of set bits in each possible byte.
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Calculation type of CCMC calculations (see calc.F90).
+_CCMC_CALC = 2**9
+
+# Number of psips in each HDF5 chunk of the psip datasets in new restart files.
+_H5_CHUNK = 4096
+
+
+def restart_files(directory='.', index=None):
+    '''Find the files in a restart set.
+
+Parameters
+----------
+directory : string
+    directory containing the restart files.
+index : int
+    restart index of the set.  If not given, the set with the highest index
+    (i.e. usually the most recently written) is used.
+
+Returns
+-------
+filenames : list of strings
+    names of the restart files in the set, ordered by processor.
+'''
+
+    pattern = re.compile(r'HANDE\.RS\.(\d+)\.p(\d+)\.H5$')
+    files = {}
+    for filename in glob.glob(os.path.join(directory, 'HANDE.RS.*.p*.H5')):
+        match = pattern.search(filename)
+        if match:
+            (ind, proc) = (int(match.group(1)), int(match.group(2)))
+            files.setdefault(ind, []).append((proc, filename))
+    if not files:
+        raise IOError('No restart files found in %s.' % (directory,))
+    if index is None:
+        index = max(files)
+    elif index not in files:
+        raise IOError('Restart set %i not found in %s.' % (index, directory))
+    return [filename for (proc, filename) in sorted(files[index])]
+
+
+def read_metadata(filename):
+    '''Read the metadata and calculation state from a restart file.
+
+Parameters
+----------
+filename : string
+    name of a HANDE restart file.
+
+Returns
+-------
+metadata : dict
+    metadata (e.g. 'nprocs', 'i0_length', 'uuid'), basis information (e.g.
+    'nbasis'), QMC state (e.g. 'shift', 'ncycles') and reference information
+    (e.g. 'reference determinant') stored in the restart file, keyed by the
+    dataset name.  'nstates' holds the number of psips stored in the file and
+    'population scale factor' is 1 for restart files which do not store it.
+'''
+
+    metadata = {'population scale factor': 1}
+    with _open(filename) as h5f:
+        for group in ('metadata', 'basis', 'qmc/state', 'qmc/reference',
+                      'qmc/psips'):
+            if group not in h5f:
+                continue
+            for (name, dset) in h5f[group].items():
+                if name in ('determinants', 'populations', 'data', _SPAWNED,
+                            'processor map') or not hasattr(dset, 'shape'):
+                    continue
+                value = dset[()]
+                if isinstance(value, bytes):
+                    value = value.decode()
+                elif dset.shape == (1,) and name != 'reference determinant' \
+                        and name != 'Hilbert space reference determinant':
+                    value = value[0]
+                metadata[name] = value
+        if 'qmc/psips/determinants' in h5f:
+            metadata['nstates'] = h5f['qmc/psips/determinants'].shape[0]
+        else:
+            metadata['nstates'] = 0
+    return metadata
+
+
+def psip_chunks(filenames, chunk_size=100000, raw=False):
+    '''Iterate over the psips in a restart set.
+
+Parameters
+----------
+filenames : list of strings
+    names of the restart files in the set (see :func:`restart_files`).
+chunk_size : int
+    maximum number of psips in each chunk.  This sets the memory required.
+raw : bool
+    if true, return the populations as stored in the restart files (i.e.
+    encoded as fixed-precision integers) rather than rescaling them.
+
+Returns
+-------
+chunks : generator of :class:`PsipChunk`
+    psips in each restart file in turn.  Chunks do not span files.
+'''
+
+    for filename in filenames:
+        with _open(filename) as h5f:
+            proc = _processor(filename)
+            if 'qmc/psips/determinants' not in h5f:
+                continue
+            psips = h5f['qmc/psips']
+            scale = 1
+            if 'population scale factor' in psips and not raw:
+                scale = psips['population scale factor'][0]
+            dets = _dataset_view(filename, psips['determinants'])
+            pops = _dataset_view(filename, psips['populations'])
+            dat = _dataset_view(filename, psips['data'])
+            for start in range(0, len(dets), chunk_size):
+                end = start + chunk_size
+                if raw:
+                    chunk_pops = np.array(pops[start:end])
+                else:
+                    chunk_pops = np.array(pops[start:end], dtype=float)/scale
+                yield PsipChunk(proc, start, np.array(dets[start:end]),
+                                chunk_pops, np.array(dat[start:end]))
+
+
+def decode_determinants(determinants, i0_length, nbasis):
+    '''Convert determinant bit strings into orbital occupations.
+
+Parameters
+----------
+determinants : :class:`numpy.ndarray`
+    bit strings, with shape (nstates, string_len) or (string_len,).  Any
+    trailing elements beyond those required to hold nbasis orbitals (e.g. the
+    information string used by some calculations) are ignored.
+i0_length : int
+    number of bits stored in each element of a bit string.
+nbasis : int
+    number of spin-orbitals (or sites) in the basis.
+
+Returns
+-------
+occupations : :class:`numpy.ndarray`
+    boolean array with shape (nstates, nbasis) (or (nbasis,)), where the i-th
+    entry is true if the (i+1)-th basis function (using HANDE's 1-based
+    indexing) is occupied.
+'''
+
+    determinants = np.asarray(determinants)
+    string_len = _string_len(nbasis, i0_length)
+    bits = np.arange(i0_length, dtype=determinants.dtype)
+    occ = (determinants[..., :string_len, None] >> bits) & 1
+    occ = occ.reshape(determinants.shape[:-1] + (string_len*i0_length,))
+    return occ[..., :nbasis].astype(bool)
+
+
+def excitation_levels(determinants, reference, i0_length, nbasis):
+    '''Find the excitation level of a set of determinants relative to a reference.
+
+Parameters
+----------
+determinants : :class:`numpy.ndarray`
+    bit strings, with shape (nstates, string_len).
+reference : :class:`numpy.ndarray`
+    bit string of the reference determinant.
+i0_length, nbasis : int
+    see :func:`decode_determinants`.
+
+Returns
+-------
+levels : :class:`numpy.ndarray`
+    number of electrons excited (or spins flipped) relative to the reference
+    in each determinant.
+'''
+
+    string_len = _string_len(nbasis, i0_length)
+    determinants = np.asarray(determinants)[:, :string_len]
+    reference = np.asarray(reference, dtype=determinants.dtype)[:string_len]
+    diff = np.ascontiguousarray(determinants ^ reference)
+    nbits = _POPCOUNT[diff.view(np.uint8)].reshape(len(diff), -1)
+    return nbits.sum(axis=1, dtype=int) // 2
+
+
+def population_by_excitation(filenames, chunk_size=100000):
+    '''Sum the population on each excitation level of a restart set.
+
+Parameters
+----------
+filenames : list of strings
+    names of the restart files in the set (see :func:`restart_files`).
+chunk_size : int
+    number of psips to read at a time.
+
+Returns
+-------
+levels : :class:`pandas.DataFrame`
+    number of occupied determinants ('determinants') and total absolute
+    population ('population', or 'population i' for the i-th space if
+    multiple spaces are present) on each excitation level relative to the
+    reference determinant.
+'''
+
+    (reference, i0_length, nbasis) = _reference(filenames[0])
+    ndets = np.zeros(0, dtype=int)
+    pops = None
+    for chunk in psip_chunks(filenames, chunk_size):
+        levels = excitation_levels(chunk.determinants, reference, i0_length,
+                                   nbasis)
+        nlevels = max(len(ndets), levels.max()+1 if len(levels) else 0)
+        if pops is None:
+            pops = np.zeros((nlevels, chunk.populations.shape[1]))
+        ndets = _pad(ndets, nlevels)
+        pops = _pad(pops, nlevels)
+        ndets += np.bincount(levels, minlength=nlevels)
+        for space in range(pops.shape[1]):
+            pops[:,space] += np.bincount(levels, minlength=nlevels,
+                                     weights=abs(chunk.populations[:,space]))
+    if pops is None:
+        pops = np.zeros((0, 1))
+    levels = pd.DataFrame({'determinants': ndets})
+    levels.index.name = 'excitation level'
+    for space in range(pops.shape[1]):
+        levels[_population_label(space, pops.shape[1])] = pops[:,space]
+    return levels
+
+
+def top_determinants(filenames, n=10, space=0, chunk_size=100000):
+    '''Find the most highly populated determinants in a restart set.
+
+Parameters
+----------
+filenames : list of strings
+    names of the restart files in the set (see :func:`restart_files`).
+n : int
+    number of determinants to find.
+space : int
+    index of the space (e.g. replica or real/imaginary component) used to
+    rank the determinants by absolute population.
+chunk_size : int
+    number of psips to read at a time.
+
+Returns
+-------
+top : :class:`pandas.DataFrame`
+    processor, populations, excitation level and occupied basis functions
+    (1-based, as in HANDE output) of the n determinants with the largest
+    absolute population, in descending order of absolute population.
+'''
+
+    (reference, i0_length, nbasis) = _reference(filenames[0])
+    best = None
+    for chunk in psip_chunks(filenames, chunk_size):
+        weight = abs(chunk.populations[:,space])
+        if len(weight) > n:
+            keep = np.argpartition(-weight, n-1)[:n]
+        else:
+            keep = np.arange(len(weight))
+        candidate = (weight[keep], np.full(len(keep), chunk.processor),
+                     chunk.determinants[keep], chunk.populations[keep])
+        if best is not None:
+            candidate = tuple(np.concatenate((b, c))
+                              for (b, c) in zip(best, candidate))
+        if len(candidate[0]) > n:
+            keep = np.argpartition(-candidate[0], n-1)[:n]
+            candidate = tuple(c[keep] for c in candidate)
+        best = candidate
+    if best is None:
+        return pd.DataFrame()
+    order = np.argsort(-best[0], kind='mergesort')
+    (weight, procs, dets, pops) = (b[order] for b in best)
+    top = pd.DataFrame({'processor': procs})
+    for ispace in range(pops.shape[1]):
+        top[_population_label(ispace, pops.shape[1])] = pops[:,ispace]
+    top['excitation level'] = excitation_levels(dets, reference, i0_length,
+                                                nbasis)
+    occ = decode_determinants(dets, i0_length, nbasis)
+    top['occupied'] = [tuple(np.flatnonzero(o)+1) for o in occ]
+    return top
+
+
+def load_histogram(filenames, chunk_size=100000):
+    '''Find the distribution of psips over the processors.
+
+Parameters
+----------
+filenames : list of strings
+    names of the restart files in the set (see :func:`restart_files`).
+chunk_size : int
+    number of psips to read at a time.
+
+Returns
+-------
+load : :class:`pandas.DataFrame`
+    number of occupied determinants ('determinants'), total absolute
+    population (summed over all spaces; 'population') and number of entries in
+    the processor map ('slots') assigned to each processor.
+'''
+
+    with _open(filenames[0]) as h5f:
+        nprocs = max(len(filenames), h5f['metadata/nprocs'][()])
+        slots = np.zeros(nprocs, dtype=int)
+        if 'qmc/psips/processor map' in h5f:
+            slots = np.bincount(h5f['qmc/psips/processor map'][()],
+                                minlength=nprocs)
+    ndets = np.zeros(len(slots), dtype=int)
+    pops = np.zeros(len(slots))
+    for chunk in psip_chunks(filenames, chunk_size):
+        ndets[chunk.processor] += len(chunk.populations)
+        pops[chunk.processor] += abs(chunk.populations).sum()
+    load = pd.DataFrame({'determinants': ndets, 'population': pops,
+                         'slots': slots},
+                        columns=['determinants', 'population', 'slots'])
+    load.index.name = 'processor'
+    return load
+
+
+def murmurhash2(keys, seed):
+    '''Hash a set of keys using the MurmurHash2 algorithm.
+
+This gives identical results to the MurmurHash2 implementation used in HANDE on a
+little-endian machine.
+
+Parameters
+----------
+keys : :class:`numpy.ndarray`
+    array of shape (nkeys, nwords), where each row is a key consisting of
+    nwords 32-bit words.
+seed : int
+    seed for the hash function.
+
+Returns
+-------
+hashes : :class:`numpy.ndarray`
+    unsigned 32-bit hash of each key.
+'''
+
+    m = np.uint32(0x5bd1e995)
+    keys = np.asarray(keys, dtype=np.uint32)
+    (nkeys, nwords) = keys.shape
+    h = np.empty(nkeys, dtype=np.uint32)
+    h.fill((int(seed) ^ (4*nwords)) & 0xffffffff)
+    for iword in range(nwords):
+        k = keys[:,iword] * m
+        k ^= k >> np.uint32(24)
+        k *= m
+        h *= m
+        h ^= k
+    h ^= h >> np.uint32(13)
+    h *= m
+    h ^= h >> np.uint32(15)
+    return h
+
+
+def assign_processors(determinants, nbasis, nprocs, hash_seed=7, hash_shift=0,
+                      move_freq=0):
+    '''Find the processor to which HANDE assigns each determinant.
+
+The assignment is that used in HANDE's assign_particle_processor with one
+load-balancing slot per processor, as used when HANDE redistributes restart
+files.
+
+Parameters
+----------
+determinants : :class:`numpy.ndarray`
+    bit strings, with shape (nstates, tot_string_len).
+nbasis : int
+    number of basis functions.  Only the (multiple of 32) bits required to hold
+    nbasis bits are hashed.
+nprocs : int
+    number of processors.
+hash_seed : int
+    seed for the hash function.
+hash_shift : int
+    shift added to the hash to vary the assignment between iterations.  Only
+    used in CCMC, where it is the number of Monte Carlo cycles performed.
+move_freq : int
+    log2 of the number of iterations over which the processor of each
+    determinant changes at most once.  Ignored if hash_shift is 0.
+
+Returns
+-------
+procs : :class:`numpy.ndarray`
+    processor index of each determinant.
+'''
+
+    determinants = np.asarray(determinants)
+    nwords = (nbasis + 31) // 32
+    itemsize = determinants.dtype.itemsize
+    little = determinants.dtype.newbyteorder('<')
+    words = np.ascontiguousarray(determinants, dtype=little).view(np.uint8)
+    words = words.reshape(len(determinants), -1)[:, :4*nwords]
+    words = np.ascontiguousarray(words).view('<u4').astype(np.uint32)
+    hashes = murmurhash2(words, hash_seed).view(np.int32).astype(np.int64)
+    if hash_shift != 0:
+        # offset = [hash(label) + shift] >> move_freq (using a logical shift of
+        # a 32-bit integer), which is xor-ed with the first element of the
+        # label before rehashing.
+        offset = ((hashes + hash_shift) & 0xffffffff) >> move_freq
+        words[:,0] ^= offset.astype(np.uint32)
+        if move_freq == 0 and itemsize == 8 and nwords > 1:
+            # Sign extension of a negative offset to a 64-bit integer.
+            words[:,1] ^= np.where(offset >= 2**31, 0xffffffff,
+                                   0).astype(np.uint32)
+        hashes = murmurhash2(words, hash_seed).view(np.int32).astype(np.int64)
+    return hashes % nprocs
+
+
+def redistribute(filenames, nprocs, directory='.', write_id=None,
+                 chunk_size=100000, processes=1):
+    '''Redistribute a restart set over a different number of processors.
+
+This performs the same task as HANDE does when restarting on a different
+number of processors, but without requiring the (potentially large and
+expensive) calculation to do so at start-up.  The psips are streamed from the
+original restart files and appended to the new restart files a chunk at a time.
+As in HANDE, each new restart file uses a single load-balancing slot per
+processor and is marked such that the psip list is resorted when read in.
+
+Parameters
+----------
+filenames : list of strings
+    names of the restart files in the original set (see
+    :func:`restart_files`).
+nprocs : int
+    number of processors to distribute the psips over.
+directory : string
+    directory in which to write the new restart files.
+write_id : int
+    restart index of the new restart set.  If not given, the lowest index
+    greater than that of any restart file in directory is used.
+chunk_size : int
+    number of psips to read at a time.
+processes : int
+    number of processes to use.  Each process writes a subset of the new
+    restart files.
+
+Returns
+-------
+new_filenames : list of strings
+    names of the new restart files, ordered by processor.
+'''
+
+    if nprocs < 1:
+        raise ValueError('Number of processors must be positive.')
+    # Check the original set before creating any new files.
+    metadata = read_metadata(filenames[0])
+    if metadata['calc type'] & _CCMC_CALC:
+        hash_shift = int(metadata['ncycles'])
+    else:
+        hash_shift = 0
+    hash_seed = int(metadata.get('hash_seed', 7))
+    move_freq = int(metadata.get('move_freq', 0))
+    nbasis = int(_reference(filenames[0])[2])
+    for filename in filenames:
+        with _open(filename) as h5f:
+            if 'qmc/psips/' + _SPAWNED in h5f:
+                raise ValueError('Redistribution of restart files from '
+                                 'calculations using non-blocking '
+                                 'communication is not implemented.')
+
+    if write_id is None:
+        try:
+            existing = restart_files(directory)
+            index = re.search(r'HANDE\.RS\.(\d+)\.', existing[0]).group(1)
+            write_id = int(index) + 1
+        except IOError:
+            write_id = 0
+    new_filenames = [os.path.join(directory, 'HANDE.RS.%i.p%i.H5' % (write_id, i))
+                     for i in range(nprocs)]
+    original = set(os.path.abspath(f) for f in filenames)
+    if any(os.path.abspath(f) in original for f in new_filenames):
+        raise ValueError('Cannot write redistributed restart files to the '
+                         'files from which they are read.')
+
+    processes = max(1, min(processes, nprocs))
+    bounds = [nprocs*i // processes for i in range(processes+1)]
+    tasks = [(filenames, new_filenames, nprocs, bounds[i], bounds[i+1],
+              chunk_size, (nbasis, hash_seed, hash_shift, move_freq))
+             for i in range(processes)]
+    try:
+        if processes == 1:
+            for task in tasks:
+                _redistribute_targets(task)
+        else:
+            import multiprocessing
+            pool = multiprocessing.Pool(processes)
+            try:
+                pool.map(_redistribute_targets, tasks)
+            finally:
+                pool.close()
+                pool.join()
+    except Exception:
+        # Do not leave an incomplete restart set behind.
+        for filename in new_filenames:
+            if os.path.exists(filename):
+                os.remove(filename)
+        raise
+    return new_filenames
+
+
+def _redistribute_targets(args):
+    '''Write the psips assigned to a contiguous subset of processors.
+
+Parameters
+----------
+args : tuple
+    (filenames, new_filenames, nprocs, start, end, chunk_size, hashing),
+    where the new restart files for processors start to end-1 are written and
+    hashing is (nbasis, hash_seed, hash_shift, move_freq).  See
+    :func:`redistribute` and :func:`assign_processors`.
+'''
+
+    (filenames, new_filenames, nprocs, start, end, chunk_size, hashing) = args
+    (nbasis, hash_seed, hash_shift, move_freq) = hashing
+
+    new_files = [_new_restart_file(filenames[0], new_filenames[i], nprocs)
+                 for i in range(start, end)]
+    try:
+        for chunk in psip_chunks(filenames, chunk_size, raw=True):
+            procs = assign_processors(chunk.determinants, nbasis, nprocs,
+                                      hash_seed, hash_shift, move_freq)
+            # Group the psips in the chunk by processor.
+            order = np.argsort(procs, kind='mergesort')
+            offsets = np.searchsorted(procs[order], np.arange(start, end+1))
+            for (i, h5f) in enumerate(new_files):
+                select = order[offsets[i]:offsets[i+1]]
+                if len(select):
+                    psips = h5f['qmc/psips']
+                    _append(psips['determinants'], chunk.determinants[select])
+                    _append(psips['populations'], chunk.populations[select])
+                    _append(psips['data'], chunk.data[select])
+    finally:
+        for h5f in new_files:
+            h5f.close()
+
+
+def _new_restart_file(template, filename, nprocs):
+    '''Create a restart file with no psips from an existing restart file.
+
+The metadata, basis, RNG, QMC state and reference information are copied from
+the template, the processor count updated and empty (extensible) psip datasets
+created.
+
+Returns
+-------
+h5f : :class:`h5py.File`
+    new restart file, opened for writing.
+'''
+
+    import h5py
+    h5f = h5py.File(filename, 'w')
+    with _open(template) as orig:
+        for group in ('metadata', 'basis', 'rng'):
+            if group in orig:
+                orig.copy(group, h5f)
+        h5f['metadata/nprocs'][()] = nprocs
+        qmc = h5f.create_group('qmc')
+        for group in ('state', 'reference'):
+            if group in orig['qmc']:
+                orig.copy('qmc/' + group, qmc)
+        psips = qmc.create_group('psips')
+        orig_psips = orig['qmc/psips']
+        psips['processor map'] = np.arange(nprocs, dtype=np.int32)
+        psips['psip_resort'] = np.int32(1)
+        for name in ('total population', 'population scale factor'):
+            if name in orig_psips:
+                orig_psips.copy(name, psips)
+        if 'population scale factor' not in psips:
+            psips['population scale factor'] = np.array([1], dtype=np.int64)
+        for name in ('determinants', 'populations', 'data'):
+            dset = orig_psips[name]
+            psips.create_dataset(name, shape=(0,) + dset.shape[1:],
+                                 maxshape=(None,) + dset.shape[1:],
+                                 chunks=(_H5_CHUNK,) + dset.shape[1:],
+                                 dtype=dset.dtype)
+    return h5f
+
+
+def _append(dset, values):
+    '''Append values along the first axis of an extensible HDF5 dataset.'''
+    n = len(dset)
+    dset.resize(n + len(values), axis=0)
+    dset[n:] = values
+
+
+def _open(filename):
+    '''Open a HDF5 file for reading.'''
+    import h5py
+    return h5py.File(filename, 'r')
+
+
+def _processor(filename):
+    '''Get the processor index from the name of a restart file.'''
+    match = re.search(r'\.p(\d+)\.H5$', filename)
+    return int(match.group(1)) if match else 0
+
+
+def _dataset_view(filename, dset):
+    '''Get a memory-mapped view of a HDF5 dataset.
+
+If the dataset is not stored contiguously (e.g. it is chunked or compressed),
+the dataset itself is returned and is read from the file when sliced.
+'''
+    offset = dset.id.get_offset()
+    if offset is None or dset.chunks is not None or dset.size == 0:
+        return dset
+    return np.memmap(filename, mode='r', dtype=dset.dtype, offset=offset,
+                     shape=dset.shape)
+
+
+def _reference(filename):
+    '''Get the reference determinant and bit string parameters of a restart set.'''
+    metadata = read_metadata(filename)
+    reference = metadata['reference determinant']
+    i0_length = metadata['i0_length']
+    # Version 1 restart files do not store the basis size, so assume every bit
+    # of the reference bit string corresponds to a basis function.
+    nbasis = metadata.get('nbasis', len(reference)*i0_length)
+    return (reference, i0_length, nbasis)
+
+
+def _string_len(nbasis, i0_length):
+    '''Number of elements required to store a bit string of nbasis bits.'''
+    return (nbasis + i0_length - 1) // i0_length
+
+
+def _pad(array, length):
+    '''Pad the first axis of an array with zeros to the given length.'''
+    if len(array) >= length:
+        return array
+    padding = np.zeros((length - len(array),) + array.shape[1:],
+                       dtype=array.dtype)
+    return np.concatenate((array, padding))
+
+
+def _population_label(space, nspaces):
+    '''Label of the population of a given space.'''
+    if nspaces == 1:
+        return 'population'
+    else:
+        return 'population %i' % (space,)
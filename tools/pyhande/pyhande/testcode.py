@@ -1,8 +1,35 @@
-'''Functions for obtaining data subsets to be tested by testcode'''
+'''Functions for obtaining data subsets to be tested by testcode
 
+Extracting data from benchmark outputs, which never change, dominates the
+overhead of running the test suite, so the data extracted from benchmark
+outputs can be cached.  Caching is enabled by setting the
+PYHANDE_TESTCODE_CACHE environment variable to the directory in which to store
+the cache.  The cache can be filled in parallel in advance using
+:func:`extract_test_data_sets` (or tools/tests/extract_test_data.py --prime).
+Writing to the cache is best-effort: if the cache cannot be written, data is
+extracted as if caching were disabled.  Cache entries are keyed by the
+contents of the output file and the source of the parser (pyhande.extract,
+pyhande.legacy and this module), so changes to the parser invalidate the
+cache.  Changes elsewhere (e.g. in pandas) which alter the extracted data are
+only detected via the pandas version.  Remove the cache directory if in doubt.
+'''
+
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import pandas as pd
 import pyhande.extract
+import pyhande.legacy
+
+# Increment if the data selected for testing changes to invalidate the cache.
+_CACHE_VERSION = 1
 
-def extract_test_data(fname, underscore=True):
+# Hash of the source used to extract test data (see _source_hash).
+_SOURCE_HASH = None
+
+def extract_test_data(fname, underscore=True, cache_dir=None):
     '''Extract data from a HANDE file and select a desired subset to be tested.
 
 Parameters
@@ -11,6 +38,11 @@ fname : string
     filename containing HANDE calculation output.
 underscore : boolean
     if true, replace spaces in the key names with underscores.
+cache_dir : string
+    directory in which extracted data from benchmark outputs (i.e. files whose
+    name starts with 'benchmark') is cached.  Default: the value of the
+    PYHANDE_TESTCODE_CACHE environment variable, if set.  Caching is disabled
+    if no directory is given.
 
 Returns
 -------
@@ -21,6 +53,90 @@ output : dict
     calculations and all data in other cases.
 '''
 
+    if not os.path.basename(fname).startswith('benchmark'):
+        return _select_test_data(fname, underscore)
+    cache_file = _cache_filename(fname, underscore, cache_dir)
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            # Unreadable entry: extract the data again.
+            pass
+    output = _select_test_data(fname, underscore)
+    if cache_file:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            try:
+                os.makedirs(os.path.dirname(cache_file))
+            except OSError:
+                # Created by another process in the meantime (or cannot be
+                # created, in which case writing the entry fails below).
+                pass
+        # Write atomically so concurrent tests never read a partial entry.
+        tmp_file = '%s.%i' % (cache_file, os.getpid())
+        try:
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(output, f, protocol=2)
+            os.rename(tmp_file, cache_file)
+        except (IOError, OSError):
+            # The cache is only an optimisation.
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    return output
+
+def _cache_filename(fname, underscore, cache_dir=None):
+    '''Get the name of the cache file for the test data of a HANDE output.
+
+Parameters
+----------
+fname : string
+    filename containing HANDE calculation output.
+underscore : boolean
+    see :func:`extract_test_data`.
+cache_dir : string
+    see :func:`extract_test_data`.
+
+Returns
+-------
+cache_file : string
+    name of the cache file, or None if caching is disabled.
+'''
+
+    if cache_dir is None:
+        cache_dir = os.environ.get('PYHANDE_TESTCODE_CACHE')
+    if not cache_dir:
+        return None
+    key = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        key.update(f.read())
+    key.update(('%s %s %s %s' % (_CACHE_VERSION, underscore, pd.__version__,
+                                 _source_hash())).encode('utf-8'))
+    return os.path.join(cache_dir, key.hexdigest() + '.pkl')
+
+def _source_hash():
+    '''Hash the source of the modules used to extract test data.
+
+Returns
+-------
+source_hash : string
+    hash of the source of pyhande.extract, pyhande.legacy and this module.
+'''
+
+    global _SOURCE_HASH
+    if _SOURCE_HASH is None:
+        key = hashlib.sha1()
+        for module in (pyhande.extract, pyhande.legacy, sys.modules[__name__]):
+            key.update(inspect.getsource(module).encode('utf-8'))
+        _SOURCE_HASH = key.hexdigest()
+    return _SOURCE_HASH
+
+def _select_test_data(fname, underscore=True):
+    '''Extract data from a HANDE file and select a desired subset to be tested.
+
+See :func:`extract_test_data`, which caches the data extracted by this
+function.
+'''
+
     hande_out = pyhande.extract.extract_data(fname)
 
     output = {}
@@ -59,6 +175,64 @@ output : dict
 
     return output
 
+def extract_test_data_sets(fnames, underscore=True, cache_dir=None,
+                           processes=None, ignore_errors=False):
+    '''Extract test data from multiple HANDE files in parallel.
+
+Parameters
+----------
+fnames : list of strings
+    filenames containing HANDE calculation output.
+underscore, cache_dir :
+    see :func:`extract_test_data`.
+processes : int
+    number of processes to use.  Default: one process per CPU.
+ignore_errors : boolean
+    if true, return None for files from which data cannot be extracted rather
+    than raising an exception.
+
+Returns
+-------
+output : list of dict
+    output of :func:`extract_test_data` for each file.
+'''
+
+    args = [(fname, underscore, cache_dir, ignore_errors) for fname in fnames]
+    if processes == 1 or len(args) < 2:
+        output = [_extract_test_data(arg) for arg in args]
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+        try:
+            output = pool.map(_extract_test_data, args)
+        finally:
+            pool.close()
+            pool.join()
+    return output
+
+def _extract_test_data(args):
+    '''Wrapper around :func:`extract_test_data` for use with multiprocessing.
+
+Parameters
+----------
+args : tuple
+    (fname, underscore, cache_dir, ignore_errors).  See
+    :func:`extract_test_data_sets`.
+
+Returns
+-------
+output : dict
+    see :func:`extract_test_data`.
+'''
+
+    (fname, underscore, cache_dir, ignore_errors) = args
+    try:
+        return extract_test_data(fname, underscore, cache_dir)
+    except Exception:
+        if ignore_errors:
+            return None
+        raise
+
 def testcode_data(fname):
     '''Extract test data in the format required by testcode2.
 
@@ -72,7 +246,8 @@ Returns
 output : dict
     A dictionary consisting of key, value pairs of a data name and list of
     associated values.   This is essentially the output from
-    ``extract_test_data`` combined into to a single dictionary.
+    ``extract_test_data`` combined into to a single dictionary.  Data from
+    benchmark outputs is cached (see :func:`extract_test_data`).
 
 See Also
 --------
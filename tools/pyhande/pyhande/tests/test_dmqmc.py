@@ -0,0 +1,68 @@
+import numpy
+import pandas as pd
+import unittest
+
+import glob
+import os
+import sys
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(_this_dir, '../../'))
+sys.path.append(os.path.join(_this_dir, '../../../pyblock'))
+import pyhande.dmqmc
+import pyhande.extract
+
+_test_suite = os.path.join(_this_dir, '../../../../test_suite')
+
+class AnalyseDataStreamTests(unittest.TestCase):
+    def setUp(self):
+        # Calculations in this output have data tables with different columns
+        # (with and without the excitation distribution).
+        self.files = glob.glob(os.path.join(_test_suite, 'dmqmc', 'np1',
+                                            'ueg_n7_rs1_ec5', 'benchmark.*'))
+        if not self.files:
+            self.skipTest('test_suite not found.')
+    def test_stream_matches_analyse_data(self):
+        for (shift, trace) in [(False, False), (True, True)]:
+            hande_out = pyhande.extract.extract_data_sets(self.files)
+            results = pyhande.dmqmc.analyse_data(hande_out, shift=shift,
+                                                 trace=trace)[1]
+            stream = pyhande.dmqmc.analyse_data_stream(self.files, shift=shift,
+                                                       trace=trace)[1]
+            self.assertEqual(list(results.columns), list(stream.columns))
+            numpy.testing.assert_allclose(stream.values, results.values)
+
+class MergeMomentsTests(unittest.TestCase):
+    def setUp(self):
+        rand = numpy.random.RandomState(seed=7)
+        self.beta = numpy.arange(4)*0.1
+        self.data_a = pd.DataFrame(rand.rand(8, 2), columns=['A', 'B'])
+        self.data_b = pd.DataFrame(rand.rand(4, 3), columns=['A', 'B', 'C'])
+    def moments(self, data):
+        (beta, cube) = pyhande.dmqmc.beta_loop_cube(data,
+                numpy.tile(self.beta, len(data)//len(self.beta)))
+        columns = list(data.columns)
+        pairs = [(col, col) for col in columns] + [('A', 'B')]
+        return pyhande.dmqmc.beta_loop_moments(cube, beta, columns, pairs)
+    def test_different_columns(self):
+        merged = pyhande.dmqmc.merge_moments(self.moments(self.data_a),
+                                             self.moments(self.data_b))
+        combined = self.moments(pd.concat([self.data_a, self.data_b],
+                                          ignore_index=True))
+        self.assertEqual(merged.columns, combined.columns)
+        self.assertEqual(sorted(merged.pairs), sorted(combined.pairs))
+        numpy.testing.assert_array_equal(merged.count, combined.count)
+        numpy.testing.assert_allclose(merged.mean, combined.mean)
+        for pair in merged.pairs:
+            numpy.testing.assert_allclose(
+                    merged.comoment[:,merged.pairs.index(pair)],
+                    combined.comoment[:,combined.pairs.index(pair)])
+        # Observables not in every beta loop are undefined, as in analyse_data.
+        self.assertTrue(numpy.isnan(merged.mean[:,2]).all())
+        self.assertFalse(numpy.isnan(merged.mean[:,:2]).any())
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+
+    main()
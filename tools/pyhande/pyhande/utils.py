@@ -2,47 +2,136 @@
 
 import numpy as np
 
-def groupby_beta_loops(data, name='iterations'):
+def groupby_beta_loops(data, name='iterations', offsets=False):
     '''Group a HANDE DMQMC data table by beta loop.
 
 Parameters
 ----------
 data : :class:`pandas.DataFrame`
     DMQMC data table (e.g. obtained by :func:`pyhande.extract.extract_data`.
+name : string
+    Name of the column containing the iteration number (or beta value).
+offsets : bool
+    If true, also return the offsets of the beta loops (see
+    :func:`beta_loop_segments`).
 
 Returns
 -------
 grouped : :class:`pandas.DataFrameGroupBy`
     GroupBy object with data table grouped by beta loop.
+segments : :class:`numpy.ndarray`
+    Offsets of each beta loop in ``data``.  Only returned if ``offsets`` is
+    true.
 '''
 
-    # Exploit the fact that (except for possibly the last beta loop due to wall
-    # time) each beta loop contains the same set of iterations.
-    indx = np.arange(len(data)) // len(data[name].unique())
-    return data.groupby(indx)
+    segments = beta_loop_segments(data[name].values)
+    grouped = data.groupby(_segment_ids(segments))
+    if offsets:
+        return (grouped, segments)
+    else:
+        return grouped
 
-def groupby_iterations(data):
+def groupby_iterations(data, offsets=False):
     '''Group a HANDE QMC data table by blocks of iterations.
 
 Parameters
 ----------
 data : :class:`pandas.DataFrame`
     QMC data table (e.g. obtained by :func:`pyhande.extract.extract_data`.
+offsets : bool
+    If true, also return the offsets of the blocks (see
+    :func:`iteration_segments`).
 
 Returns
 -------
 grouped : :class:`pandas.DataFrameGroupBy`
     GroupBy object with data table grouped into blocks within which the
     iteration count increases monotonically.
+segments : :class:`numpy.ndarray`
+    Offsets of each block in ``data``.  Only returned if ``offsets`` is true.
 '''
-    indx = np.zeros(len(data))
-    prev_iteration = -1
-    curr_indx = 0
-    for i in range(len(data)):
-        if data['iterations'].iloc[i] < prev_iteration:
-            # new block of iterations
-            curr_indx += 1
-        indx[i] = curr_indx
-        prev_iteration = data['iterations'].iloc[i]
-
-    return data.groupby(indx)
+
+    segments = iteration_segments(data['iterations'].values)
+    grouped = data.groupby(_segment_ids(segments))
+    if offsets:
+        return (grouped, segments)
+    else:
+        return grouped
+
+def beta_loop_segments(beta):
+    '''Find the start and end of each beta loop in a DMQMC data table.
+
+A new beta loop starts whenever the iteration number (or beta value) does not
+increase, so beta loops need not contain the same number of iterations (e.g.
+if the final beta loop was not completed).
+
+Parameters
+----------
+beta : :class:`numpy.ndarray`
+    Iteration number (or beta value) of each entry in a DMQMC data table.
+
+Returns
+-------
+segments : :class:`numpy.ndarray`
+    Offsets of the beta loops: the i-th beta loop is contained in
+    ``beta[segments[i]:segments[i+1]]``.
+'''
+
+    return _segments(np.diff(beta) <= 0, len(beta))
+
+def iteration_segments(iterations):
+    '''Find the start and end of each block of monotonically increasing iterations.
+
+Parameters
+----------
+iterations : :class:`numpy.ndarray`
+    Iteration number of each entry in a QMC data table.
+
+Returns
+-------
+segments : :class:`numpy.ndarray`
+    Offsets of the blocks: the i-th block is contained in
+    ``iterations[segments[i]:segments[i+1]]``.
+'''
+
+    return _segments(np.diff(iterations) < 0, len(iterations))
+
+def _segments(new_segment, ndata):
+    '''Convert a mask denoting the start of a segment into segment offsets.
+
+Parameters
+----------
+new_segment : :class:`numpy.ndarray`
+    Boolean array, where the i-th entry is true if entry i+1 starts a new
+    segment.
+ndata : int
+    Number of entries.
+
+Returns
+-------
+segments : :class:`numpy.ndarray`
+    Offsets of each segment, including the end of the final segment.
+'''
+
+    starts = np.flatnonzero(new_segment) + 1
+    if ndata:
+        return np.concatenate(([0], starts, [ndata]))
+    else:
+        return np.zeros(1, dtype=int)
+
+def _segment_ids(segments):
+    '''Label each entry with the index of the segment containing it.
+
+Parameters
+----------
+segments : :class:`numpy.ndarray`
+    Segment offsets, as produced by :func:`iteration_segments` or
+    :func:`beta_loop_segments`.
+
+Returns
+-------
+ids : :class:`numpy.ndarray`
+    Segment index of each entry.
+'''
+
+    return np.repeat(np.arange(len(segments)-1), np.diff(segments))
@@ -1,8 +1,7 @@
 '''Attempt to remove the population control bias by reweighting estimates.'''
 
 import pandas as pd
-import numpy as np
-from math import exp
+import numpy
 
 def reweight(data, mc_cycles, tstep, weight_history, mean_shift,
              weight_key='Shift', arith_mean=False):
@@ -29,19 +28,23 @@ tstep : float
     The time step used in the weight factor.
 mc_cycles : int
     The number of monte carlo cycles per update step.
-weight_history: integer
-    The number of iterations to reweight over.
+weight_history: integer or list of integers
+    The number of iterations to reweight over.  If a list is given, a weight
+    column is added for each value.
 mean_shift: float
     The mean shift.  Used to prevent weights becoming too big.
 weight_key: string
     Column to generate the reweighting data.
-geom_mean: bool
-    Reweight using the geometric mean
+arith_mean: bool
+    Include the arithmetic series correction (see :func:`arith_series`) to the
+    weights.
 
 Returns
 -------
 data : :class:`pandas.DataFrame`
-    HANDE QMC data with weights appended
+    HANDE QMC data with weights appended in the 'Weight' column, or, if
+    ``weight_history`` is a list, in a 'Weight h' column for each value, h, in
+    ``weight_history``.
 
 References
 ----------
@@ -50,32 +53,92 @@ Umrigar93
 Vigor15
     W.A. Vigor, et al., J. Chem. Phys. 142, 104101 (2015).
 '''
-    weights = []
-    to_prod = np.exp(-tstep*mc_cycles*(data[weight_key].values-mean_shift))
-    if len(data[weight_key]) > 0:
-        weights.append(to_prod[0])
-    for i in range(1, min(weight_history, len(data[weight_key]))):
-        weights.append(weights[i-1]*to_prod[i])
-    for i in range(weight_history, len(data[weight_key])):
-        weights.append(weights[i-1]*to_prod[i] / to_prod[i-weight_history])
-    if arith_mean:
-        for i in range(weight_history, len(data[weight_key])):
-           arith_fac = arith_series(tstep, mc_cycles,
-                                    data[weight_key].values[i],
-                                    data[weight_key].values[i-weight_history])
-           weights[i] = weights[i]*arith_fac
-
-    data['Weight'] = weights
+    weights = calc_weights(data[weight_key].values, mc_cycles, tstep,
+                           weight_history, mean_shift, arith_mean)
+    if numpy.ndim(weight_history) == 0:
+        data['Weight'] = weights
+    else:
+        for (history, weight) in zip(weight_history, weights):
+            data['Weight %i' % (history,)] = weight
 
     return data
 
+def calc_weights(shift, mc_cycles, tstep, weight_history, mean_shift,
+                 arith_mean=False):
+    '''Calculate the population control reweighting factors.
+
+The weight at each iteration is evaluated as the exponential of a rolling sum
+(over the ``weight_history`` preceding values) of the logarithm of the factors in
+the product in :func:`reweight`.  The rolling sum is obtained from the
+difference of cumulative sums, so the weights for any number of values of
+``weight_history`` are obtained in a single pass over the data and without the
+loss of precision incurred by repeatedly multiplying and dividing the weights.
+
+Parameters
+----------
+shift : :class:`numpy.ndarray`
+    Shift (or other column used to generate the reweighting data) at each
+    report loop.
+mc_cycles, tstep, mean_shift, arith_mean :
+    See :func:`reweight`.
+weight_history : integer or list of integers
+    The number of iterations to reweight over.  If a list is given, the weights
+    are evaluated for each value.
+
+Returns
+-------
+weights : :class:`numpy.ndarray`
+    Reweighting factor at each report loop.  If ``weight_history`` is a list,
+    this is a 2D array with the weights for each value of ``weight_history`` in
+    the rows.
+'''
+    shift = numpy.asarray(shift, dtype=float)
+    histories = numpy.atleast_1d(numpy.asarray(weight_history, dtype=int))
+    nshift = len(shift)
+
+    log_fac = -tstep*mc_cycles*(shift-mean_shift)
+    cum_log_fac = numpy.concatenate(([0.0], numpy.cumsum(log_fac)))
+    # Index into cum_log_fac of the first entry before the window for each
+    # report loop and value of weight_history.
+    end = numpy.arange(1, nshift+1)
+    before = numpy.maximum(end[None,:] - histories[:,None], 0)
+    log_weights = cum_log_fac[None,1:] - cum_log_fac[before]
+    if arith_mean:
+        full = end[None,:] > histories[:,None]
+        arith_fac = arith_series(tstep, mc_cycles, shift[None,:],
+                                 shift[numpy.maximum(before-1, 0)])
+        log_weights += numpy.where(full, numpy.log(arith_fac), 0.0)
+    weights = numpy.exp(log_weights)
+
+    if numpy.ndim(weight_history) == 0:
+        weights = weights[0]
+    return weights
+
 def arith_series(tstep, mc_cycles, weight_now, weight_before):
+    '''Calculate the arithmetic series correction to the reweighting factor.
+
+Parameters
+----------
+tstep, mc_cycles :
+    See :func:`reweight`.
+weight_now : float or :class:`numpy.ndarray`
+    Current value(s) of the column used to generate the reweighting data.
+weight_before : float or :class:`numpy.ndarray`
+    Value(s) of the column used to generate the reweighting data at the start
+    of the reweighting window.
+
+Returns
+-------
+series : float or :class:`numpy.ndarray`
+    Correction factor(s).
+'''
+    tdweight = tstep*(numpy.asarray(weight_before, dtype=float) - weight_now)
     # Handle division by zero!!!
-    if weight_now != weight_before:
-        tdweight = tstep*(weight_before - weight_now)
-        ratio = ((1 - exp(-mc_cycles*tdweight))/(1 - exp(-tdweight)))
-        series = (1/float(mc_cycles)) * ratio
-    else:
-        series = 1.0
+    equal = tdweight == 0
+    tdweight = numpy.where(equal, 1.0, tdweight)
+    ratio = numpy.expm1(-mc_cycles*tdweight)/numpy.expm1(-tdweight)
+    series = numpy.where(equal, 1.0, ratio/float(mc_cycles))
+    if series.ndim == 0:
+        series = float(series)
 
     return series
@@ -4,7 +4,7 @@ setup(
     name='pyhande',
     version='0.1',
     author='HANDE developers',
-    packages=('pyhande',),
+    packages=('pyhande', 'pyhande.tests'),
     license='Modified BSD license',
     description='Analysis framework for HANDE calculations',
     long_description=open('README.rst').read(),
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+'''fcidump_to_hdf5.py [options] fcidump
+
+Convert a FCIDUMP file into a HANDE HDF5 system file.
+
+The HDF5 file is identical in content to that produced by write_read_in_system
+and can be passed as the int_file to read_in, avoiding reading the (text)
+FCIDUMP file at the start of every calculation.  The FCIDUMP file is read in
+chunks and so need not fit into memory.  Requires h5py.'''
+
+import argparse
+import os
+import pkgutil
+import sys
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+if not pkgutil.find_loader('pyblock'):
+    sys.path.append(os.path.join(_script_dir, '../pyblock'))
+if not pkgutil.find_loader('pyhande'):
+    sys.path.append(os.path.join(_script_dir, '../pyhande'))
+
+import pyhande
+
+
+def parse_args(args):
+    '''Parse command-line arguments.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+options : :class:`ArgumentParser`
+    Options read in from command line.
+'''
+
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('-o', '--output', default=None,
+                        help='Name of the HDF5 file to write.  Default: '
+                        'the FCIDUMP filename with .H5 appended.')
+    parser.add_argument('-n', '--nel', type=int, default=None,
+                        help='Number of electrons.  Default: value in the '
+                        'FCIDUMP file.')
+    parser.add_argument('-m', '--ms', type=int, default=None,
+                        help='Spin polarisation (in units of 1/2).  Default: '
+                        'value in the FCIDUMP file.')
+    parser.add_argument('-l', '--lz', action='store_true', default=False,
+                        help='Use Lz symmetry.')
+    parser.add_argument('-c', '--chunk-size', type=int, default=1000000,
+                        help='Number of integrals to read at a time.  '
+                        'Default: %(default)s.')
+    parser.add_argument('-t', '--tolerance', type=float, default=1.e-10,
+                        help='Maximum difference allowed between repeated '
+                        'occurrences of an integral.  Default: %(default)s.')
+    parser.add_argument('fcidump', help='FCIDUMP file.')
+    options = parser.parse_args(args)
+    if (options.nel is None) != (options.ms is None):
+        parser.error('Specify both or neither of --nel and --ms.')
+    return options
+
+
+def main(args):
+    '''Convert a FCIDUMP file into a HDF5 system file.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+None.
+'''
+
+    options = parse_args(args)
+    filename = pyhande.fcidump.convert(options.fcidump, options.output,
+            options.nel, options.ms, options.lz, options.chunk_size,
+            options.tolerance)
+    print('Wrote %s to %s.' % (options.fcidump, filename))
+
+
+if __name__ == '__main__':
+
+    main(sys.argv[1:])
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+'''redistribute_restart.py [options] nprocs
+
+Redistribute a set of HANDE restart files over a different number of processors.
+
+HANDE redistributes restart files itself when restarting on a different number
+of processors, but this is done at the start of the calculation and so occupies
+the (potentially large) allocation.  Instead, the redistribution can be done in
+advance and the new restart set read in directly by setting the read index in
+the restart table of the input file.  Requires h5py.'''
+
+import argparse
+import os
+import pkgutil
+import sys
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+if not pkgutil.find_loader('pyblock'):
+    sys.path.append(os.path.join(_script_dir, '../pyblock'))
+if not pkgutil.find_loader('pyhande'):
+    sys.path.append(os.path.join(_script_dir, '../pyhande'))
+
+import pyhande
+
+
+def parse_args(args):
+    '''Parse command-line arguments.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+options : :class:`ArgumentParser`
+    Options read in from command line.
+'''
+
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('-d', '--directory', default='.',
+                        help='Directory containing the restart files.  '
+                        'Default: current directory.')
+    parser.add_argument('-r', '--read', type=int, default=None,
+                        help='Index of the restart set to read.  Default: '
+                        'highest index in the directory.')
+    parser.add_argument('-w', '--write', type=int, default=None,
+                        help='Index of the restart set to write.  Default: '
+                        'one more than the highest index in the output '
+                        'directory.')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Directory in which to write the new restart '
+                        'files.  Default: same as --directory.')
+    parser.add_argument('-c', '--chunk-size', type=int, default=100000,
+                        help='Number of psips to read at a time.  '
+                        'Default: %(default)s.')
+    parser.add_argument('-p', '--processes', type=int, default=1,
+                        help='Number of processes to use.  '
+                        'Default: %(default)s.')
+    parser.add_argument('nprocs', type=int,
+                        help='Number of processors to redistribute over.')
+    options = parser.parse_args(args)
+    if not options.output:
+        options.output = options.directory
+    return options
+
+
+def main(args):
+    '''Redistribute a set of restart files.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+None.
+'''
+
+    options = parse_args(args)
+    filenames = pyhande.restart.restart_files(options.directory, options.read)
+    new_filenames = pyhande.restart.redistribute(filenames, options.nprocs,
+            options.output, options.write, options.chunk_size,
+            options.processes)
+    print('Redistributed %s over %i processors:' % (
+          ', '.join(filenames), options.nprocs))
+    for filename in new_filenames:
+        print(filename)
+
+
+if __name__ == '__main__':
+
+    main(sys.argv[1:])
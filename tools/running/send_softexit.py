@@ -1,14 +1,16 @@
 #!/usr/bin/env python
 '''Usage:
-send_softexit.py [options] walltime &
+send_softexit.py [options] [walltime] &
 
-send_softexit must run in the same working directory as the HANDE calculation.
+send_softexit must run in the same working directory as the HANDE calculation
+unless the output file(s) of the calculation(s) are given, in which case
+HANDE.COMM is written to the directory containing each output file.
 
 Care must be taken that the send_softexit is terminated when the job finishes
 (rather than waiting for the send_softexit to finish!).  send_softexit
 does, however, listen out for the interrupt signal.  Recommended use in a
 script is:
-    
+
 send_softexit.py [options] walltime &
 [Job commands]
 killall -2 send_softexit.py
@@ -21,15 +23,27 @@ send_softexit_ps=$!
 kill -2 $send_softexit_ps
 
 The latter should be used if multiple calculations are run on one computer.
+
+If output files are given, send_softexit exits once all calculations have
+finished or been sent softexit, so can be run in the foreground after starting
+the calculations in the background.
 '''
 
 __author__ = 'James Spencer'
 
 from optparse import OptionParser, OptionValueError
+import os
+import pkgutil
 import signal
 import sys
 import time
 
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+if not pkgutil.find_loader('pyblock'):
+    sys.path.append(os.path.join(_script_dir, '../pyblock'))
+if not pkgutil.find_loader('pyhande'):
+    sys.path.append(os.path.join(_script_dir, '../pyhande'))
+
 def signal_handler(signal, frame):
     '''Capture signal and leave quietly.'''
     print('Signal has been caught.  Bye!')
@@ -44,7 +58,7 @@ def job_cleanup():
 
 def parse_timer(t):
     '''Parse a time string and return the corresponding (integer) number of seconds.
-    
+
 t is a string eiher containing the number of seconds or in the format hh:mm:ss.'''
     if ':' in t:
         # assume hhmmss format
@@ -55,37 +69,118 @@ t is a string eiher containing the number of seconds or in the format hh:mm:ss.'
         return int(t)
 
 def parse_options(my_args):
-    '''Parse command line options.  Return the amount of sleep time.'''
-    parser = OptionParser(usage='''send_softexit.py [options] walltime
+    '''Parse command line options.  Return the amount of sleep time (None if no walltime is given) and the options.'''
+    parser = OptionParser(usage='''send_softexit.py [options] [walltime]
 
-Monitor a running job and write SOFTEXIT to CHANGEVARS in the current directory
+Monitor a running job and write softexit to HANDE.COMM in the current directory
 when the elapsed time gets to within a specified amount of the walltime allowed
 for the job.
 
+If the output file of one or more (FCIQMC or CCMC) calculations is given, the
+output is followed and the projected energy and shift reblocked (from the
+iteration at which the shift starts varying) whilst the calculation runs.
+softexit is then written to HANDE.COMM in the directory containing each output
+file once the stochastic error in the projected energy reaches the target
+error, once the error has stalled or once the walltime is reached, whichever is
+first.  Each calculation must run in a separate directory.  The walltime is
+optional if output files are given.
+
 The walltime and grace period can be given either in seconds or in the format
 hh:mm:ss.''')
     parser.add_option('-g','--grace',default='0',help='Amount of time before the walltime expires that SOFTEXIT is sent.  Default: %default.')
+    parser.add_option('-o','--output',action='append',default=[],help='Output file of a calculation to monitor.  Can be given multiple times to monitor multiple calculations.')
+    parser.add_option('-e','--error',type='float',default=None,help='Send softexit once the standard error in the projected energy is below this value.  Requires --output.')
+    parser.add_option('-s','--stall',type='int',default=None,help='Send softexit if the standard error in the projected energy has not decreased in this many iterations.  Requires --output.')
+    parser.add_option('-i','--interval',default='60',help='Time between checking the output files.  Default: %default.')
     (options,args) = parser.parse_args(my_args)
-    if len(args) != 1:
+    if len(args) > 1 or (len(args) == 0 and not options.output):
         if len(args) == 0:
             print('Must specify walltime.')
         else:
             print('Do not understand options specified: %s.' % (' '.join(args)))
         parser.print_help()
         sys.exit(1)
-    else:
+    if (options.error or options.stall) and not options.output:
+        print('Must specify output files to monitor the error.')
+        parser.print_help()
+        sys.exit(1)
+    if args:
         walltime = parse_timer(args[0])
         grace = parse_timer(options.grace)
         sleep_time = walltime - grace
-    return sleep_time
-
-def main(sleep_time):
-    print('send_softexit sleeping for %is.' % (sleep_time))
-    time.sleep(sleep_time)
-    job_cleanup()
+    else:
+        sleep_time = None
+    options.interval = parse_timer(options.interval)
+    return (sleep_time, options)
+
+def check_job(job, target_error=None, stall=None):
+    '''Read new output of a job and return the reason for sending softexit (or None if the job should continue).
+
+job is a dict as returned by pyhande.monitor.follow, with an additional
+'best' item containing the smallest error found and the iteration at which it
+was found.'''
+    # Only required when monitoring output, so sleeping until the walltime
+    # does not require pyblock, pyhande and their dependencies.
+    import pyblock
+    import pyhande
+    pyhande.monitor.update(job)
+    if job['finished']:
+        return None
+    conv = pyhande.monitor.convergence(job)
+    error = conv.proj_energy_error
+    if error == error:
+        print('%s: iteration %i, projected energy %s.' % (job['filename'],
+              conv.iterations, pyblock.error.pretty_fmt_err(conv.proj_energy, error)))
+        if target_error and error < target_error:
+            return 'target error reached'
+        if job['best'] is None or error < job['best'][0]:
+            job['best'] = (error, conv.iterations)
+        elif stall and conv.iterations - job['best'][1] >= stall:
+            return 'error has not decreased since iteration %i' % (job['best'][1])
+    return None
+
+def monitor(sleep_time, options):
+    '''Monitor jobs until they have finished or have been sent softexit.'''
+    import pyhande
+    start = time.time()
+    jobs = []
+    for filename in options.output:
+        job = pyhande.monitor.follow(filename)
+        job['best'] = None
+        jobs.append(job)
+    while jobs:
+        for job in list(jobs):
+            reason = check_job(job, options.error, options.stall)
+            if job['finished']:
+                print('%s: calculation finished.' % (job['filename']))
+                jobs.remove(job)
+            elif reason:
+                print('%s: sending softexit (%s).' % (job['filename'], reason))
+                pyhande.monitor.write_comm(os.path.dirname(job['filename']) or '.', softexit=True)
+                jobs.remove(job)
+        if not jobs:
+            break
+        elapsed = time.time() - start
+        if sleep_time is not None and elapsed >= sleep_time:
+            for job in jobs:
+                print('%s: sending softexit (walltime reached).' % (job['filename']))
+                pyhande.monitor.write_comm(os.path.dirname(job['filename']) or '.', softexit=True)
+            break
+        interval = options.interval
+        if sleep_time is not None:
+            interval = min(interval, sleep_time - elapsed)
+        time.sleep(interval)
+
+def main(sleep_time, options):
+    if options.output:
+        monitor(sleep_time, options)
+    else:
+        print('send_softexit sleeping for %is.' % (sleep_time))
+        time.sleep(sleep_time)
+        job_cleanup()
     sys.exit()
 
 if __name__ == '__main__':
-    sleep_time = parse_options(sys.argv[1:])
+    (sleep_time, options) = parse_options(sys.argv[1:])
     signal.signal(signal.SIGINT,signal_handler) # Listen out for Ctrl-C.
-    main(sleep_time)
+    main(sleep_time, options)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+'''steer_hande.py [options] output [output ...]
+
+Steer running FCIQMC/CCMC calculations by writing to HANDE.COMM.
+
+The output of each calculation is followed and the timestep or shift changed
+according to a policy based upon the blooms, spawning rate and population
+growth over recent report loops:
+
+* the timestep is reduced if too many blooms occur;
+* the timestep is increased if the spawning rate (R_spawn) is low;
+* the shift is adjusted if the population changes too much once the shift is
+  varying.
+
+HANDE.COMM is written to the directory containing each output file, so each
+calculation must run in a separate directory.  Every intervention is logged.
+steer_hande.py exits once all calculations have finished.
+
+The --replay option writes an existing output file to the (single) output file
+gradually, acting on HANDE.COMM as HANDE does, to test a policy without running
+a calculation.'''
+
+import argparse
+import logging
+import os
+import pkgutil
+import sys
+import threading
+import time
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+if not pkgutil.find_loader('pyblock'):
+    sys.path.append(os.path.join(_script_dir, '../pyblock'))
+if not pkgutil.find_loader('pyhande'):
+    sys.path.append(os.path.join(_script_dir, '../pyhande'))
+
+import pyhande
+
+
+def parse_args(args):
+    '''Parse command-line arguments.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+options : :class:`ArgumentParser`
+    Options read in from command line.
+'''
+
+    default = pyhande.monitor.SteeringPolicy()
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('-i', '--interval', type=float, default=60,
+                        help='Time (in seconds) between checking the output '
+                        'files.  Default: %(default)s.')
+    parser.add_argument('-l', '--log', default=None,
+                        help='File to log interventions to.  Default: '
+                        'standard output.')
+    parser.add_argument('-w', '--window', type=int, default=default.window,
+                        help='Number of report loops over which the '
+                        'calculation is assessed.  Default: %(default)s.')
+    parser.add_argument('-c', '--cooldown', type=int, default=default.cooldown,
+                        help='Number of report loops to wait after an '
+                        'intervention.  Default: %(default)s.')
+    parser.add_argument('-b', '--max-blooms', type=int,
+                        default=default.max_blooms,
+                        help='Reduce the timestep if this many blooms occur '
+                        'within the window.  Default: %(default)s.')
+    parser.add_argument('-j', '--jump', type=float, default=default.jump,
+                        help='Fractional increase in the population between '
+                        'report loops counted as a bloom once the shift is '
+                        'varying.  Default: %(default)s.')
+    parser.add_argument('-d', '--tau-decrease', type=float,
+                        default=default.tau_decrease,
+                        help='Factor by which to reduce the timestep.  '
+                        'Default: %(default)s.')
+    parser.add_argument('-r', '--low-rspawn', type=float,
+                        default=default.low_rspawn,
+                        help='Increase the timestep if the median R_spawn '
+                        'within the window is below this value.  Default: '
+                        'never increase the timestep.')
+    parser.add_argument('-u', '--tau-increase', type=float,
+                        default=default.tau_increase,
+                        help='Factor by which to increase the timestep.  '
+                        'Default: %(default)s.')
+    parser.add_argument('--min-tau', type=float, default=default.min_tau,
+                        help='Minimum timestep.  Default: %(default)s.')
+    parser.add_argument('--max-tau', type=float, default=default.max_tau,
+                        help='Maximum timestep.  Default: %(default)s.')
+    parser.add_argument('-p', '--pop-factor', type=float,
+                        default=default.pop_factor,
+                        help='Adjust the shift if the population changes by '
+                        'more than this fraction within the window once the '
+                        'shift is varying.  Default: never adjust the shift.')
+    parser.add_argument('--replay', default=None, metavar='SOURCE',
+                        help='Replay SOURCE into the output file as a fake '
+                        'calculation.')
+    parser.add_argument('--replay-lines', type=int, default=10,
+                        help='Number of lines of SOURCE to write at a time.  '
+                        'Default: %(default)s.')
+    parser.add_argument('--replay-delay', type=float, default=0.1,
+                        help='Time (in seconds) between writing each set of '
+                        'lines of SOURCE.  Default: %(default)s.')
+    parser.add_argument('outputs', nargs='+', metavar='output',
+                        help='Output file of a HANDE calculation.')
+    options = parser.parse_args(args)
+    if options.replay and len(options.outputs) != 1:
+        parser.error('Only one output file can be given with --replay.')
+    return options
+
+
+def steer_jobs(filenames, policy, interval):
+    '''Steer calculations until they have all finished.
+
+Parameters
+----------
+filenames : list of strings
+    output files of the calculations.
+policy : :class:`pyhande.monitor.SteeringPolicy`
+    policy for changing the calculations.
+interval : float
+    time (in seconds) between checking the output files.
+
+Returns
+-------
+None.
+'''
+
+    jobs = [pyhande.monitor.follow(filename) for filename in filenames]
+    while jobs:
+        for job in list(jobs):
+            data = pyhande.monitor.update(job)
+            if job['finished']:
+                logging.info('%s: calculation finished.', job['filename'])
+                jobs.remove(job)
+                continue
+            directory = os.path.dirname(job['filename']) or '.'
+            # Wait for HANDE to act on the last change, but keep the new report
+            # loops so they are assessed once it has.
+            pending = os.path.exists(os.path.join(directory, 'HANDE.COMM'))
+            (settings, reason) = pyhande.monitor.steer(job, data, policy,
+                                                       hold=pending)
+            if settings:
+                pyhande.monitor.write_comm(directory, **settings)
+                logging.info('%s: iteration %i: set %s (%s).', job['filename'],
+                             job['iterations'], ', '.join('%s = %.8g' % item
+                             for item in sorted(settings.items())), reason)
+        if jobs:
+            time.sleep(interval)
+
+
+def main(args):
+    '''Steer running HANDE calculations.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+None.
+'''
+
+    options = parse_args(args)
+    logging.basicConfig(filename=options.log, level=logging.INFO,
+                        format='%(asctime)s %(message)s')
+    policy = pyhande.monitor.SteeringPolicy(options.window, options.cooldown,
+            options.max_blooms, options.jump, options.tau_decrease,
+            options.low_rspawn, options.tau_increase, options.min_tau,
+            options.max_tau, options.pop_factor)
+    if options.replay:
+        replay = threading.Thread(target=pyhande.monitor.replay,
+                args=(options.replay, options.outputs[0],
+                      options.replay_lines, options.replay_delay))
+        replay.daemon = True
+        replay.start()
+    steer_jobs(options.outputs, policy, options.interval)
+
+
+if __name__ == '__main__':
+
+    main(sys.argv[1:])
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+'''scaling_report.py [options] directory [directory ...]
+
+Analyse the parallel scaling of HANDE FCIQMC/CCMC calculations.
+
+Calculations are found in the given directories (or files) and, for a strong
+scaling study, grouped by the input file, calculation type and position of the
+calculation in the output, so that each calculation run from the same input on
+different numbers of MPI processes and OpenMP threads forms a scaling study.
+For a weak scaling study, the input necessarily depends upon the number of
+cores used, so all calculations in each directory are treated as a single
+study.  The speedup, parallel efficiency and fraction of time spent in
+communication are printed for each calculation and optionally plotted against
+the number of cores.'''
+
+import argparse
+import glob
+import os
+import pkgutil
+import sys
+
+import pandas as pd
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+if not pkgutil.find_loader('pyblock'):
+    sys.path.append(os.path.join(_script_dir, 'pyblock'))
+if not pkgutil.find_loader('pyhande'):
+    sys.path.append(os.path.join(_script_dir, 'pyhande'))
+
+import pyhande
+
+
+def parse_args(args):
+    '''Parse command-line arguments.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+options : :class:`ArgumentParser`
+    Options read in from command line.
+'''
+
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('-g', '--glob', default='*.out*',
+                        help='Pattern matching HANDE output files in each '
+                        'directory.  Default: %(default)s.')
+    parser.add_argument('-w', '--weak', action='store_true', default=False,
+                        help='Analyse as a weak scaling study.  Default: '
+                        'strong scaling.')
+    parser.add_argument('-t', '--time', default='calculation_time',
+                        choices=['calculation_time', 'wall_time'],
+                        help='Timing used to measure performance.  '
+                        'calculation_time excludes initialisation.  Default: '
+                        '%(default)s.')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Write the table to the given CSV file.')
+    parser.add_argument('-p', '--plot', default=None, dest='plotfile',
+                        help='Filename to which the speedup, efficiency and '
+                        'communication fraction are plotted.  Use \'-\' to '
+                        'show the plot interactively.')
+    parser.add_argument('paths', nargs='+', metavar='directory',
+                        help='Directories containing (or names of) HANDE '
+                        'output files.')
+    options = parser.parse_args(args)
+    return options
+
+
+def find_calcs(paths, pattern):
+    '''Summarise the performance of the calculations in a set of directories.
+
+Parameters
+----------
+paths : list of strings
+    directories containing, or names of, HANDE output files.
+pattern : string
+    glob pattern matching HANDE output files in each directory.
+
+Returns
+-------
+summary : :class:`pandas.DataFrame`
+    performance summary (see :func:`pyhande.perf.performance_summary`) of
+    each calculation, with the directory of each calculation.
+'''
+
+    summaries = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames = sorted(glob.glob(os.path.join(path, pattern)))
+        else:
+            filenames = [path]
+        summary = pyhande.perf.performance_summary(filenames)
+        summary['directory'] = path
+        summaries.append(summary)
+    return pd.concat(summaries, ignore_index=True)
+
+
+def plot_scaling(scaling, by, plotfile):
+    '''Plot the speedup, efficiency and communication fraction.
+
+Parameters
+----------
+scaling : :class:`pandas.DataFrame`
+    scaling of each calculation, as produced by :func:`pyhande.perf.scaling`.
+by : string
+    column used to group calculations into scaling studies.
+plotfile : string
+    filename to which the plot is saved.  The plot is shown interactively if
+    '-'.
+
+Returns
+-------
+None.
+'''
+
+    # Only import matplotlib when required: it is slow to import.
+    import matplotlib.pyplot as plt
+
+    (fig, axes) = plt.subplots(1, 3, figsize=(15, 4.5))
+    max_cores = scaling['cores'].max()
+    for (name, study) in scaling.groupby(by):
+        ref_cores = study['cores'].min()
+        axes[0].plot(study['cores'], study['speedup'], 'o-', label=name)
+        axes[0].plot([ref_cores, max_cores], [1, max_cores/float(ref_cores)],
+                     'k:')
+        axes[1].plot(study['cores'], study['efficiency'], 'o-', label=name)
+        axes[2].plot(study['MPI_procs'], study['comms fraction'], 'o-',
+                     label=name)
+    for (ax, ylabel) in zip(axes, ['speedup', 'parallel efficiency',
+                                   'communication fraction']):
+        ax.set_xscale('log')
+        ax.set_ylabel(ylabel)
+    axes[0].set_yscale('log')
+    axes[0].set_xlabel('cores')
+    axes[1].set_xlabel('cores')
+    axes[1].axhline(1, color='k', linestyle=':')
+    axes[2].set_xlabel('MPI processes')
+    axes[1].legend(loc='best', fontsize='small')
+    fig.tight_layout()
+    if plotfile == '-':
+        plt.show()
+    else:
+        fig.savefig(plotfile)
+
+
+def main(args):
+    '''Analyse the scaling of a set of HANDE calculations.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+None.
+'''
+
+    options = parse_args(args)
+    summary = find_calcs(options.paths, options.glob)
+    if summary.empty:
+        sys.exit('No FCIQMC or CCMC calculations found.')
+    by = 'directory' if options.weak else 'input hash'
+    scaling = pyhande.perf.scaling(summary, by, options.time, options.weak)
+
+    pd.set_option('display.width', 120)
+    print(scaling.to_string(index=False))
+    if options.output:
+        scaling.to_csv(options.output, index=False)
+    if options.plotfile:
+        plot_scaling(scaling, by, options.plotfile)
+
+
+if __name__ == '__main__':
+
+    main(sys.argv[1:])
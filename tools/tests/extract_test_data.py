@@ -1,5 +1,15 @@
 #!/usr/bin/env python
+'''extract_test_data.py [options] file [file ...]
 
+Extract the data tested by testcode from HANDE output file(s).
+
+Data extracted from benchmark outputs is cached if a cache directory is given
+(see pyhande.testcode).  The cache can be filled in advance, using multiple
+processes, with --prime, which extracts all benchmark outputs in the given
+directories (e.g. test_suite) and their subdirectories.  testcode only uses the
+cache if the PYHANDE_TESTCODE_CACHE environment variable is set.'''
+
+import argparse
 import os
 import pkgutil
 import sys
@@ -9,18 +19,71 @@ if not pkgutil.find_loader('pyhande'):
     sys.path.append(os.path.join(_script_dir, '../pyhande'))
 import pyhande.testcode
 
-def main(filename):
+def format_test_data(data):
+    '''Format test data, as returned by pyhande.testcode.extract_test_data, as a string.'''
 
-    data = pyhande.testcode.extract_test_data(filename)
     output = []
     for (key, val) in data.items():
         output.append((key, val.to_string(index=False, index_names=False, float_format='{:.10f}'.format)))
 
     return '\n\n'.join('\n'.join(calc_out) for calc_out in output)
 
+def find_benchmarks(directories):
+    '''Find all benchmark outputs in (subdirectories of) the given directories.'''
+
+    benchmarks = []
+    for directory in directories:
+        for (root, dirs, files) in os.walk(directory):
+            benchmarks.extend(os.path.join(root, f) for f in sorted(files)
+                              if f.startswith('benchmark.out'))
+    return benchmarks
+
+def parse_args(args):
+
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='Number of processes to use.  Default: one per '
+                        'CPU.')
+    parser.add_argument('-c', '--cache', default=os.environ.get(
+                        'PYHANDE_TESTCODE_CACHE'),
+                        help='Directory containing the cache of data extracted '
+                        'from benchmark outputs.  Default: the value of '
+                        'PYHANDE_TESTCODE_CACHE, if set, otherwise no cache is '
+                        'used.')
+    parser.add_argument('--prime', action='store_true', default=False,
+                        help='Extract all benchmark outputs in the given '
+                        'directories into the cache rather than printing the '
+                        'data of the given files.')
+    parser.add_argument('files', nargs='+', metavar='file',
+                        help='HANDE output file (or directory with --prime).')
+    options = parser.parse_args(args)
+    if options.prime and not options.cache:
+        parser.error('--prime requires a cache directory (--cache or '
+                     'PYHANDE_TESTCODE_CACHE).')
+    return options
+
+def main(args):
+
+    options = parse_args(args)
+    if options.prime:
+        filenames = find_benchmarks(options.files)
+    else:
+        filenames = options.files
+    data = pyhande.testcode.extract_test_data_sets(filenames,
+            cache_dir=options.cache, processes=options.processes,
+            ignore_errors=options.prime)
+    if options.prime:
+        failed = [f for (f, dat) in zip(filenames, data) if dat is None]
+        return '\n'.join(['Cached test data from %i benchmark outputs.' %
+                          (len(filenames) - len(failed))] +
+                          ['Failed to extract data from %s.' % (f,)
+                           for f in failed])
+    elif len(filenames) == 1:
+        return format_test_data(data[0])
+    else:
+        return '\n\n'.join('==> %s <==\n%s' % (filename, format_test_data(dat))
+                           for (filename, dat) in zip(filenames, data))
+
 if __name__ == '__main__':
 
-    if len(sys.argv) == 1:
-        print('usage: extract_test_data.py file')
-        sys.exit(1)
-    print(main(sys.argv[1]))
+    print(main(sys.argv[1:]))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+'''pyhande_import_time.py [options] [module [module ...]]
+
+Benchmark the time taken to import pyhande (or pyhande submodules) in a fresh
+python interpreter.  Every analysis script and every testcode data extraction
+pays this cost, so it should be kept small (well under 300ms for a bare
+``import pyhande`` on a headless node).  The exit status is non-zero if the best
+time for any module exceeds the threshold.'''
+
+import argparse
+import os
+import subprocess
+import sys
+import timeit
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_pyhande_dir = os.path.join(_script_dir, '../pyhande')
+_pyblock_dir = os.path.join(_script_dir, '../pyblock')
+
+
+def time_import(module, repeat=5, python=sys.executable):
+    '''Time importing a module in a fresh python interpreter.
+
+Parameters
+----------
+module : string
+    name of module to import.
+repeat : int
+    number of times to repeat the measurement.
+python : string
+    python interpreter to use.
+
+Returns
+-------
+timings : list of floats
+    wall time (in seconds) taken by each measurement.  The start-up time of the
+    interpreter itself is subtracted.
+'''
+
+    env = dict(os.environ)
+    path = [_pyhande_dir, _pyblock_dir]
+    if env.get('PYTHONPATH'):
+        path.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(path)
+    # Ensure a non-interactive matplotlib backend is used, as on a compute node.
+    env['MPLBACKEND'] = 'Agg'
+
+    def run(code):
+        start = timeit.default_timer()
+        subprocess.check_call([python, '-c', code], env=env)
+        return timeit.default_timer() - start
+
+    # Warm up filesystem caches.
+    run('import %s' % (module,))
+    baseline = min(run('pass') for i in range(repeat))
+    return [run('import %s' % (module,)) - baseline for i in range(repeat)]
+
+
+def parse_args(args):
+    '''Parse command-line arguments.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+options : :class:`ArgumentParser`
+    Options read in from command line.
+'''
+
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='Number of timings to perform.  '
+                        'Default: %(default)s.')
+    parser.add_argument('-t', '--threshold', type=float, default=0.3,
+                        help='Maximum acceptable import time in seconds.  '
+                        'Default: %(default)s.')
+    parser.add_argument('modules', nargs='*', default=['pyhande'],
+                        help='Modules to import.  Default: pyhande.')
+    return parser.parse_args(args)
+
+
+def main(args):
+    '''Benchmark the import time of pyhande.
+
+Parameters
+----------
+args : list of strings
+    command-line arguments.
+
+Returns
+-------
+passed : bool
+    True if all modules were imported within the threshold time.
+'''
+
+    options = parse_args(args)
+    passed = True
+    print('%-24s %10s %10s' % ('module', 'best/ms', 'median/ms'))
+    for module in options.modules:
+        timings = sorted(time_import(module, options.repeat))
+        best = timings[0]
+        median = timings[len(timings)//2]
+        print('%-24s %10.1f %10.1f' % (module, 1000*best, 1000*median))
+        passed = passed and best < options.threshold
+    if not passed:
+        print('Import time exceeds threshold of %.1fms.' %
+              (1000*options.threshold,))
+    return passed
+
+
+if __name__ == '__main__':
+
+    if not main(sys.argv[1:]):
+        sys.exit(1)